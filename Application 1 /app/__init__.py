@@ -1,15 +1,40 @@
 from flask import Flask
 
-def create_app():
+def create_app(config=None):
     """
     Creates and configures a new Flask application instance.
 
+    Args:
+        config (Dict, optional): Configuration values that override the defaults (e.g., RULE_CACHE_SIZE or
+            DATABASE_URL).
+
     Returns:
         app (Flask): A configured Flask app instance.
     """
     # Create a Flask application instance
     app = Flask(__name__)
 
+    # Default configuration, overridable by the caller
+    app.config.setdefault('RULE_CACHE_SIZE', 1024)  # Maximum number of parsed rules kept in memory
+    app.config.setdefault('RULE_REGISTRY_REFRESH_INTERVAL', 1.0)  # Seconds between checks for rules changed by other workers
+    app.config.setdefault('DATABASE_URL', None)  # Database to use instead of the module default, if set
+    app.config.setdefault('RULE_SNAPSHOT_ENABLED', False)  # Warm stored rules from a snapshot file kept next to the database file
+    app.config.setdefault('RULE_SNAPSHOT_PATH', None)  # Snapshot file to warm stored rules from, if set (enables snapshots)
+    app.config.setdefault('RULE_STREAM_CHUNK_SIZE', 1000)  # Records evaluated together by /evaluate_stream
+    app.config.setdefault('RULE_STREAM_MAX_RECORD_BYTES', 1 << 20)  # Longest record line accepted by /evaluate_stream
+    app.config.setdefault('RULE_EXECUTOR', 'inline')  # Where batch evaluations run: 'inline', 'thread' or 'process'
+    app.config.setdefault('RULE_EXECUTOR_WORKERS', None)  # Pool size of the 'thread' and 'process' executors (default: CPUs)
+    app.config.setdefault('RULE_EXECUTOR_CHUNK_SIZE', 10000)  # Records per task sent to a pooled executor
+    app.config.setdefault('RULE_RESULT_CACHE_SIZE', 0)  # Maximum number of cached rule results (0 disables the result cache)
+    app.config.setdefault('RULE_RESULT_CACHE_TTL', 60.0)  # Seconds a cached rule result stays valid (None: no expiry)
+    app.config.setdefault('RULE_METRICS_ENABLED', False)  # Record latencies, errors and AST shapes for /metrics
+    app.config.setdefault('RULE_FAST_PATH', True)  # Reuse compiled request validators and decode JSON with orjson if installed
+    app.config.setdefault('RULE_ADAPTIVE_ORDERING', False)  # Reorder AND/OR chains from runtime predicate statistics
+    app.config.setdefault('RULE_STATS_SAMPLE_INTERVAL', 64)  # One in this many evaluations of a rule records statistics
+    app.config.setdefault('RULE_REORDER_INTERVAL', 4096)  # One in this many evaluations of a rule re-plans its order
+    if config:
+        app.config.update(config)
+
     # Establish the application context
     with app.app_context():
         # Import and initialize the API routes from the 'api' module
@@ -1,6 +1,16 @@
-from flask import request, jsonify, render_template
-from app.rules import create_rule, evaluate_rule, RuleEngineError
-from marshmallow import Schema, fields, ValidationError
+from flask import request, jsonify, render_template, Response, stream_with_context
+from app.rules import create_rule, evaluate_rule, modify_rule, format_rule, serialize_ast, RuleEngineError
+from app.cache import RuleCache, ResultCache
+from app.registry import RuleRegistry
+from app.selectivity import SelectivityTracker
+from app.executor import create_executor
+from app import database
+from app import snapshot
+from app import metrics as rule_metrics
+from app import validation
+from marshmallow import Schema, fields, ValidationError, validate as field_validators
+import json  # Parsing and writing newline-delimited JSON streams
+import time  # Timing request validation while metrics are enabled
 
 # Schema definition for creating a rule using Marshmallow
 class RuleSchema(Schema):
@@ -11,6 +21,56 @@ class EvaluationSchema(Schema):
     rule_string = fields.Str(required=True)  # 'rule_string' is required to define the rule to evaluate
     data = fields.Dict(required=True)  # 'data' is required to pass in the data to be evaluated against the rule
 
+# Schema definition for evaluating a stored rule, identified by the URL, against some data
+class StoredRuleEvaluationSchema(Schema):
+    data = fields.Dict(required=True)  # 'data' is required to pass in the data to be evaluated against the rule
+
+# Schema definition for evaluating a rule against many records in one request
+class BatchEvaluationSchema(Schema):
+    rule_string = fields.Str(required=True)  # 'rule_string' is required to define the rule to evaluate
+    records = fields.List(fields.Dict(), required=True)  # 'records' is the list of data dictionaries to evaluate
+
+# Schema definition for changing one node of a stored rule (see app.rules.modify_rule)
+class ModifyRuleSchema(Schema):
+    action = fields.Str(required=True, validate=field_validators.OneOf(('update', 'add', 'remove')))  # What to change
+    path = fields.Str(load_default='')  # 'L'/'R' steps from the root to the node to change ('' is the root)
+    operator = fields.Str()  # The new comparison operator of a condition ('update')
+    value = fields.Raw()  # The new value of a condition ('update')
+    expression = fields.Str()  # The sub-expression to add, in rule string format ('add')
+    join = fields.Str(load_default='AND', validate=field_validators.OneOf(('AND', 'OR')))  # Joins the added sub-expression
+
+# Reads newline-delimited JSON records from a binary stream with bounded memory
+def iter_ndjson(stream, max_line_bytes):
+    """
+    Yields one parsed record, or an error message, per non-blank line of a newline-delimited JSON stream.
+
+    The stream is read one line at a time and a line is never buffered beyond `max_line_bytes`: the rest of
+    an overlong line is skipped and reported as an error.
+
+    Args:
+        stream: A binary file-like object (e.g., request.stream).
+        max_line_bytes (int): The longest line accepted, in bytes.
+
+    Returns:
+        Iterator[Tuple[object, Optional[str]]]: (record, None) for each parsed line, or (None, message) for
+            a line that is too long or not valid JSON.
+    """
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):  # Skip the rest of the line
+                line = stream.readline(max_line_bytes)
+            yield None, f"Record longer than {max_line_bytes} bytes"
+            continue
+        if not line.strip():
+            continue  # Blank lines are not records
+        try:
+            yield validation.loads(line), None
+        except ValueError:
+            yield None, "Invalid JSON"
+
 def init_app(app):
     """
     Initializes the Flask app with routes for rule creation, evaluation, and error handling.
@@ -18,6 +78,90 @@ def init_app(app):
     Args:
         app: The Flask application instance.
     """
+    # Cache of parsed ASTs shared by the rule endpoints, so repeated rule strings are only parsed once
+    rule_cache = RuleCache(maxsize=app.config['RULE_CACHE_SIZE'])
+    app.extensions['rule_cache'] = rule_cache
+
+    # Optional cache of results keyed by the rule and the values of the attributes it reads (None while disabled)
+    result_cache = None
+    if app.config['RULE_RESULT_CACHE_SIZE']:
+        result_cache = ResultCache(maxsize=app.config['RULE_RESULT_CACHE_SIZE'], ttl=app.config['RULE_RESULT_CACHE_TTL'])
+    app.extensions['result_cache'] = result_cache
+
+    # Optional runtime predicate statistics, used to reorder the AND/OR chains of cached and stored rules
+    selectivity = None
+    if app.config['RULE_ADAPTIVE_ORDERING']:
+        selectivity = SelectivityTracker(sample_interval=app.config['RULE_STATS_SAMPLE_INTERVAL'],
+                                         reorder_interval=app.config['RULE_REORDER_INTERVAL'])
+    app.extensions['selectivity'] = selectivity
+
+    # Where batch and stream evaluations run: inline, on a thread pool or on a process pool
+    rule_executor = create_executor(app.config['RULE_EXECUTOR'], max_workers=app.config['RULE_EXECUTOR_WORKERS'],
+                                    chunk_size=app.config['RULE_EXECUTOR_CHUNK_SIZE'])
+    app.extensions['rule_executor'] = rule_executor
+
+    # Process-wide latency, error and AST metrics, served on /metrics (None while disabled)
+    metrics = rule_metrics.enable() if app.config['RULE_METRICS_ENABLED'] else None
+
+    # On the fast path, request schemas are built once and compiled into validators, and JSON bodies are
+    # decoded with orjson when it is installed
+    fast_path = app.config['RULE_FAST_PATH']
+    validators = {
+        schema_class: validation.compile_validator(schema_class())
+        for schema_class in (RuleSchema, EvaluationSchema, StoredRuleEvaluationSchema, BatchEvaluationSchema,
+                             ModifyRuleSchema)
+    } if fast_path else {}
+
+    def read_json():
+        """
+        Returns the request's decoded JSON payload, answering invalid bodies exactly like `request.json`.
+        """
+        if not fast_path or not request.is_json:
+            return request.json  # Flask decides what a body that is not JSON means
+        try:
+            return validation.loads(request.get_data(cache=True))
+        except ValueError as e:
+            return request.on_json_loading_failed(e)
+
+    def load(schema_class):
+        """
+        Decodes and validates the request's JSON payload with a schema.
+        """
+        if fast_path:
+            return validators[schema_class](read_json())
+        return schema_class().load(request.json)
+
+    def validate(schema_class):
+        """
+        Validates the request's JSON payload with a schema, timing it when metrics are enabled.
+        """
+        if metrics is None:
+            return load(schema_class)
+        start = time.perf_counter()
+        try:
+            return load(schema_class)
+        finally:
+            metrics.observe_stage('validate', time.perf_counter() - start)
+
+    def parse_rule(rule_string):
+        """
+        Parses a rule string for the cache, making the rule adaptive if statistics are enabled.
+        """
+        ast = create_rule(rule_string)
+        return selectivity.track(ast) if selectivity is not None else ast
+
+    if app.config['DATABASE_URL']:
+        database.configure_database(app.config['DATABASE_URL'])
+
+    # Compiled stored rules by id, warmed from the database so evaluating a stored rule never re-parses it, and
+    # started from the rule snapshot when one is configured
+    snapshot_path = app.config['RULE_SNAPSHOT_PATH']
+    if snapshot_path is None and app.config['RULE_SNAPSHOT_ENABLED']:
+        snapshot_path = snapshot.snapshot_path(database.database_path())
+    rule_registry = RuleRegistry(refresh_interval=app.config['RULE_REGISTRY_REFRESH_INTERVAL'], tracker=selectivity,
+                                 snapshot_path=snapshot_path)
+    rule_registry.warm()
+    app.extensions['rule_registry'] = rule_registry
 
     @app.route('/')
     def index():
@@ -35,27 +179,55 @@ def init_app(app):
         API endpoint to create a rule from a rule string.
         
         Receives a JSON payload with a rule string, validates the input, creates the abstract syntax tree (AST) for the rule,
-        and returns a success message or an error message if something goes wrong.
+        stores the rule in the database, and returns its id or an error message if something goes wrong.
         
         Returns:
-            JSON response with success or error messages.
+            JSON response with the new rule's id and its stored tree (the tree /modify_rule paths refer to), or
+            error messages.
         """
-        schema = RuleSchema()  # Initialize the RuleSchema for input validation
         try:
             # Validate and load the request data using the schema
-            data = schema.load(request.json)
+            data = validate(RuleSchema)
         except ValidationError as err:
             # Return validation error messages if input validation fails
             return jsonify({"status": "error", "message": err.messages}), 400
 
         try:
-            # Create the abstract syntax tree (AST) from the rule string
-            ast = create_rule(data['rule_string'])
-            return jsonify({"status": "success", "message": "Rule created successfully"})
+            # Create the abstract syntax tree (AST) from the rule string, reusing a cached AST if available
+            ast = rule_cache.get_or_create(data['rule_string'], parse_rule)
+            if ast is None:
+                raise RuleEngineError("Empty rule")
         except RuleEngineError as e:
             # Return error message if rule creation fails
             return jsonify({"status": "error", "message": str(e)}), 400
 
+        # Persist the rule and make it available to /evaluate_rule/<id> in this worker right away
+        rule_id = database.save_rule(data['rule_string'], ast)
+        rule_registry.refresh(force=True)
+        return jsonify({"status": "success", "message": "Rule created successfully", "id": rule_id,
+                        "ast": serialize_ast(rule_registry.get(rule_id))})  # The optimized tree, as stored
+
+    @app.route('/rule/<int:rule_id>', methods=['GET'])
+    def get_rule_api(rule_id):
+        """
+        API endpoint to read a stored rule, identified by its id.
+
+        Returns:
+            JSON response with the rule string and the stored tree of the rule (the tree /modify_rule paths
+            refer to), or an error message (404 if the rule does not exist). The rule string is null for a rule
+            that folded into a constant.
+        """
+        try:
+            ast = rule_registry.get(rule_id)
+        except RuleEngineError as e:
+            # Return error message if there is no rule with this id
+            return jsonify({"status": "error", "message": str(e)}), 404
+        try:
+            rule_string = format_rule(ast)
+        except RuleEngineError:
+            rule_string = None  # A constant rule has no rule string
+        return jsonify({"status": "success", "id": rule_id, "rule_string": rule_string, "ast": serialize_ast(ast)})
+
     @app.route('/evaluate_rule', methods=['POST'])
     def evaluate_rule_api():
         """
@@ -67,24 +239,240 @@ def init_app(app):
         Returns:
             JSON response with the evaluation result or an error message.
         """
-        schema = EvaluationSchema()  # Initialize the EvaluationSchema for input validation
         try:
             # Validate and load the request data using the schema
-            data = schema.load(request.json)
+            data = validate(EvaluationSchema)
+        except ValidationError as err:
+            # Return validation error messages if input validation fails
+            return jsonify({"status": "error", "message": err.messages}), 400
+
+        try:
+            # Look up the cached AST for the rule string, parsing it only on a cache miss
+            ast = rule_cache.get_or_create(data['rule_string'], parse_rule)
+            # Evaluate the rule's AST against the provided data, reusing a cached result if enabled
+            result = evaluate_rule(ast, data['data'], cache=result_cache)
+            return jsonify({"status": "success", "result": result})
+        except RuleEngineError as e:
+            # Return error message if rule evaluation fails
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+    @app.route('/evaluate_stream', methods=['POST'])
+    def evaluate_stream_api():
+        """
+        API endpoint to evaluate a rule against a newline-delimited JSON stream of records.
+
+        The rule is given by the `rule_string` or `rule_id` query parameter and parsed once. The request body is
+        read incrementally, one JSON record per line, and evaluated in chunks of RULE_STREAM_CHUNK_SIZE records.
+        The response streams back one line per record as soon as its chunk is evaluated: `true`, `false`, or
+        `{"error": "<message>"}` for a record that cannot be evaluated. Neither the request nor the response is
+        held in memory as a whole.
+
+        Returns:
+            A streamed NDJSON response with one result per record, or a JSON error message if the rule is
+            missing or invalid.
+        """
+        try:
+            if 'rule_id' in request.args:
+                rule_id = request.args.get('rule_id', type=int)
+                if rule_id is None:
+                    raise RuleEngineError("rule_id must be an integer")
+                ast = rule_registry.get(rule_id)
+            elif 'rule_string' in request.args:
+                ast = rule_cache.get_or_create(request.args['rule_string'], parse_rule)
+                if ast is None:
+                    raise RuleEngineError("Empty rule")
+            else:
+                raise RuleEngineError("Missing rule_string or rule_id query parameter")
+        except RuleEngineError as e:
+            # Return error message if the rule cannot be found or parsed
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        chunk_size = app.config['RULE_STREAM_CHUNK_SIZE']
+        records = iter_ndjson(request.stream, app.config['RULE_STREAM_MAX_RECORD_BYTES'])
+
+        def generate():
+            lines = [None] * chunk_size  # Output line per record of the current chunk
+            while True:
+                batch, positions, count = [], [], 0
+                for record, error in records:
+                    if error is None and not isinstance(record, dict):
+                        error = "Invalid data format"
+                    if error is None:
+                        batch.append(record)
+                        positions.append(count)
+                    else:
+                        lines[count] = json.dumps({"error": error})
+                    count += 1
+                    if count == chunk_size:
+                        break
+                if count == 0:
+                    return
+                if batch:
+                    results, errors = rule_executor.evaluate_batch(ast, batch)
+                    for position, result, error in zip(positions, results.tolist(), errors):
+                        lines[position] = json.dumps({"error": error}) if error else ('true' if result else 'false')
+                yield '\n'.join(lines[:count]) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    @app.route('/evaluate_rule/<int:rule_id>', methods=['POST'])
+    def evaluate_stored_rule_api(rule_id):
+        """
+        API endpoint to evaluate a stored rule, identified by its id, against provided data.
+        
+        The rule comes from the in-process registry of compiled rules, so it is never re-parsed.
+        
+        Returns:
+            JSON response with the evaluation result, or an error message (404 if the rule does not exist).
+        """
+        try:
+            # Validate and load the request data using the schema
+            data = validate(StoredRuleEvaluationSchema)
         except ValidationError as err:
             # Return validation error messages if input validation fails
             return jsonify({"status": "error", "message": err.messages}), 400
 
         try:
-            # Create the abstract syntax tree (AST) from the rule string
-            ast = create_rule(data['rule_string'])
-            # Evaluate the rule's AST against the provided data
-            result = evaluate_rule(ast, data['data'])
+            ast = rule_registry.get(rule_id)
+        except RuleEngineError as e:
+            # Return error message if there is no rule with this id
+            return jsonify({"status": "error", "message": str(e)}), 404
+
+        try:
+            # Evaluate the stored rule's compiled AST against the provided data, reusing a cached result if enabled
+            result = evaluate_rule(ast, data['data'], cache=result_cache)
             return jsonify({"status": "success", "result": result})
         except RuleEngineError as e:
             # Return error message if rule evaluation fails
             return jsonify({"status": "error", "message": str(e)}), 400
 
+    @app.route('/modify_rule/<int:rule_id>', methods=['POST'])
+    def modify_rule_api(rule_id):
+        """
+        API endpoint to change one node of a stored rule without re-parsing it.
+
+        Receives a JSON payload with an action ('update' a condition's operator or value, 'add' a
+        sub-expression or 'remove' a node) and the path of the node in the rule's stored tree, as returned by
+        /create_rule, /modify_rule and GET /rule/<id>. Only the nodes on the path are rebuilt
+        and compiled, the rule is saved with its new rule string, and only the cached results of this rule
+        are invalidated.
+
+        Returns:
+            JSON response with the modified rule string and stored tree, or an error message (404 if the rule
+            does not exist).
+        """
+        try:
+            # Validate and load the request data using the schema
+            data = validate(ModifyRuleSchema)
+        except ValidationError as err:
+            # Return validation error messages if input validation fails
+            return jsonify({"status": "error", "message": err.messages}), 400
+
+        try:
+            ast = rule_registry.get(rule_id)
+        except RuleEngineError as e:
+            # Return error message if there is no rule with this id
+            return jsonify({"status": "error", "message": str(e)}), 404
+
+        try:
+            # Apply the change to the stored AST, keeping every untouched subtree and its compiled evaluator
+            modified = modify_rule(ast, data['path'], data['action'], operator=data.get('operator'),
+                                   value=data.get('value'), expression=data.get('expression'), join=data['join'])
+            rule_string = format_rule(modified)
+        except RuleEngineError as e:
+            # Return error message if the path or the change is invalid
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # Persist the change, then swap the rule in this worker's registry and drop its cached results
+        version = database.update_rule(rule_id, rule_string, modified)
+        if version is None:
+            return jsonify({"status": "error", "message": f"Rule {rule_id} not found"}), 404
+        rule_registry.replace(rule_id, version, selectivity.track(modified) if selectivity is not None else modified)
+        if result_cache is not None:
+            result_cache.invalidate(ast)
+        return jsonify({"status": "success", "message": "Rule modified successfully", "id": rule_id,
+                        "rule_string": rule_string, "ast": serialize_ast(modified)})
+
+    @app.route('/evaluate_batch', methods=['POST'])
+    def evaluate_batch_api():
+        """
+        API endpoint to evaluate one rule against many records in a single request.
+
+        Receives a JSON payload with a rule string and a list of data dictionaries. The rule is parsed once and
+        evaluated over all records in one vectorized pass. Records that cannot be evaluated (e.g., a missing
+        attribute) get a null result and an entry in the errors list.
+
+        Returns:
+            JSON response with one result per record and the per-record errors, or an error message.
+        """
+        try:
+            # Validate and load the request data using the schema
+            data = validate(BatchEvaluationSchema)
+        except ValidationError as err:
+            # Return validation error messages if input validation fails
+            return jsonify({"status": "error", "message": err.messages}), 400
+
+        try:
+            # Look up the cached AST for the rule string, parsing it only on a cache miss
+            ast = rule_cache.get_or_create(data['rule_string'], parse_rule)
+            # Evaluate the rule's AST against all records at once, on the configured executor
+            results, errors = rule_executor.evaluate_batch(ast, data['records'])
+        except RuleEngineError as e:
+            # Return error message if rule evaluation fails
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        return jsonify({
+            "status": "success",
+            "results": [None if error else result for result, error in zip(results.tolist(), errors)],
+            "errors": [{"index": index, "message": error} for index, error in enumerate(errors) if error]
+        })
+
+    @app.route('/rule_stats', methods=['GET'])
+    def rule_stats_api():
+        """
+        API endpoint to inspect the runtime predicate statistics used to reorder rules.
+
+        Returns:
+            JSON response with whether adaptive ordering is enabled and, per predicate, its number of sampled
+            evaluations, true rate and mean cost in nanoseconds.
+        """
+        return jsonify({
+            "status": "success",
+            "enabled": selectivity is not None,
+            "predicates": selectivity.stats() if selectivity is not None else []
+        })
+
+    @app.route('/cache_stats', methods=['GET'])
+    def cache_stats_api():
+        """
+        API endpoint to inspect the rule cache and the result cache.
+
+        Returns:
+            JSON response with the counters of the parsed-rule cache and of the result cache (null while the
+            result cache is disabled), including their hit rates.
+        """
+        rule_stats = rule_cache.stats()
+        lookups = rule_stats['hits'] + rule_stats['misses']
+        rule_stats['hit_rate'] = rule_stats['hits'] / lookups if lookups else 0.0
+        return jsonify({
+            "status": "success",
+            "rule_cache": rule_stats,
+            "result_cache": result_cache.stats() if result_cache is not None else None
+        })
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_api():
+        """
+        Endpoint exposing stage latency histograms, error counts by kind and AST size and depth distributions in
+        the Prometheus text format. Only available when RULE_METRICS_ENABLED is set.
+
+        Returns:
+            A text/plain Prometheus exposition, or a 404 JSON error while metrics are disabled.
+        """
+        if metrics is None:
+            return jsonify({"status": "error", "message": "Metrics are disabled"}), 404
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
     @app.errorhandler(404)
     def not_found(error):
         """
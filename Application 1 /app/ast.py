@@ -1,15 +1,57 @@
+import sys  # String interning for operand attributes and operators
+
+# Shared operand conditions: identical conditions across all rules reuse one tuple (see intern_operand)
+_OPERAND_TABLE = {}
+
+# Upper bound on the number of interned conditions, so a stream of one-off rules cannot grow the table forever
+MAX_INTERNED_OPERANDS = 100000
+
+def intern_operand(condition):
+    """
+    Returns a shared instance of an operand condition, so rules that repeat a condition store it once.
+    
+    Strings inside the condition are interned as well. Values of different types that compare equal (e.g., 1
+    and 1.0) are kept apart.
+    
+    Args:
+        condition (tuple): An (attribute, operator, value) condition.
+    
+    Returns:
+        tuple: The shared condition, or the condition itself if it cannot be interned.
+    """
+    try:
+        key = (condition, tuple(map(type, condition)))
+        shared = _OPERAND_TABLE.get(key)
+    except TypeError:
+        return condition  # Unhashable values cannot be shared
+    if shared is not None:
+        return shared
+    if len(_OPERAND_TABLE) >= MAX_INTERNED_OPERANDS:
+        return condition
+    shared = tuple(sys.intern(item) if type(item) is str else item for item in condition)
+    _OPERAND_TABLE[key] = shared
+    return shared
+
 class Node:
     """
     This class represents a node in an abstract syntax tree (AST). Each node can either be an operator (e.g., AND, OR) 
-    or an operand (e.g., a comparison like "age > 18").
+    or an operand (e.g., a comparison like "age > 18"). Rules simplified by `app.rules.optimize_rule` may also
+    contain constants: 'constant' nodes whose value is True or False.
+    
+    Nodes use __slots__ instead of a per-instance __dict__, and operand conditions are interned (see intern_operand),
+    which keeps large rule sets small in memory.
     
     Attributes:
-        node_type (str): The type of node ('operator' or 'operand').
+        node_type (str): The type of node ('operator', 'operand' or 'constant').
         left (Node, optional): The left child node (for operators).
         right (Node, optional): The right child node (for operators).
         value (any): The value of the node. For an operand, it's a tuple containing the attribute, operator, and value. 
                      For an operator, it's the type of operation (e.g., 'AND' or 'OR').
+        compiled (Callable, optional): The cached evaluator built by `app.rules.compile_rule` for this subtree.
+        attributes (FrozenSet[str], optional): The cached attribute names read by this subtree, computed once by
+                     `app.rules.referenced_attributes`.
     """
+    __slots__ = ('node_type', 'left', 'right', 'value', 'compiled', 'attributes')
     
     def __init__(self, node_type, left=None, right=None, value=None):
         """
@@ -25,7 +67,11 @@ class Node:
         self.node_type = node_type  # Type of the node ('operator' or 'operand')
         self.left = left  # Left child node (for operators)
         self.right = right  # Right child node (for operators)
+        if node_type == 'operand' and type(value) is tuple:
+            value = intern_operand(value)  # Share identical conditions between nodes
         self.value = value  # Value of the node (either the condition for operands, or the operator type for operators)
+        self.compiled = None  # Compiled evaluator for this subtree, filled in lazily by compile_rule
+        self.attributes = None  # Attributes read by this subtree, filled in lazily by referenced_attributes
     
     def __repr__(self):
         """
@@ -0,0 +1,284 @@
+from collections import OrderedDict  # Ordered mapping used to track least-recently-used entries
+import re  # Regular expressions for normalizing rule strings
+import threading  # Locks for thread-safe cache access
+import time  # Expiry times of cached results
+from app.rules import referenced_attributes
+
+# Matches either a quoted string literal (kept verbatim) or a run of whitespace (collapsed)
+_WHITESPACE_PATTERN = re.compile(r'("[^"]*"|\'[^\']*\')|\s+')
+
+def normalize_rule_string(rule_string):
+    """
+    Normalizes a rule string so that rules differing only in whitespace share a cache entry.
+    Whitespace inside quoted string values is preserved.
+
+    Example:
+    Input: '  age >  30   AND department = "Sales"  '
+    Output: 'age > 30 AND department = "Sales"'
+
+    Args:
+        rule_string (str): The rule in string format.
+
+    Returns:
+        str: The normalized rule string.
+    """
+    return _WHITESPACE_PATTERN.sub(lambda match: match.group(1) or ' ', rule_string.strip())
+
+class LRUCache:
+    """
+    A bounded, thread-safe mapping that evicts the least recently used entry once it is full.
+
+    Attributes:
+        maxsize (int): The maximum number of entries kept in the cache.
+        hits (int): The number of lookups that found an entry.
+        misses (int): The number of lookups that did not find an entry.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Initializes an empty cache.
+
+        Args:
+            maxsize (int): The maximum number of entries. A size of 0 disables caching.
+        """
+        if maxsize < 0:
+            raise ValueError("maxsize must be a non-negative integer")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # Keys in least-recently-used to most-recently-used order
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Looks up a key and marks it as most recently used.
+
+        Args:
+            key: The cache key.
+            default: The value returned when the key is not cached.
+
+        Returns:
+            The cached value, or the default if the key is not cached.
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key: The cache key.
+            value: The value to store.
+        """
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)  # Evict the least recently used entry
+
+    def clear(self):
+        """
+        Removes every entry and resets the hit/miss counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters.
+
+        Returns:
+            Dict: The current size, maximum size, hits and misses of the cache.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+class RuleCache(LRUCache):
+    """
+    An LRU cache of parsed rule ASTs keyed by normalized rule text, so repeated rules skip tokenizing and parsing.
+    """
+
+    def get_or_create(self, rule_string, factory):
+        """
+        Returns the cached AST for a rule string, parsing it with the factory on a miss. The rule string is
+        parsed as given and cached under its normalized text.
+
+        Args:
+            rule_string (str): The rule in string format.
+            factory (Callable[[str], Node]): The function that parses a rule string into an AST (e.g., create_rule).
+
+        Returns:
+            Node: The root node of the AST.
+
+        Raises:
+            RuleEngineError: If the factory fails to parse the rule. Failed parses are not cached.
+        """
+        key = normalize_rule_string(rule_string)
+        ast = self.get(key)
+        if ast is None:
+            # Parse the caller's text, so error positions match it, outside the lock so slow parses do not block
+            # other threads
+            ast = factory(rule_string)
+            self.put(key, ast)
+        return ast
+
+class ResultCache(LRUCache):
+    """
+    An LRU cache of rule results keyed by the rule and the values of the attributes it reads, so evaluations
+    that repeat those values skip the evaluation whatever else the data contains.
+
+    Rules are identified by their AST object, which the rule cache and the rule registry keep the same for as
+    long as the rule is unchanged; a changed or evicted rule gets a new AST and its old entries simply age out.
+    Values of different types that compare equal (e.g., 1 and 1.0) are kept apart. Errors are never cached.
+
+    Attributes:
+        ttl (float, optional): Seconds an entry stays valid, or None for no expiry.
+        expirations (int): The number of lookups that found an expired entry (also counted as misses).
+        bypassed (int): The number of evaluations that could not use the cache (a missing attribute or a value
+            that cannot be hashed, such as a list).
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        Initializes an empty cache.
+
+        Args:
+            maxsize (int): The maximum number of entries. A size of 0 disables caching.
+            ttl (float, optional): Seconds an entry stays valid (default: no expiry).
+        """
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be a positive number of seconds")
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.expirations = 0
+        self.bypassed = 0
+
+    def get(self, key, default=None):
+        """
+        Looks up a key and marks it as most recently used. Expired entries are removed and count as misses.
+
+        Args:
+            key: The cache key.
+            default: The value returned when the key is not cached.
+
+        Returns:
+            The cached value, or the default if the key is not cached or has expired.
+        """
+        with self._lock:
+            try:
+                value, expires = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores a value until the cache's TTL elapses, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key: The cache key.
+            value: The value to store.
+        """
+        super().put(key, (value, time.monotonic() + self.ttl if self.ttl is not None else None))
+
+    def evaluate(self, ast, data, evaluator):
+        """
+        Returns the cached result of a rule for the values of the attributes it reads, evaluating it on a miss.
+
+        Args:
+            ast (Node): The root node of the rule's AST.
+            data (Dict): The data dictionary.
+            evaluator (Callable[[Dict], bool]): The function that evaluates the rule (e.g., its compiled form).
+
+        Returns:
+            bool: The result of the evaluation.
+
+        Raises:
+            RuleEngineError: (From the evaluator) if the rule cannot be evaluated against the data.
+        """
+        try:
+            values = tuple([data[attribute] for attribute in referenced_attributes(ast)])
+            key = (ast, values, tuple(map(type, values)))
+            hash(key)
+        except (KeyError, TypeError):
+            with self._lock:
+                self.bypassed += 1
+            return evaluator(data)  # Let the evaluator report a missing attribute
+        result = self.get(key)
+        if result is None:
+            result = evaluator(data)
+            self.put(key, result)
+        return result
+
+    def invalidate(self, ast):
+        """
+        Removes the entries of one rule, e.g. after the rule was modified.
+
+        Args:
+            ast (Node): The root node of the rule's AST, as passed to evaluate.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] is ast]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.expirations = self.bypassed = 0
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters.
+
+        Returns:
+            Dict: The size, maximum size, TTL, hits, misses, hit rate (hits / lookups, 0.0 before any lookup),
+                expirations and bypassed evaluations of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expirations': self.expirations,
+                'bypassed': self.bypassed
+            }
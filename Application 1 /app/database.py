@@ -1,7 +1,18 @@
-from sqlalchemy import create_engine, Column, Integer, String, LargeBinary  # Import SQLAlchemy components
+from sqlalchemy import create_engine, event, inspect, insert, select, update, text, func, Column, Integer, String, LargeBinary  # Import SQLAlchemy components
+from sqlalchemy.exc import IntegrityError, OperationalError  # Lost races for a rule hash, and locked databases
 from sqlalchemy.ext.declarative import declarative_base  # Base class for ORM models
 from sqlalchemy.orm import sessionmaker  # Session maker for handling database transactions
+import hashlib  # Hashing normalized rule text for deduplication
 import json  # For serializing and deserializing the AST
+import logging  # Reporting rules that cannot be decoded
+import os  # Reading the database location from the environment
+import sqlite3  # Version of the SQLite library behind SQLAlchemy's sqlite dialect
+import threading  # Initializing the schema once, on first use
+import time  # Backing off before retrying a write
+from app.cache import normalize_rule_string  # Rules differing only in whitespace are the same rule
+from app.rules import Node, RuleEngineError, deserialize_ast, pack_ast, unpack_ast, AST_MAGIC  # AST storage formats
+
+logger = logging.getLogger(__name__)
 
 # Define the base class for ORM models
 Base = declarative_base()
@@ -15,67 +26,457 @@ class Rule(Base):
     Columns:
         id: Primary key, auto-incrementing integer.
         rule_string: The rule in string format.
-        ast: The abstract syntax tree (AST) serialized and stored as a binary blob.
+        ast: The abstract syntax tree (AST) packed into a binary blob (see app.rules.pack_ast). Rows written by
+            older versions hold the AST as JSON, which is still read.
+        version: Position of the rule's latest change in a sequence shared by all rules (see RuleVersion), used
+            by workers to find rules that changed since they last looked. Unique.
+        rule_hash: SHA-256 of the normalized rule string, unique so that saving an existing rule returns its id
+            instead of storing a duplicate. NULL for duplicates stored before the column existed.
     """
     __tablename__ = 'rules'  # Name of the table
     id = Column(Integer, primary_key=True)  # Primary key, unique identifier for each rule
     rule_string = Column(String, nullable=False)  # The rule string itself (e.g., "age > 18 AND income < 5000")
     ast = Column(LargeBinary, nullable=False)  # The AST in serialized binary form
+    version = Column(Integer, nullable=False, unique=True, index=True)  # Bumped every time the rule is saved
+    rule_hash = Column(String(64), nullable=True, unique=True, index=True)  # Identity of the rule text
+
+# Define the RuleVersion model holding the version sequence shared by all rules
+class RuleVersion(Base):
+    """
+    This class represents the 'rule_versions' table: a single row holding the last version given to a rule.
+    
+    Writers take versions by incrementing the row at the start of their transaction, which holds the write
+    lock until they commit, so versions are never handed out twice and become visible in increasing order.
+    
+    Columns:
+        id: Primary key, always 1.
+        last: The highest version handed out so far.
+    """
+    __tablename__ = 'rule_versions'  # Name of the table
+    id = Column(Integer, primary_key=True)  # The only row has id 1
+    last = Column(Integer, nullable=False)  # The highest version handed out so far
+
+# Database location, overridable through the RULE_ENGINE_DATABASE_URL environment variable
+DATABASE_URL = os.environ.get('RULE_ENGINE_DATABASE_URL', 'sqlite:///rule_engine.db')
 
-# Create a SQLite database engine. The database will be stored in a file named "rule_engine.db"
-engine = create_engine('sqlite:///rule_engine.db')
+# Number of pooled connections kept open per process, overridable through RULE_ENGINE_DATABASE_POOL_SIZE
+DATABASE_POOL_SIZE = int(os.environ.get('RULE_ENGINE_DATABASE_POOL_SIZE', '5'))
+
+# Attempts made by the write functions when they lose a race with another worker or find the database locked
+WRITE_ATTEMPTS = 5
+
+# Rows fetched or written per statement by the bulk functions (kept below SQLite's bound parameter limit)
+CHUNK_SIZE = 500
+
+# Oldest SQLite library supporting the RETURNING and ON CONFLICT clauses the write functions use
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+def _create_engine(url):
+    """
+    Creates an engine for a database URL. File-backed SQLite databases get a connection pool and are switched
+    to write-ahead logging, so readers never block the writer and concurrent workers wait for locks instead of
+    failing.
+    
+    Raises:
+        RuntimeError: If the database is SQLite and the SQLite library is older than MIN_SQLITE_VERSION.
+    """
+    if url.startswith('sqlite') and sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(f"The rule engine needs SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer "
+                           f"(for RETURNING and ON CONFLICT), but Python is linked against SQLite {sqlite3.sqlite_version}")
+    if not url.startswith('sqlite') or url in ('sqlite://', 'sqlite:///:memory:'):
+        return create_engine(url)
+
+    new_engine = create_engine(
+        url,
+        pool_size=DATABASE_POOL_SIZE,  # Connections kept open and reused across requests
+        max_overflow=DATABASE_POOL_SIZE,  # Extra connections allowed under bursts
+        connect_args={'check_same_thread': False, 'timeout': 30}  # Pooled connections move between threads
+    )
+
+    @event.listens_for(new_engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")  # Readers do not block the writer and vice versa
+        cursor.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe with WAL
+        cursor.execute("PRAGMA busy_timeout=30000")  # Wait up to 30 s for a lock held by another worker
+        cursor.close()
+
+    return new_engine
+
+# Create a SQLite database engine. By default the database will be stored in a file named "rule_engine.db"
+engine = _create_engine(DATABASE_URL)
 
 # Create a session maker bound to the engine, which will be used to interact with the database
 Session = sessionmaker(bind=engine)
 
+# The schema is created on first use rather than on import, so importing the module never touches the database
+_initialized = False
+_initialize_lock = threading.Lock()
+
 # Function to initialize the database schema (create tables)
 def initialize_database():
     """
-    Initializes the database by creating all tables defined in the ORM models (if they don't exist already).
+    Initializes the database by creating all tables defined in the ORM models (if they don't exist already),
+    adds the 'version' and 'rule_hash' columns to 'rules' tables created before they existed, makes versions
+    unique (renumbering duplicates written by earlier versions) and seeds the version sequence.
+    
+    The functions of this module call it on first use, so it only needs to be called directly to set up a
+    database ahead of time.
     """
+    global _initialized
     Base.metadata.create_all(engine)  # Create all tables defined in the Base class (including the 'rules' table)
 
-# Function to save a new rule into the database
-def save_rule(rule_string, ast):
+    columns = {column['name'] for column in inspect(engine).get_columns('rules')}
+    if 'version' not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE rules ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+    if 'rule_hash' not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE rules ADD COLUMN rule_hash VARCHAR(64)"))
+            # Hash the existing rules; only the first copy of a duplicated rule gets the hash
+            seen, updates = set(), []
+            for rule_id, rule_string in connection.execute(text("SELECT id, rule_string FROM rules ORDER BY id")):
+                digest = rule_hash(rule_string)
+                if digest not in seen:
+                    seen.add(digest)
+                    updates.append({'id': rule_id, 'rule_hash': digest})
+            if updates:
+                connection.execute(text("UPDATE rules SET rule_hash = :rule_hash WHERE id = :id"), updates)
+            connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_rules_rule_hash ON rules (rule_hash)"))
+    indexes = {index['name']: index for index in inspect(engine).get_indexes('rules')}
+    if not indexes.get('ix_rules_version', {}).get('unique'):
+        with engine.begin() as connection:
+            # Give every rule sharing a version with an earlier one a new version above all others
+            seen, updates = set(), []
+            last = connection.execute(text("SELECT max(version) FROM rules")).scalar() or 0
+            for rule_id, version in connection.execute(text("SELECT id, version FROM rules ORDER BY version, id")):
+                if version in seen:
+                    last += 1
+                    updates.append({'id': rule_id, 'version': last})
+                seen.add(version)
+            if updates:
+                connection.execute(text("UPDATE rules SET version = :version WHERE id = :id"), updates)
+            connection.execute(text("DROP INDEX IF EXISTS ix_rules_version"))
+            connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_rules_version ON rules (version)"))
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO rule_versions (id, last) SELECT 1, coalesce(max(version), 0) FROM rules "
+                                "WHERE true ON CONFLICT (id) DO NOTHING"))
+    _initialized = True
+
+def _ensure_initialized():
     """
-    Saves a rule into the database.
+    Initializes the database schema the first time the database is used.
+    """
+    if not _initialized:
+        with _initialize_lock:
+            if not _initialized:
+                initialize_database()
+
+# Function to point the module at another database
+def configure_database(url):
+    """
+    Binds the module to the database at the given URL and initializes its schema.
     
     Args:
-        rule_string (str): The rule in string format.
-        ast (dict): The abstract syntax tree (AST) in dictionary format.
+        url (str): The SQLAlchemy database URL (e.g., "sqlite:///rule_engine.db").
+    """
+    global engine, Session, _initialized
+    engine.dispose()  # Close the pooled connections to the previous database
+    engine = _create_engine(url)
+    Session = sessionmaker(bind=engine)
+    _initialized = False
+    initialize_database()
+
+def database_path():
+    """
+    Returns the path of the database file, e.g. to store files next to it.
     
-    The AST is serialized to JSON and then encoded as binary before saving to the database.
+    Returns:
+        str: The path of the SQLite database file, or None for in-memory and non-SQLite databases.
+    """
+    if engine.url.get_backend_name() != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return None
+    return engine.url.database
+
+def _next_versions(session, count=1):
+    """
+    Takes `count` consecutive values of the version sequence shared by all rules and returns the first.
+
+    This writes to the sequence, so it should be the first statement of the transaction: the transaction then
+    holds the write lock (on SQLite) or the sequence row's lock until it ends, and concurrent writers wait for
+    it instead of taking the same versions. A count of 0 only takes the lock.
+    """
+    statement = update(RuleVersion).where(RuleVersion.id == 1).values(last=RuleVersion.last + count)
+    return session.execute(statement.returning(RuleVersion.last)).scalar_one() - count + 1
+
+def _retry_delay(attempt):
+    """
+    Returns how long to wait before retrying a write that lost a race or found the database locked.
+    """
+    return 0.05 * 2 ** attempt
+
+def current_version():
+    """
+    Returns the highest version of any stored rule.
+    
+    Returns:
+        int: The version of the most recently saved rule, or -1 if no rule is stored.
     """
+    _ensure_initialized()
     session = Session()  # Start a new session to interact with the database
     try:
-        # Create a new Rule object with the rule string and the serialized AST
-        new_rule = Rule(rule_string=rule_string, ast=json.dumps(ast).encode())  # Encode AST as binary
-        session.add(new_rule)  # Add the new rule to the session
-        session.commit()  # Commit the session to save changes to the database
-    except Exception as e:
-        session.rollback()  # Rollback changes if there is an error
-        raise e  # Re-raise the exception for higher-level handling
+        version = session.query(func.max(Rule.version)).scalar()
+        return -1 if version is None else version
     finally:
         session.close()  # Ensure the session is closed
 
-# Function to load all rules from the database
-def load_rules():
+def rule_hash(rule_string):
     """
-    Loads all rules from the database.
+    Returns the hash identifying a rule: the SHA-256 hex digest of its normalized rule string.
+    
+    Args:
+        rule_string (str): The rule in string format.
     
     Returns:
-        List[Tuple[str, dict]]: A list of tuples, where each tuple contains the rule string and its corresponding AST (deserialized).
+        str: A 64-character hex digest, equal for rule strings that differ only in whitespace.
+    """
+    return hashlib.sha256(normalize_rule_string(rule_string).encode()).hexdigest()
+
+def _ids_by_hash(session, hashes):
+    """
+    Returns the ids of the stored rules with the given hashes, as a dictionary keyed by hash.
+    """
+    hashes = list(hashes)
+    found = {}
+    for start in range(0, len(hashes), CHUNK_SIZE):
+        query = select(Rule.rule_hash, Rule.id).where(Rule.rule_hash.in_(hashes[start:start + CHUNK_SIZE]))
+        found.update(session.execute(query).all())
+    return found
+
+def _encode_ast(ast):
+    """
+    Packs an AST (a Node, or the dictionary form produced by serialize_ast) for storage.
+    """
+    if not isinstance(ast, Node):
+        ast = deserialize_ast(ast)
+    return pack_ast(ast)
+
+def _decode_ast(blob):
+    """
+    Decodes a stored AST, in the binary format or as JSON, returning None if it is neither (e.g., rows written
+    by the earliest versions).
     """
-    session = Session()  # Start a new session to interact with the database
     try:
-        # Query all rules from the 'rules' table
-        rules = session.query(Rule).all()
-        # Deserialize the binary AST back into its original dictionary format
-        return [(rule.rule_string, json.loads(rule.ast.decode())) for rule in rules]  # Return rule string and decoded AST
-    except Exception as e:
-        raise e  # Re-raise the exception for higher-level handling
-    finally:
-        session.close()  # Ensure the session is closed
+        if isinstance(blob, bytes) and blob.startswith(AST_MAGIC):
+            return unpack_ast(blob)
+        return deserialize_ast(json.loads(blob.decode() if isinstance(blob, bytes) else blob))
+    except (ValueError, UnicodeDecodeError, TypeError, KeyError, AttributeError, RuleEngineError):
+        return None
+
+# Function to save a new rule into the database
+def save_rule(rule_string, ast):
+    """
+    Saves a rule into the database, unless the same rule (ignoring whitespace) is already stored.
+    
+    Args:
+        rule_string (str): The rule in string format.
+        ast (Node or dict): The abstract syntax tree (AST), as a Node or in dictionary format.
+    
+    Returns:
+        int: The id of the new rule, or of the stored copy of the same rule.
+    
+    The AST is packed into the compact binary format before saving to the database.
+    """
+    return save_rules([(rule_string, ast)])[0]
+
+# Function to save many rules in one transaction
+def save_rules(rules):
+    """
+    Saves many rules in one transaction, skipping rules that are already stored or repeated in the input.
+    
+    Args:
+        rules (Iterable[Tuple[str, Node or dict]]): (rule string, AST) pairs.
+    
+    Returns:
+        List[int]: The id of each rule, in input order. Duplicates get the id of the stored copy.
+    """
+    _ensure_initialized()
+    rules = list(rules)
+    hashes = [rule_hash(rule_string) for rule_string, _ in rules]
+    for attempt in range(WRITE_ATTEMPTS):
+        session = Session()  # Start a new session to interact with the database
+        try:
+            ids = _ids_by_hash(session, set(hashes))
+            if all(digest in ids for digest in hashes):
+                return [ids[digest] for digest in hashes]  # Nothing new to store
+            session.rollback()  # End the read, so the write transaction starts with the version lock
+            _next_versions(session, 0)
+            ids = _ids_by_hash(session, set(hashes))
+            rows = {}
+            for (rule_string, ast), digest in zip(rules, hashes):
+                if digest not in ids and digest not in rows:
+                    rows[digest] = {'rule_string': rule_string, 'ast': _encode_ast(ast), 'rule_hash': digest}
+            rows = list(rows.values())
+            if rows:
+                version = _next_versions(session, len(rows))
+                for offset, row in enumerate(rows):
+                    row['version'] = version + offset
+            for start in range(0, len(rows), CHUNK_SIZE):
+                # One multi-row INSERT per chunk, returning the new ids
+                inserted = session.execute(insert(Rule).returning(Rule.rule_hash, Rule.id), rows[start:start + CHUNK_SIZE])
+                ids.update(inserted.all())
+            session.commit()  # Commit the session to save changes to the database
+            return [ids[digest] for digest in hashes]
+        except (IntegrityError, OperationalError):
+            session.rollback()  # Another worker stored one of the rules first or held the lock too long; retry
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+        except Exception as e:
+            session.rollback()  # Rollback changes if there is an error
+            raise e  # Re-raise the exception for higher-level handling
+        finally:
+            session.close()  # Ensure the session is closed
+        time.sleep(_retry_delay(attempt))
+
+# Function to replace an existing rule
+def update_rule(rule_id, rule_string, ast):
+    """
+    Replaces the rule string and AST of an existing rule and bumps its version. If another rule already has
+    the new rule string, the updated rule keeps working but is no longer the target of deduplication.
+    
+    Args:
+        rule_id (int): The id of the rule to update.
+        rule_string (str): The new rule in string format.
+        ast (Node or dict): The new abstract syntax tree (AST), as a Node or in dictionary format.
+    
+    Returns:
+        int: The rule's new version, or None if no rule has the given id.
+    """
+    _ensure_initialized()
+    for attempt in range(WRITE_ATTEMPTS):
+        session = Session()  # Start a new session to interact with the database
+        try:
+            version = _next_versions(session)
+            rule = session.get(Rule, rule_id)
+            if rule is None:
+                session.rollback()
+                return None
+            digest = rule_hash(rule_string)
+            owner = _ids_by_hash(session, [digest]).get(digest)
+            rule.rule_string = rule_string
+            rule.rule_hash = digest if owner in (None, rule_id) else None
+            rule.ast = _encode_ast(ast)  # Pack AST as binary
+            rule.version = version
+            session.commit()  # Commit the session to save changes to the database
+            return version
+        except OperationalError:
+            session.rollback()  # The database stayed locked by another worker; retry
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+        except Exception as e:
+            session.rollback()  # Rollback changes if there is an error
+            raise e  # Re-raise the exception for higher-level handling
+        finally:
+            session.close()  # Ensure the session is closed
+        time.sleep(_retry_delay(attempt))
+
+# Function to load all rules from the database
+def load_rules(with_ids=False):
+    """
+    Loads all rules from the database into a list.
+    
+    This holds every rule in memory at once, which is convenient for small rule sets, tests and scripts. The
+    registry, the matcher and the scorer stream rules with iter_rules and iter_rules_since instead.
+    
+    Args:
+        with_ids (bool): Whether to include each rule's id in the returned tuples.
+    
+    Returns:
+        List[Tuple[str, Node]]: A list of tuples, where each tuple contains the rule string and its corresponding AST (deserialized).
+            With `with_ids`, each tuple is (id, rule string, AST) instead.
+    """
+    return list(iter_rules(with_ids=with_ids))
+
+# Function to stream all rules from the database
+def iter_rules(with_ids=False, chunk_size=CHUNK_SIZE):
+    """
+    Yields all rules in id order, fetching them in chunks so that only one chunk is in memory at a time.
+    
+    Each chunk is read in its own short session, continuing after the last id seen, so a long scan neither
+    holds a connection nor keeps a read transaction open.
+    
+    Args:
+        with_ids (bool): Whether to include each rule's id in the yielded tuples.
+        chunk_size (int): The number of rules fetched per query.
+    
+    Returns:
+        Iterator[Tuple]: (rule string, AST) tuples, or (id, rule string, AST) with `with_ids`. The AST is None
+            for rows whose stored AST cannot be decoded.
+    """
+    _ensure_initialized()
+    last_id = None
+    while True:
+        session = Session()  # Start a new session to interact with the database
+        try:
+            query = select(Rule.id, Rule.rule_string, Rule.ast).order_by(Rule.id).limit(chunk_size)
+            if last_id is not None:
+                query = query.where(Rule.id > last_id)
+            rows = session.execute(query).all()
+        finally:
+            session.close()  # Ensure the session is closed
+        for rule_id, rule_string, blob in rows:
+            # Unpack the binary AST back into its tree of nodes
+            yield (rule_id, rule_string, _decode_ast(blob)) if with_ids else (rule_string, _decode_ast(blob))
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
 
-# Initialize the database (create tables if they don't exist)
-initialize_database()
+# Function to load the rules that changed after a given version
+def load_rules_since(version):
+    """
+    Loads the rules whose version is greater than the given one, in version order, into a list (see
+    iter_rules_since).
+    
+    Args:
+        version (int): The highest version already seen by the caller (-1 to load every rule).
+    
+    Returns:
+        List[Tuple[int, int, str, Optional[Node]]]: A list of (id, version, rule string, AST) tuples. The AST is
+            None for rows whose stored AST cannot be decoded.
+    """
+    return list(iter_rules_since(version))
+
+# Function to stream the rules that changed after a given version
+def iter_rules_since(version, chunk_size=CHUNK_SIZE):
+    """
+    Yields the rules whose version is greater than the given one, in version order, fetching them in chunks
+    so that only one chunk is in memory at a time.
+    
+    Each chunk is read in its own short session, continuing after the last version seen (versions are
+    unique). A rule changed during the scan gets a new, higher version and is yielded again with it.
+    
+    Args:
+        version (int): The highest version already seen by the caller (-1 to load every rule).
+        chunk_size (int): The number of rules fetched per query.
+    
+    Returns:
+        Iterator[Tuple[int, int, str, Optional[Node]]]: (id, version, rule string, AST) tuples. The AST is None
+            for rows whose stored AST cannot be decoded.
+    """
+    _ensure_initialized()
+    while True:
+        session = Session()  # Start a new session to interact with the database
+        try:
+            query = (select(Rule.id, Rule.version, Rule.rule_string, Rule.ast).where(Rule.version > version)
+                     .order_by(Rule.version).limit(chunk_size))
+            rows = session.execute(query).all()
+        finally:
+            session.close()  # Ensure the session is closed
+        for rule_id, rule_version, rule_string, blob in rows:
+            ast = _decode_ast(blob)
+            if ast is None:
+                logger.warning("Rule %s has an undecodable AST", rule_id)
+            yield rule_id, rule_version, rule_string, ast
+        if len(rows) < chunk_size:
+            return
+        version = rows[-1][1]
@@ -0,0 +1,212 @@
+from abc import ABC, abstractmethod  # The pool each pooled mode starts
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor  # Worker pools for the pooled modes
+import hashlib  # Content-based keys for rules shipped to worker processes
+import multiprocessing  # Start method of the worker processes
+import numpy as np  # Joining the per-chunk result arrays
+import threading  # Lock around lazily starting a worker pool
+from app.cache import LRUCache
+from app.rules import evaluate_rule_batch, pack_ast, unpack_ast, RuleEngineError
+
+EXECUTOR_MODES = ('inline', 'thread', 'process')
+
+class InlineExecutor:
+    """
+    Evaluates rules in the calling thread. This is the default and has no overhead.
+
+    Attributes:
+        chunk_size (int): The number of records evaluated per task (unused inline; kept for a uniform interface).
+    """
+
+    mode = 'inline'
+
+    def __init__(self, max_workers=None, chunk_size=10000):
+        """
+        Initializes the executor.
+
+        Args:
+            max_workers (int, optional): Ignored; accepted so every mode can be built the same way.
+            chunk_size (int): The number of records evaluated per task.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        self.chunk_size = chunk_size
+
+    def evaluate_batch(self, ast, records):
+        """
+        Evaluates a rule against a list of records (see evaluate_rule_batch).
+
+        Args:
+            ast (Node): The root node of the rule's AST.
+            records (List[Dict]): The data dictionaries to evaluate.
+
+        Returns:
+            Tuple[np.ndarray, List[Optional[str]]]: A boolean result and an error message (or None) per record.
+
+        Raises:
+            RuleEngineError: If the records are not a list of dictionaries or the AST is invalid.
+        """
+        return evaluate_rule_batch(ast, records)
+
+    def evaluate_rules(self, asts, records):
+        """
+        Evaluates several rules against the same records.
+
+        Args:
+            asts (List[Node]): The root nodes of the rules' ASTs.
+            records (List[Dict]): The data dictionaries to evaluate.
+
+        Returns:
+            List[Tuple[np.ndarray, List[Optional[str]]]]: The evaluate_batch result of each rule, in order.
+        """
+        return [self.evaluate_batch(ast, records) for ast in asts]
+
+    def shutdown(self):
+        """
+        Releases the executor's workers, if any.
+        """
+
+class _PooledExecutor(InlineExecutor, ABC):
+    """
+    Base class of the executors that split records into chunks and evaluate the chunks on a worker pool.
+    """
+
+    def __init__(self, max_workers=None, chunk_size=10000):
+        super().__init__(max_workers, chunk_size)
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        """
+        Returns the worker pool, starting it on first use.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self._create_pool()
+            return self._pool
+
+    @abstractmethod
+    def _create_pool(self):
+        """
+        Starts and returns the worker pool (a concurrent.futures.Executor).
+        """
+
+    def _submit(self, ast, chunk):
+        """
+        Submits the evaluation of one chunk of records and returns its future.
+        """
+        return self._get_pool().submit(evaluate_rule_batch, ast, chunk)
+
+    def evaluate_batch(self, ast, records):
+        return self.evaluate_rules([ast], records)[0]
+
+    def evaluate_rules(self, asts, records):
+        if not isinstance(records, list) or not all(issubclass(cls, dict) for cls in set(map(type, records))):
+            raise RuleEngineError("Invalid data format")
+        if len(records) <= self.chunk_size and len(asts) == 1:
+            return [evaluate_rule_batch(asts[0], records)]  # Too small to be worth a round trip to a worker
+
+        chunks = [records[start:start + self.chunk_size] for start in range(0, len(records), self.chunk_size)] or [[]]
+        futures = [[self._submit(ast, chunk) for chunk in chunks] for ast in asts]  # All in flight together
+        evaluated = []
+        for rule_futures in futures:
+            parts = [future.result() for future in rule_futures]
+            results = np.concatenate([part[0] for part in parts])
+            errors = [error for part in parts for error in part[1]]
+            evaluated.append((results, errors))
+        return evaluated
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+class ThreadExecutor(_PooledExecutor):
+    """
+    Evaluates chunks of records on a thread pool. NumPy releases the GIL for much of the vectorized work, so
+    large batches overlap with each other and with request handling.
+    """
+
+    mode = 'thread'
+
+    def _create_pool(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='rule-executor')
+
+# Compiled rules held by a worker process, keyed by the digest of their packed AST
+_worker_rules = LRUCache(maxsize=256)
+
+def _evaluate_in_worker(key, packed, records):
+    """
+    Evaluates a chunk of records in a worker process against a rule identified by key, unpacking and compiling
+    the packed AST only the first time the worker sees the rule.
+    """
+    ast = _worker_rules.get(key)
+    if ast is None:
+        ast = unpack_ast(packed)
+        _worker_rules.put(key, ast)
+    return evaluate_rule_batch(ast, records)
+
+class ProcessExecutor(_PooledExecutor):
+    """
+    Evaluates chunks of records on a pool of worker processes, so batch scoring uses every core and does not
+    hold the web worker's GIL.
+
+    Compiled functions cannot be pickled, so each rule is packed once (see pack_ast) and identified by a digest
+    of its packed form. Every task carries the packed rule (a few hundred bytes) along with its records, so
+    all chunks are submitted at once whichever worker picks them up; each worker compiles a rule the first
+    time it sees its digest and keeps it for every later chunk.
+    """
+
+    mode = 'process'
+
+    def __init__(self, max_workers=None, chunk_size=10000, start_method='spawn'):
+        """
+        Initializes the executor. Worker processes are started on first use.
+
+        Args:
+            max_workers (int, optional): The number of worker processes (default: the number of CPUs).
+            chunk_size (int): The number of records sent to a worker per task.
+            start_method (str): The multiprocessing start method. 'spawn' is safe in threaded web servers.
+        """
+        super().__init__(max_workers, chunk_size)
+        self.start_method = start_method
+        self._keys = LRUCache(maxsize=1024)  # id(ast) -> (ast, digest, packed AST)
+
+    def _create_pool(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context(self.start_method))
+
+    def _shipping(self, ast):
+        """
+        Returns the digest and packed form of a rule, packing it only once.
+        """
+        entry = self._keys.get(id(ast))
+        if entry is None or entry[0] is not ast:  # An id can be reused once its AST is garbage collected
+            packed = pack_ast(ast)
+            entry = (ast, hashlib.blake2b(packed, digest_size=16).digest(), packed)
+            self._keys.put(id(ast), entry)
+        return entry[1], entry[2]
+
+    def _submit(self, ast, chunk):
+        key, packed = self._shipping(ast)
+        return self._get_pool().submit(_evaluate_in_worker, key, packed, chunk)
+
+def create_executor(mode='inline', max_workers=None, chunk_size=10000):
+    """
+    Creates an evaluation executor.
+
+    Args:
+        mode (str): 'inline' (evaluate in the calling thread), 'thread' (thread pool) or 'process' (process pool).
+        max_workers (int, optional): The number of workers of the pooled modes.
+        chunk_size (int): The number of records per task in the pooled modes.
+
+    Returns:
+        InlineExecutor: An executor of the requested mode.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    executors = {'inline': InlineExecutor, 'thread': ThreadExecutor, 'process': ProcessExecutor}
+    if mode not in executors:
+        raise ValueError(f"Unknown executor mode '{mode}', expected one of {', '.join(EXECUTOR_MODES)}")
+    return executors[mode](max_workers=max_workers, chunk_size=chunk_size)
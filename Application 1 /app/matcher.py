@@ -0,0 +1,252 @@
+from bisect import bisect_left, bisect_right  # Binary search over sorted threshold arrays
+from collections import Counter  # Counting true predicates per candidate rule
+from itertools import chain  # Iterating over the posting lists of all true predicates
+import logging  # Reporting stored rules that cannot be indexed
+from app.rules import OPERATORS, RuleEngineError, create_rule
+
+logger = logging.getLogger(__name__)
+
+class _AttributeIndex:
+    """
+    Indexes the distinct predicates on one attribute so that all of them can be decided with a few lookups.
+
+    Equality predicates are kept in a hash map from value to predicate ids. Range predicates are kept in one
+    sorted threshold array per comparison operator and type family (numbers or strings), so the predicates that
+    hold for a value form a prefix or suffix of the array found by binary search.
+    """
+
+    def __init__(self):
+        self.equals = {}  # value -> list of predicate ids for "attribute = value"
+        self.ranges = {}  # (family, operator) -> (sorted thresholds, predicate ids in the same order)
+        self._pending = {}  # (family, operator) -> unsorted (threshold, predicate id) pairs
+        self._dirty = False
+
+    def add(self, operator_symbol, value, predicate_id):
+        """
+        Adds a predicate "attribute <operator_symbol> value" to the index.
+        """
+        if operator_symbol == '=':
+            self.equals.setdefault(value, []).append(predicate_id)
+            return
+        family = _type_family(value)
+        if family is None:
+            raise RuleEngineError(f"Cannot index comparison with {value!r}")
+        self._pending.setdefault((family, operator_symbol), []).append((value, predicate_id))
+        self._dirty = True
+
+    def true_predicates(self, value, out):
+        """
+        Appends the ids of the predicates that hold for a record value to `out`.
+        """
+        if self._dirty:
+            self._build()
+
+        try:
+            out.extend(self.equals.get(value, ()))
+        except TypeError:
+            pass  # Unhashable values cannot equal any rule constant
+
+        family = _type_family(value)
+        if family is None:
+            return
+        ranges = self.ranges
+        entry = ranges.get((family, '>'))
+        if entry:  # value > threshold for every threshold strictly below the value
+            out.extend(entry[1][:bisect_left(entry[0], value)])
+        entry = ranges.get((family, '>='))
+        if entry:  # value >= threshold for every threshold up to the value
+            out.extend(entry[1][:bisect_right(entry[0], value)])
+        entry = ranges.get((family, '<'))
+        if entry:  # value < threshold for every threshold strictly above the value
+            out.extend(entry[1][bisect_right(entry[0], value):])
+        entry = ranges.get((family, '<='))
+        if entry:  # value <= threshold for every threshold from the value up
+            out.extend(entry[1][bisect_left(entry[0], value):])
+
+    def _build(self):
+        """
+        Sorts the pending range predicates into threshold arrays.
+        """
+        for key, pairs in self._pending.items():
+            thresholds, predicate_ids = self.ranges.get(key, ([], []))
+            merged = sorted(list(zip(thresholds, predicate_ids)) + pairs, key=lambda pair: pair[0])
+            self.ranges[key] = ([threshold for threshold, _ in merged], [predicate_id for _, predicate_id in merged])
+        self._pending = {}
+        self._dirty = False
+
+def _type_family(value):
+    """
+    Returns the family of mutually comparable types a value belongs to ('number' or 'string'), or None.
+    """
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    return None
+
+class RuleMatcher:
+    """
+    Finds which of many rules match a record without evaluating every rule.
+
+    Every distinct operand ("predicate") across all rules is stored once and indexed by attribute and
+    comparison (see _AttributeIndex). Matching a record decides all predicates with one lookup per attribute
+    in the record and shares each result between every rule that uses the predicate. Because rules only
+    combine predicates with AND/OR, a rule can only match if at least one of its predicates holds, so only
+    those candidate rules are looked at: conjunctions are decided by counting their true predicates and
+    other rules by evaluating their AND/OR structure over the true predicates. Rules that hold whatever the
+    record (folded to a true constant by optimize_rule) match every record.
+
+    Unlike evaluate_rule, a predicate on an attribute that is missing from the record, or whose value cannot
+    be compared with the rule's value, is treated as false rather than raising an error.
+    """
+
+    def __init__(self):
+        self._predicates = {}  # (attribute, operator, value) -> predicate id
+        self._attributes = {}  # attribute -> _AttributeIndex
+        self._rules_by_predicate = []  # predicate id -> ids of the rules using it
+        self._conjunctions = {}  # rule id -> number of distinct predicates, for rules that are plain ANDs
+        self._formulas = {}  # rule id -> callable deciding the rule from the set of true predicate ids
+        self._positions = {}  # rule id -> order in which the rule was added
+        self._always = []  # ids of the rules that match every record (rules folded to true by optimize_rule)
+
+    def __len__(self):
+        return len(self._positions)
+
+    @classmethod
+    def from_database(cls):
+        """
+        Builds a matcher over every rule stored in the database. Rules that can be neither decoded nor parsed
+        are logged and skipped, as RuleRegistry.refresh does.
+
+        Returns:
+            RuleMatcher: A matcher keyed by the rules' database ids.
+        """
+        from app.database import iter_rules  # Imported here so the matcher can be used without a database
+        matcher = cls()
+        for rule_id, rule_string, ast in iter_rules(with_ids=True):
+            try:
+                node = ast if ast is not None else create_rule(rule_string)
+                if node is None:
+                    raise RuleEngineError("Empty rule")
+                matcher.add_rule(rule_id, node)
+            except RuleEngineError as e:
+                logger.warning("Skipping stored rule %s: %s", rule_id, e)
+        return matcher
+
+    def add_rule(self, rule_id, ast):
+        """
+        Adds a rule to the matcher.
+
+        Args:
+            rule_id: The identifier reported by match() when the rule matches.
+            ast (Node): The root node of the rule's AST.
+
+        Raises:
+            RuleEngineError: If the rule id is already used or the AST contains an unknown operator or node type.
+        """
+        if rule_id in self._positions:
+            raise RuleEngineError(f"Rule '{rule_id}' already added")
+
+        conjuncts = _conjuncts(ast)
+        if conjuncts is not None:
+            predicate_ids = {self._predicate_id(condition) for condition in conjuncts}
+            self._conjunctions[rule_id] = len(predicate_ids)
+        else:
+            predicate_ids = set()
+            self._formulas[rule_id] = self._compile_formula(ast, predicate_ids)
+            if self._formulas[rule_id](frozenset()):
+                self._always.append(rule_id)  # True without any true predicate, so never found through one
+                predicate_ids = set()
+        for predicate_id in predicate_ids:
+            self._rules_by_predicate[predicate_id].append(rule_id)
+        self._positions[rule_id] = len(self._positions)
+
+    def match(self, record):
+        """
+        Returns the ids of the rules that match a record.
+
+        Args:
+            record (Dict): The data dictionary to match.
+
+        Returns:
+            List: The ids of the matching rules, in the order the rules were added.
+
+        Raises:
+            RuleEngineError: If the record is not a dictionary.
+        """
+        if not isinstance(record, dict):
+            raise RuleEngineError("Invalid data format")
+
+        # Decide every predicate once, with one index lookup per attribute
+        true_predicates = []
+        for attribute, value in record.items():
+            index = self._attributes.get(attribute)
+            if index is not None:
+                index.true_predicates(value, true_predicates)
+        true_set = set(true_predicates)
+
+        # Only rules that use at least one true predicate can match
+        rules_by_predicate = self._rules_by_predicate
+        hits = Counter(chain.from_iterable(rules_by_predicate[predicate_id] for predicate_id in true_set))
+
+        conjunctions, formulas = self._conjunctions, self._formulas
+        matches = list(self._always)
+        for rule_id, count in hits.items():
+            required = conjunctions.get(rule_id)
+            if required is not None:
+                if count == required:
+                    matches.append(rule_id)
+            elif formulas[rule_id](true_set):
+                matches.append(rule_id)
+        return sorted(matches, key=self._positions.__getitem__)
+
+    def _predicate_id(self, condition):
+        """
+        Returns the id of a predicate, adding it to the attribute index the first time it is seen.
+        """
+        attribute, operator_symbol, value = condition
+        if operator_symbol not in OPERATORS:
+            raise RuleEngineError(f"Unknown operator: {operator_symbol}")
+        key = (attribute, operator_symbol, value)
+        predicate_id = self._predicates.get(key)
+        if predicate_id is None:
+            predicate_id = len(self._rules_by_predicate)
+            self._attributes.setdefault(attribute, _AttributeIndex()).add(operator_symbol, value, predicate_id)
+            self._predicates[key] = predicate_id
+            self._rules_by_predicate.append([])
+        return predicate_id
+
+    def _compile_formula(self, node, predicate_ids):
+        """
+        Compiles an AST into a callable over the set of true predicate ids, collecting the ids it uses.
+        """
+        if node.node_type == "operand":
+            predicate_id = self._predicate_id(node.value)
+            predicate_ids.add(predicate_id)
+            return lambda true_set: predicate_id in true_set
+        if node.node_type == "operator" and node.value in ("AND", "OR"):
+            left = self._compile_formula(node.left, predicate_ids)
+            right = self._compile_formula(node.right, predicate_ids)
+            if node.value == "AND":
+                return lambda true_set: left(true_set) and right(true_set)
+            return lambda true_set: left(true_set) or right(true_set)
+        if node.node_type == "constant":
+            value = bool(node.value)
+            return lambda true_set: value
+        raise RuleEngineError(f"Unknown node type: {node.node_type}")
+
+def _conjuncts(ast):
+    """
+    Returns the conditions of an AST made only of operands joined by AND, or None for any other shape.
+    """
+    conditions = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if node.node_type == "operand":
+            conditions.append(node.value)
+        elif node.node_type == "operator" and node.value == "AND":
+            stack.extend((node.left, node.right))
+        else:
+            return None
+    return conditions
@@ -0,0 +1,168 @@
+from bisect import bisect_left  # Finding the bucket of an observation
+import threading  # Locks for thread-safe counters
+from app import rules
+
+# Latency buckets in seconds, from 1 microsecond to 1 second
+LATENCY_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0)
+# AST size buckets in nodes (a balanced tree of 2^k - 1 nodes has depth k)
+SIZE_BUCKETS = (1, 3, 7, 15, 31, 63, 127, 255, 511, 1023, 4095, 16383, 65535)
+DEPTH_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64, 128)
+STAGES = ('tokenize', 'parse', 'optimize', 'validate', 'evaluate')
+
+# Error kinds, recognized by the start of a RuleEngineError message
+_ERROR_KINDS = (
+    ("Unexpected character", 'syntax'),
+    ("Unmatched closing parenthesis", 'syntax'),
+    ("Missing closing parenthesis", 'syntax'),
+    ("Expected AND or OR", 'syntax'),
+    ("Invalid term", 'syntax'),
+    ("Unknown operator", 'unknown_operator'),
+    ("Attribute '", 'missing_attribute'),
+    ("Cannot compare", 'type_mismatch'),
+    ("Invalid data format", 'invalid_data'),
+    ("Empty rule", 'empty_rule'),
+    ("Rule is nested too deeply", 'too_deep'),
+)
+
+def error_kind(error):
+    """
+    Returns the kind of a RuleEngineError, e.g. 'syntax' or 'missing_attribute', or 'other'.
+    """
+    message = str(error)
+    for prefix, kind in _ERROR_KINDS:
+        if message.startswith(prefix):
+            return kind
+    if message.startswith("Rule ") and message.endswith("not found"):
+        return 'rule_not_found'
+    return 'other'
+
+class Histogram:
+    """
+    A fixed-bucket histogram with Prometheus semantics (cumulative `le` buckets, a sum and a count).
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot counts observations above every bucket
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Records one observation.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name, labels=''):
+        """
+        Returns the Prometheus text lines of the histogram.
+        """
+        separator = ',' if labels else ''
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{{labels}}} {total:.9g}' if labels else f'{name}_sum {total:.9g}')
+        lines.append(f'{name}_count{{{labels}}} {count}' if labels else f'{name}_count {count}')
+        return lines
+
+class RuleMetrics:
+    """
+    Latency histograms per stage, RuleEngineError counts per kind and AST size and depth distributions.
+
+    Instances are installed process-wide with enable(); create_rule and evaluate_rule only record anything
+    while one is installed.
+    """
+
+    def __init__(self):
+        self.stages = {stage: Histogram(LATENCY_BUCKETS) for stage in STAGES}
+        self.ast_nodes = Histogram(SIZE_BUCKETS)
+        self.ast_depth = Histogram(DEPTH_BUCKETS)
+        self.errors = {}  # error kind -> count
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage, seconds):
+        """
+        Records the duration of one stage ('tokenize', 'parse', 'optimize', 'validate' or 'evaluate').
+        """
+        self.stages[stage].observe(seconds)
+
+    def observe_ast(self, ast):
+        """
+        Records the number of nodes and the depth of a parsed AST (shared subtrees are counted once per use).
+        """
+        if ast is None:
+            return
+        nodes, depth = 0, 0
+        stack = [(ast, 1)]
+        while stack:
+            node, level = stack.pop()
+            nodes += 1
+            depth = max(depth, level)
+            if node.node_type != "operand":
+                stack.extend((child, level + 1) for child in (node.left, node.right) if child is not None)
+        self.ast_nodes.observe(nodes)
+        self.ast_depth.observe(depth)
+
+    def count_error(self, error):
+        """
+        Counts a RuleEngineError by kind.
+        """
+        kind = error_kind(error)
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = [
+            '# HELP rule_engine_stage_seconds Time spent in each stage of creating and evaluating rules.',
+            '# TYPE rule_engine_stage_seconds histogram'
+        ]
+        for stage, histogram in self.stages.items():
+            lines.extend(histogram.render('rule_engine_stage_seconds', f'stage="{stage}"'))
+        lines.append('# HELP rule_engine_errors_total Rule engine errors by kind.')
+        lines.append('# TYPE rule_engine_errors_total counter')
+        with self._lock:
+            errors = sorted(self.errors.items())
+        for kind, count in errors:
+            lines.append(f'rule_engine_errors_total{{kind="{kind}"}} {count}')
+        lines.append('# HELP rule_engine_ast_nodes Number of nodes of parsed rules.')
+        lines.append('# TYPE rule_engine_ast_nodes histogram')
+        lines.extend(self.ast_nodes.render('rule_engine_ast_nodes'))
+        lines.append('# HELP rule_engine_ast_depth Depth of parsed rules.')
+        lines.append('# TYPE rule_engine_ast_depth histogram')
+        lines.extend(self.ast_depth.render('rule_engine_ast_depth'))
+        return '\n'.join(lines) + '\n'
+
+def enable():
+    """
+    Turns instrumentation on for the whole process, keeping the metrics collected so far if it was already on.
+
+    Returns:
+        RuleMetrics: The installed metrics.
+    """
+    if rules._metrics is None:
+        rules._metrics = RuleMetrics()
+    return rules._metrics
+
+def disable():
+    """
+    Turns instrumentation off for the whole process and discards the collected metrics.
+    """
+    rules._metrics = None
+
+def current():
+    """
+    Returns the installed metrics, or None while instrumentation is off.
+    """
+    return rules._metrics
@@ -0,0 +1,186 @@
+import logging  # Reporting stored rules that cannot be loaded
+import threading  # Locks for thread-safe refreshes
+import time  # Throttling how often the database is checked for changes
+from app import database, snapshot
+from app.rules import create_rule, compile_rule, unpack_ast, RuleEngineError
+
+logger = logging.getLogger(__name__)
+
+class RuleRegistry:
+    """
+    An in-process map from rule id to parsed and compiled rule, kept in sync with the 'rules' table.
+
+    The registry is warmed from the database at startup. Every stored rule carries a version taken from a
+    sequence shared by all rules, so a worker only has to ask the database for rules with a version above the
+    highest one it has seen to pick up rules created or changed by other workers. That check runs at most once
+    per refresh interval, and immediately when an unknown rule id is requested.
+
+    With a snapshot path, warming first loads the rule snapshot stored there (see app.snapshot), so only the
+    rules changed since the snapshot was written are read from the database and parsed; rules loaded from the
+    snapshot stay packed until they are first requested, and are compiled on their first evaluation. After warming, the snapshot is rewritten if it was
+    missing, invalid or out of date.
+
+    Attributes:
+        refresh_interval (float): Minimum number of seconds between two checks for changed rules.
+        version (int): The highest rule version loaded so far.
+        snapshot_path (str, optional): Where the rule snapshot is stored.
+    """
+
+    def __init__(self, refresh_interval=1.0, tracker=None, snapshot_path=None):
+        """
+        Initializes an empty registry.
+
+        Args:
+            refresh_interval (float): Minimum number of seconds between two checks for changed rules. Use 0 to
+                check on every lookup.
+            tracker (SelectivityTracker, optional): If set, loaded rules are evaluated adaptively (see
+                app.selectivity).
+            snapshot_path (str, optional): Where the rule snapshot is stored (default: no snapshot).
+        """
+        self.refresh_interval = refresh_interval
+        self.tracker = tracker
+        self.snapshot_path = snapshot_path
+        self.version = -1
+        self._rules = {}  # rule id -> (version, AST with its compiled evaluator, or packed AST from the snapshot)
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __contains__(self, rule_id):
+        return rule_id in self._rules
+
+    def warm(self):
+        """
+        Loads and compiles every stored rule, starting from the rule snapshot if there is a valid one.
+        """
+        if self.snapshot_path is None:
+            self.refresh(force=True)
+            return
+        loaded = self._load_snapshot()
+        self.refresh(force=True)
+        if loaded != self.version:
+            self.save_snapshot()
+
+    def _load_snapshot(self):
+        """
+        Loads the rules of the snapshot, unless it is missing, invalid or ahead of the database (e.g., the
+        database was replaced).
+
+        Returns:
+            int: The highest rule version the loaded snapshot covers, or None if no snapshot was loaded.
+        """
+        try:
+            loaded = snapshot.load_snapshot(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring rule snapshot %s: %s", self.snapshot_path, e)
+            return None
+        if loaded is None:
+            return None
+        version, rules = loaded
+        if version > database.current_version():
+            logger.warning("Ignoring rule snapshot %s: it is newer than the database", self.snapshot_path)
+            return None
+        with self._lock:
+            for rule_id, rule_version, packed in rules:
+                self._rules[rule_id] = (rule_version, packed)
+            self.version = max(self.version, version)
+        return version
+
+    def save_snapshot(self):
+        """
+        Writes the loaded rules to the snapshot path (rules still packed are written as they are). Failures are logged, since the snapshot only speeds up
+        the next start.
+        """
+        with self._lock:
+            rules = [(rule_id, version, node) for rule_id, (version, node) in self._rules.items()]
+            version = self.version
+        try:
+            snapshot.write_snapshot(self.snapshot_path, rules, version)
+        except (OSError, RuleEngineError) as e:
+            logger.warning("Could not write rule snapshot %s: %s", self.snapshot_path, e)
+
+    def refresh(self, force=False):
+        """
+        Loads the rules that changed since the last refresh.
+
+        Args:
+            force (bool): Whether to check the database even if the refresh interval has not elapsed.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            for rule_id, version, rule_string, ast in database.iter_rules_since(self.version):
+                entry = self._rules.get(rule_id)
+                if entry is not None and entry[0] == version:  # Already installed by this worker (see replace)
+                    self.version = max(self.version, version)
+                    continue
+                try:
+                    node = ast if ast is not None else create_rule(rule_string)
+                    if node is None:
+                        raise RuleEngineError("Empty rule")
+                    compile_rule(node)  # Compile up front so the first evaluation is fast
+                    if self.tracker is not None:
+                        self.tracker.track(node)
+                except RuleEngineError as e:
+                    logger.warning("Skipping stored rule %s: %s", rule_id, e)
+                    self._rules.pop(rule_id, None)
+                else:
+                    self._rules[rule_id] = (version, node)
+                self.version = max(self.version, version)
+
+    def replace(self, rule_id, version, node):
+        """
+        Installs a rule this worker changed and saved itself (e.g., with modify_rule), so the compiled AST is
+        used as is instead of being read back from the database.
+
+        Args:
+            rule_id (int): The id of the rule.
+            version (int): The rule's version after the change (see database.update_rule).
+            node (Node): The root node of the rule's AST.
+        """
+        with self._lock:
+            entry = self._rules.get(rule_id)
+            if entry is None or entry[0] < version:
+                self._rules[rule_id] = (version, node)
+
+    def get(self, rule_id):
+        """
+        Returns the AST of a stored rule, refreshing from the database if needed.
+
+        Args:
+            rule_id (int): The id of the rule.
+
+        Returns:
+            Node: The root node of the rule's AST, compiled unless it was loaded from the snapshot and has not
+                been evaluated yet.
+
+        Raises:
+            RuleEngineError: If no rule has the given id, or its AST in the snapshot cannot be unpacked.
+        """
+        self.refresh()
+        entry = self._rules.get(rule_id)
+        if entry is None:
+            self.refresh(force=True)  # The rule may have just been created by another worker
+            entry = self._rules.get(rule_id)
+            if entry is None:
+                raise RuleEngineError(f"Rule {rule_id} not found")
+        if isinstance(entry[1], bytes):
+            return self._unpack(rule_id)
+        return entry[1]
+
+    def _unpack(self, rule_id):
+        """
+        Unpacks a rule loaded from the snapshot, on its first lookup.
+        """
+        with self._lock:
+            version, node = self._rules[rule_id]
+            if isinstance(node, bytes):
+                node = unpack_ast(node)
+                if self.tracker is not None:
+                    self.tracker.track(node)
+                self._rules[rule_id] = (version, node)
+            return node
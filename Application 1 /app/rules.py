@@ -1,10 +1,41 @@
 from app.ast import Node  # Importing the Node class used to build the abstract syntax tree (AST)
 import re  # Regular expressions for tokenizing the rule string
+import operator  # Native implementations of the comparison operators used by compiled rules
+import numpy as np  # Vectorized evaluation of rules over many records
+import struct  # Packing the header and constants of the binary AST format
+import sys  # Byte order of the binary AST format
+import time  # Timing stages while metrics are enabled
+from array import array  # Compact integer arrays for the binary AST format
+from decimal import Decimal  # Writing floats without exponents in rule strings
 
 # Custom exception for rule engine errors
 class RuleEngineError(Exception):
     pass
 
+# Installed by app.metrics.enable(); while None, create_rule and evaluate_rule record nothing
+_metrics = None
+
+# Comparison operators supported in operands, mapped to their native implementations
+OPERATORS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '=': operator.eq,
+    '>=': operator.ge,
+    '<=': operator.le
+}
+
+# Token pattern, compiled once: each alternative is a named group giving the token's kind
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<comparison>[<>=]+)
+  | (?P<number>-?\d+(?:\.\d+)?\b)
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<word>\w+)
+  | (?P<invalid>.)
+""", re.VERBOSE)
+
 # Tokenizer function: Splits the input rule string into a list of tokens.
 def tokenize(rule_string):
     """
@@ -20,106 +51,533 @@ def tokenize(rule_string):
     
     Returns:
         List[str]: A list of tokens.
+    
+    Raises:
+        RuleEngineError: If the rule string contains a character that cannot start a token.
     """
-    tokens = re.findall(r'\(|\)|AND|OR|[<>=]+|\w+|\"[^\"]*\"|\d+', rule_string)  # Regular expression for extracting tokens
-    return [token.strip('"') for token in tokens]  # Strip quotation marks from any string values
+    return [text for _, text, _ in _scan(rule_string)]
+
+def _scan(rule_string):
+    """
+    Scans a rule string into (kind, text, position) tokens in a single pass.
+
+    Kinds are 'lparen', 'rparen', 'logical' (AND/OR), 'comparison', 'number', 'string' (quotes removed) and
+    'word'. Positions are character offsets into the rule string, used in error messages.
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(rule_string):
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        text = match.group()
+        position = match.start()
+        if kind == 'word':
+            if text == 'AND' or text == 'OR':
+                kind = 'logical'
+        elif kind == 'string':
+            text = text[1:-1]  # Strip the quotation marks from string values
+        elif kind == 'invalid':
+            raise RuleEngineError(f"Unexpected character {text!r} at position {position}")
+        tokens.append((kind, text, position))
+    return tokens
+
+def _classify(text):
+    """
+    Returns the token kind of a bare token string (see parse_expression).
+    """
+    if text == '(':
+        return 'lparen'
+    if text == ')':
+        return 'rparen'
+    if text == 'AND' or text == 'OR':
+        return 'logical'
+    match = _TOKEN_PATTERN.fullmatch(text)
+    if match is None or match.lastgroup in ('space', 'invalid'):
+        return 'string'  # Anything else (e.g., a value with spaces) can only be a value
+    return match.lastgroup
 
 # Parsing the tokens into an AST: Parses expressions (which may contain operators like AND, OR)
 def parse_expression(tokens):
     """
-    Recursively parses a list of tokens into an abstract syntax tree (AST) representing the expression.
-    The expression can include terms (attribute-operator-value) connected by operators like AND or OR.
+    Parses a list of tokens into an abstract syntax tree (AST) representing the expression.
+    The expression can include terms (attribute-operator-value) connected by operators like AND or OR,
+    which are applied left to right, and parenthesized sub-expressions.
     
     Args:
-        tokens (List[str]): A list of tokens from the rule string.
+        tokens (List[str]): A list of tokens from the rule string (see tokenize). Positions in error
+            messages are token indexes.
     
     Returns:
-        Node: A root node of the AST representing the entire expression.
-    """
-    if len(tokens) == 0:  # Base case: no tokens left to parse
-        return None
-    
-    left = parse_term(tokens)  # Parse the first term
+        Node: A root node of the AST representing the entire expression, or None if there are no tokens.
     
-    # Parse subsequent terms connected by AND/OR operators
-    while len(tokens) > 0 and tokens[0] in ['AND', 'OR']:
-        operator = tokens.pop(0)  # Pop the operator (AND/OR)
-        right = parse_term(tokens)  # Parse the next term
-        # Combine the left and right terms with the operator into an AST node
-        left = Node('operator', left=left, right=right, value=operator)
-    
-    return left  # Return the root node of the AST
+    Raises:
+        RuleEngineError: If the tokens do not form a valid expression.
+    """
+    return _parse([(_classify(text), text, index) for index, text in enumerate(tokens)], len(tokens))
 
-# Parsing individual terms (attribute-operator-value expressions)
-def parse_term(tokens):
+def _parse(tokens, end):
     """
-    Parses a single term (an attribute-operator-value triplet or a parenthesized sub-expression).
-    
+    Parses (kind, text, position) tokens into an AST with a single forward cursor.
+
+    The parser is iterative: each opening parenthesis saves the partially built expression on an explicit
+    stack, so the nesting depth of a rule is not limited by Python's recursion limit. Runs of the same
+    operator (e.g., `a AND b AND c AND d`) become balanced subtrees, keeping the AST shallow.
+
     Args:
-        tokens (List[str]): A list of tokens from the rule string.
-    
+        tokens (List[Tuple[str, str, int]]): The tokens produced by _scan.
+        end (int): The position reported for errors at the end of the input.
+
     Returns:
-        Node: An AST node representing the parsed term.
-    
+        Node: The root node of the AST, or None if there are no tokens.
+
     Raises:
-        RuleEngineError: If the term is invalid (e.g., missing parts or parentheses).
-    """
-    if tokens[0] == '(':  # If the term starts with a parenthesis, it's a sub-expression
-        tokens.pop(0)  # Remove opening parenthesis
-        node = parse_expression(tokens)  # Recursively parse the sub-expression
-        if tokens[0] != ')':  # Ensure there's a matching closing parenthesis
-            raise RuleEngineError("Missing closing parenthesis")
-        tokens.pop(0)  # Remove closing parenthesis
-        return node
-    
-    if len(tokens) < 3:  # Ensure there are at least three tokens for a valid term (attribute, operator, value)
-        raise RuleEngineError("Invalid term")
-    
-    # Parse the attribute, operator, and value
-    attribute = tokens.pop(0)  # First token is the attribute (e.g., 'age')
-    operator = tokens.pop(0)  # Second token is the operator (e.g., '>')
-    value = tokens.pop(0)  # Third token is the value (e.g., '18')
-    
-    # Convert value to an appropriate type (int or float if possible)
-    if value.isdigit():
-        value = int(value)
-    elif value.replace('.', '').isdigit():
-        value = float(value)
-    
+        RuleEngineError: If the tokens do not form a valid expression.
+    """
+    if not tokens:
+        return None
+
+    count = len(tokens)
+    cursor = 0
+    stack = []  # (run, run operator, pending AND/OR, position of the '(') saved for each open parenthesis
+    run = []  # Operands of the current run of identical AND/OR operators at this nesting level
+    run_operator = None  # The operator joining the current run
+    pending = None  # AND/OR waiting for its right operand
+
+    while True:
+        # Expect a term: either an opening parenthesis or an attribute-operator-value triplet
+        if cursor < count and tokens[cursor][0] == 'lparen':
+            stack.append((run, run_operator, pending, tokens[cursor][2]))
+            run, run_operator, pending = [], None, None
+            cursor += 1
+            continue
+        node = _parse_term(tokens, cursor, end)
+        cursor += 3
+
+        # Attach the term, closing any parenthesized groups that end right after it. Operators apply left to
+        # right; a run of the same operator is associative, so it is joined into a balanced subtree
+        while True:
+            if pending is not None and pending != run_operator and len(run) > 1:
+                run = [_balanced(run_operator, run)]
+            run.append(node)
+            run_operator = pending
+            if cursor < count and tokens[cursor][0] == 'rparen':
+                if not stack:
+                    raise RuleEngineError(f"Unmatched closing parenthesis at position {tokens[cursor][2]}")
+                node = _balanced(run_operator, run)
+                run, run_operator, pending, _ = stack.pop()
+                cursor += 1
+                continue
+            break
+
+        if cursor >= count:
+            if stack:
+                raise RuleEngineError(f"Missing closing parenthesis for '(' at position {stack[-1][3]}")
+            return _balanced(run_operator, run)
+
+        kind, text, position = tokens[cursor]
+        if kind != 'logical':
+            raise RuleEngineError(f"Expected AND or OR at position {position}, found '{text}'")
+        pending = text
+        cursor += 1
+
+def _parse_term(tokens, cursor, end):
+    """
+    Parses the attribute-operator-value triplet starting at the cursor into an operand node.
+    """
+    expected = ('an attribute', 'a comparison operator', 'a value')
+    kinds = (('word',), ('comparison',), ('word', 'string', 'number'))
+    triplet = []
+    for offset in range(3):
+        if cursor + offset >= len(tokens):
+            raise RuleEngineError(f"Invalid term at position {end}: expected {expected[offset]}, found end of rule")
+        kind, text, position = tokens[cursor + offset]
+        if kind not in kinds[offset]:
+            raise RuleEngineError(f"Invalid term at position {position}: expected {expected[offset]}, found '{text}'")
+        triplet.append((kind, text, position))
+    (_, attribute, _), (_, operator_symbol, operator_position), (value_kind, value, _) = triplet
+
+    if operator_symbol not in OPERATORS:
+        raise RuleEngineError(f"Unknown operator '{operator_symbol}' at position {operator_position}")
+    if value_kind == 'number':
+        value = float(value) if '.' in value else int(value)  # Convert numeric values to int or float
+
     # Return a new AST node representing this term
-    return Node('operand', value=(attribute, operator, value))
+    return Node('operand', value=(attribute, operator_symbol, value))
 
 # Function to create a rule by parsing the rule string into an AST
-def create_rule(rule_string):
+def create_rule(rule_string, optimize=True):
     """
     Converts a rule string into an abstract syntax tree (AST) for further evaluation.
     
     Args:
         rule_string (str): The rule as a string.
+        optimize (bool): Whether to simplify the AST with optimize_rule (merging ranges, removing duplicate
+            conditions and folding contradictions and tautologies).
     
     Returns:
         Node: The root node of the generated AST.
+    
+    Raises:
+        RuleEngineError: If the rule string is invalid. The message includes the character position of the problem.
     """
-    tokens = tokenize(rule_string)  # Tokenize the rule string
-    return parse_expression(tokens)  # Parse the tokens into an AST
+    if _metrics is not None:
+        return _create_rule_instrumented(rule_string, optimize, _metrics)
+    ast = _parse(_scan(rule_string), len(rule_string))
+    return optimize_rule(ast) if optimize else ast
+
+def _create_rule_instrumented(rule_string, optimize, metrics):
+    """
+    create_rule, recording tokenize, parse and optimize latencies, errors and the AST's size and depth.
+    """
+    try:
+        start = time.perf_counter()
+        tokens = _scan(rule_string)
+        scanned = time.perf_counter()
+        metrics.observe_stage('tokenize', scanned - start)
+        ast = _parse(tokens, len(rule_string))
+        parsed = time.perf_counter()
+        metrics.observe_stage('parse', parsed - scanned)
+    except RuleEngineError as e:
+        metrics.count_error(e)
+        raise
+    if optimize:
+        ast = optimize_rule(ast)
+        metrics.observe_stage('optimize', time.perf_counter() - parsed)
+    metrics.observe_ast(ast)
+    return ast
 
 # Combines multiple ASTs into a single AST by joining them with AND operators
-def combine_rules(rules):
+def combine_rules(rules, optimize=True):
     """
     Combines a list of ASTs into a single AST using AND operators between the rules.
     
+    The top-level AND conditions of all rules are collected, identical subtrees are merged into one shared
+    node (hash-consing), repeated conditions are dropped, and the remaining conditions are joined into a
+    balanced tree. Combining n rules therefore gives a tree of depth O(log n) in which a shared condition
+    such as `age > 30` is stored and evaluated once.
+    
     Args:
         rules (List[Node]): A list of root nodes (ASTs) representing individual rules.
+        optimize (bool): Whether to simplify the combined AST with optimize_rule, which also merges ranges
+            across rules (e.g., `age > 30` and `age > 40` become `age > 40`).
     
     Returns:
         Node: The root node of the combined AST.
     """
+    rules = [rule for rule in rules if rule is not None]
     if not rules:  # If no rules are provided, return None
         return None
-    combined_ast = rules[0]  # Start with the first rule
-    for rule in rules[1:]:  # Combine the remaining rules using AND
-        combined_ast = Node("operator", left=combined_ast, right=rule, value="AND")
-    return combined_ast  # Return the combined AST
+
+    table = {}  # Structural key -> shared node, used to merge identical subtrees across all rules
+    conditions = []
+    seen = set()
+    for rule in rules:
+        for condition in _flatten(rule) if rule.node_type == "operator" and rule.value == "AND" else [rule]:
+            condition = _hash_cons(condition, table)
+            if id(condition) not in seen:  # Identical conditions are now the same node; keep the first one
+                seen.add(id(condition))
+                conditions.append(condition)
+    combined = _balanced("AND", conditions)
+    return optimize_rule(combined) if optimize else combined  # Return the combined AST
+
+def _balanced(operator_value, nodes):
+    """
+    Joins nodes with an associative operator into a balanced tree, keeping their left-to-right order.
+    """
+    while len(nodes) > 1:
+        paired = [Node("operator", left=nodes[i], right=nodes[i + 1], value=operator_value) for i in range(0, len(nodes) - 1, 2)]
+        if len(nodes) % 2:
+            paired.append(nodes[-1])
+        nodes = paired
+    return nodes[0]
+
+def _hash_cons(ast, table):
+    """
+    Returns an AST in which structurally identical subtrees are a single shared node.
+
+    Args:
+        ast (Node): The root node of the AST.
+        table (Dict): Maps structural keys to shared nodes; pass the same table to share nodes across ASTs.
+
+    Returns:
+        Node: The shared equivalent of the AST (the input nodes are not modified).
+    """
+    shared = {}  # id of an input node -> its shared equivalent
+    stack = [(ast, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if id(node) in shared:
+            continue
+        if node.node_type == "operand":
+            key = ("operand", _hashable(node.value))
+        elif not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in (node.right, node.left) if child is not None)
+            continue
+        else:
+            left = shared.get(id(node.left)) if node.left is not None else None
+            right = shared.get(id(node.right)) if node.right is not None else None
+            key = (node.node_type, _hashable(node.value), id(left), id(right))
+        if key not in table:
+            table[key] = node if node.node_type == "operand" else Node(node.node_type, left=left, right=right, value=node.value)
+        shared[id(node)] = table[key]
+    return shared[id(ast)]
+
+def _hashable(value):
+    """
+    Returns a hashable version of a node value (operand conditions may be lists after JSON round trips).
+    """
+    return tuple(value) if isinstance(value, list) else value
+
+# Simplifies an AST without changing its result for records that hold comparable values
+def optimize_rule(ast):
+    """
+    Returns a simplified AST that needs fewer comparisons per record.
+
+    Within each AND/OR chain:
+    - duplicate conditions and sub-expressions are removed,
+    - numeric conditions on the same attribute are merged into at most one lower and one upper bound
+      (`age > 30 AND age > 40` becomes `age > 40`, `salary < 5 OR salary < 10` becomes `salary < 10`,
+      `age >= 30 AND age <= 30` becomes `age = 30`), as long as no comparison moves ahead of a sibling that
+      short-circuits it (`age = 30 OR department = 'Sales' OR age > 40` is kept as it is),
+    - contradictions (`age > 40 AND age < 30`, `city = 'Paris' AND city = 'Rome'`) fold to a false constant
+      and tautologies (`age > 30 OR age <= 30`) to a true constant, which then absorb or drop out of the
+      enclosing chains.
+
+    A rule that folds completely becomes a single 'constant' node. The result is the same as the original
+    rule's for every record holding comparable values for the attributes the rule reads; a record missing
+    one of them, or holding a value that cannot be compared (or NaN), may get a result where the original
+    rule would have raised an error, but never an error where the original rule gives a result. Unchanged subtrees are reused, shared subtrees (see combine_rules) stay
+    shared, and rules nested too deeply to optimize are returned unchanged.
+
+    Example:
+    Input: AST for 'age > 30 AND age > 40 AND (salary < 5 OR salary < 10)'
+    Output: AST for 'age > 40 AND salary < 10'
+
+    Args:
+        ast (Node): The root node of the AST.
+
+    Returns:
+        Node: The root node of the simplified AST (the input nodes are not modified).
+    """
+    if ast is None or ast.node_type != "operator":
+        return ast
+    shared = {id(node) for node in _shared_subtrees(ast)}
+    try:
+        return _optimize_node(ast, shared, {})[0]
+    except RecursionError:
+        return ast
+
+def _optimize_node(node, shared, memo):
+    """
+    Returns the simplified node, its structural key and, if it is an AND/OR chain, the (node, key) pairs of
+    the chain's children, reusing the result for nodes seen before.
+    """
+    result = memo.get(id(node))
+    if result is not None:
+        return result
+    if node.node_type == "operand":
+        result = (node, _operand_key(node.value), None)
+    elif node.node_type != "operator" or node.value not in ("AND", "OR"):
+        result = (node, (node.node_type, node.value, type(node.value), id(node)), None)  # Constants and unknown nodes
+    else:
+        result = _optimize_chain(node, shared, memo)
+    memo[id(node)] = result
+    return result
+
+def _operand_key(condition):
+    """
+    Returns the structural key of a condition; values of different types (e.g., 1 and True) are kept apart.
+    """
+    return ("operand", _hashable(condition), tuple(map(type, condition)))
+
+def _optimize_chain(node, shared, memo):
+    """
+    Simplifies a chain of nodes sharing the same AND/OR operator (see optimize_rule).
+    """
+    is_and = node.value == "AND"
+    original = _flatten(node, stop=shared)
+    children, keys = [], set()  # Simplified children and the structural keys seen so far
+    for child in original:
+        optimized, key, chain = _optimize_node(child, shared, memo)
+        if optimized.node_type == "constant":
+            if bool(optimized.value) != is_and:  # False in an AND, true in an OR decides the chain
+                return _constant(not is_and), ("constant", not is_and), None
+            continue  # True in an AND, false in an OR has no effect
+        if chain is not None and optimized.value == node.value and id(child) not in shared:
+            parts = chain  # A child that simplified into the same operator joins this chain
+        else:
+            parts = [(optimized, key)]
+        for part, part_key in parts:
+            if part_key not in keys:
+                keys.add(part_key)
+                children.append((part, part_key))
+
+    children = _merge_conditions(children, is_and)
+    if children is None:
+        return _constant(not is_and), ("constant", not is_and), None
+    if not children:
+        return _constant(is_and), ("constant", is_and), None
+    if len(children) == 1:
+        return memo.get(id(children[0][0]), children[0] + (None,))
+    nodes = [child for child, _ in children]
+    if len(nodes) == len(original) and all(new is old for new, old in zip(nodes, original)):
+        simplified = node  # Nothing changed; keep the node and its compiled evaluator
+    else:
+        simplified = _balanced(node.value, nodes)
+    return simplified, (node.value, tuple(key for _, key in children)), children
+
+def _constant(value):
+    """
+    Returns a node that evaluates to a constant truth value.
+    """
+    return Node("constant", value=value)
+
+def _is_number(value):
+    """
+    Returns whether a rule value takes part in range merging: an int or a float other than NaN.
+    """
+    return (type(value) is int or type(value) is float) and value == value
+
+def _merge_conditions(children, is_and):
+    """
+    Merges adjacent numeric conditions on the same attribute in a chain and detects contradictory equalities
+    and ranges.
+
+    Takes and returns (node, structural key) pairs, with each group of conditions on one attribute replaced
+    by its merged conditions at the group's first position. A group starting with an ordering comparison
+    spans the whole chain: that comparison already fails for every value a merged condition can fail for.
+    A group starting with an equality only takes the conditions right after it, since moving a comparison
+    ahead of a sibling that used to short-circuit could make a record that evaluated fine raise an error.
+    Returns None if the chain is decided: always false for an AND, always true for an OR.
+    """
+    runs = []  # Groups of numeric conditions on one attribute, as lists of child indexes
+    open_runs = {}  # attribute -> its group that later conditions can still join
+    equalities = {}  # attribute -> string values compared with '=' (AND chains only)
+    for index, (child, _) in enumerate(children):
+        if child.node_type != "operand":
+            continue
+        attribute, operator_symbol, value = child.value
+        if operator_symbol in OPERATORS and _is_number(value):
+            run = open_runs.get(attribute)
+            if run is not None and (run[-1] == index - 1 or children[run[0]][0].value[1] != '='):
+                run.append(index)
+            else:
+                run = open_runs[attribute] = [index]
+                runs.append(run)
+        elif is_and and operator_symbol == '=' and type(value) is str:
+            equalities.setdefault(attribute, set()).add(value)
+            if len(equalities[attribute]) > 1:
+                return None  # No value equals two different strings
+    if all(len(run) == 1 for run in runs):
+        return children
+
+    merged, skipped = {}, set()  # Merged conditions per run's first index, and the indexes they replace
+    for run in runs:
+        if len(run) > 1:
+            group = [children[index][0].value for index in run]
+            conditions = _intersect(group) if is_and else _union(group)
+            if conditions is None:
+                return None
+            merged[run[0]] = (conditions, [children[index] for index in run])
+            skipped.update(run[1:])
+
+    result = []
+    for index, (child, key) in enumerate(children):
+        if index in skipped:
+            continue
+        if index not in merged:
+            result.append((child, key))
+            continue
+        conditions, originals = merged[index]
+        for condition in conditions:
+            for original, original_key in originals:  # Reuse an unchanged node
+                if condition == original.value and type(condition[2]) is type(original.value[2]):
+                    result.append((original, original_key))
+                    break
+            else:
+                node = Node("operand", value=condition)
+                result.append((node, _operand_key(node.value)))
+    return result
+
+def _intersect(conditions):
+    """
+    Returns the fewest conditions on one attribute that hold exactly when all of the given numeric conditions
+    hold, or None if no number satisfies them all.
+    """
+    attribute = conditions[0][0]
+    lower = upper = equal = None  # (value, inclusive) bounds and a required value
+    for _, operator_symbol, value in conditions:
+        if operator_symbol == '=':
+            if equal is not None and equal != value:
+                return None
+            equal = value
+        elif operator_symbol in ('>', '>='):
+            bound = (value, operator_symbol == '>=')
+            if lower is None or value > lower[0] or (value == lower[0] and not bound[1]):
+                lower = bound
+        else:
+            bound = (value, operator_symbol == '<=')
+            if upper is None or value < upper[0] or (value == upper[0] and not bound[1]):
+                upper = bound
+
+    if equal is not None:
+        if lower is not None and (equal < lower[0] or (equal == lower[0] and not lower[1])):
+            return None
+        if upper is not None and (equal > upper[0] or (equal == upper[0] and not upper[1])):
+            return None
+        return [(attribute, '=', equal)]
+    if lower is not None and upper is not None:
+        if lower[0] > upper[0] or (lower[0] == upper[0] and not (lower[1] and upper[1])):
+            return None
+        if lower[0] == upper[0]:
+            return [(attribute, '=', lower[0])]
+    merged = []
+    if lower is not None:
+        merged.append((attribute, '>=' if lower[1] else '>', lower[0]))
+    if upper is not None:
+        merged.append((attribute, '<=' if upper[1] else '<', upper[0]))
+    return merged
+
+def _union(conditions):
+    """
+    Returns the fewest conditions on one attribute of which one holds exactly when one of the given numeric
+    conditions holds, or None if every number satisfies one of them.
+    """
+    attribute = conditions[0][0]
+    lower = upper = None  # (value, inclusive) of the widest `>`/`>=` and `<`/`<=` conditions
+    equals = []
+    for _, operator_symbol, value in conditions:
+        if operator_symbol == '=':
+            if value not in equals:
+                equals.append(value)
+        elif operator_symbol in ('>', '>='):
+            bound = (value, operator_symbol == '>=')
+            if lower is None or value < lower[0] or (value == lower[0] and bound[1]):
+                lower = bound
+        else:
+            bound = (value, operator_symbol == '<=')
+            if upper is None or value > upper[0] or (value == upper[0] and bound[1]):
+                upper = bound
+
+    remaining = []
+    for value in equals:
+        if lower is not None and value == lower[0]:
+            lower = (lower[0], True)  # `x > 5 OR x = 5` is `x >= 5`
+        elif upper is not None and value == upper[0]:
+            upper = (upper[0], True)
+        elif not ((lower is not None and value > lower[0]) or (upper is not None and value < upper[0])):
+            remaining.append(value)
+    if lower is not None and upper is not None:
+        if lower[0] < upper[0] or (lower[0] == upper[0] and (lower[1] or upper[1])):
+            return None
+    merged = []
+    if lower is not None:
+        merged.append((attribute, '>=' if lower[1] else '>', lower[0]))
+    if upper is not None:
+        merged.append((attribute, '<=' if upper[1] else '<', upper[0]))
+    merged.extend((attribute, '=', value) for value in remaining)
+    return merged
 
 # Evaluates a node of the AST by applying its operator/operand logic to the provided data
 def evaluate_node(node, data):
@@ -164,26 +622,600 @@ def evaluate_node(node, data):
         elif node.value == "OR":
             return evaluate_node(node.left, data) or evaluate_node(node.right, data)
     
+    elif node.node_type == "constant":  # A condition folded by optimize_rule
+        return bool(node.value)
+    
+    raise RuleEngineError(f"Unknown node type: {node.node_type}")
+
+# Compiles an AST into a single Python callable so evaluation no longer walks the tree
+def compile_rule(ast):
+    """
+    Compiles an AST into one flat callable that evaluates the rule against a data dictionary.
+
+    The AST is translated into a single Python function whose operands call the comparison functions from
+    the `operator` module directly and whose AND/OR chains use Python's short-circuiting `and`/`or`.
+    Subtrees shared by several parents (see combine_rules) are evaluated at most once per call. Rules nested
+    too deeply for the Python compiler fall back to a tree of closures. The result is cached on the node, so
+    compiling the same AST again is free.
+
+    Example:
+    Input: AST for 'age > 30 AND department = "Sales"'
+    Output: def evaluate(data): return (_gt(data['age'], 30) and _eq(data['department'], 'Sales'))
+
+    Args:
+        ast (Node): The root node of the AST.
+
+    Returns:
+        Callable[[Dict], bool]: A function that evaluates the rule against a data dictionary.
+
+    Raises:
+        RuleEngineError: If an unknown operator or node type is encountered.
+    """
+    if ast.compiled is None:
+        try:
+            ast.compiled = _generate_evaluator(ast)
+        except (RecursionError, SyntaxError, MemoryError):
+            try:
+                ast.compiled = _compile_node(ast)  # Too deep for the Python compiler
+            except RecursionError:
+                raise RuleEngineError("Rule is nested too deeply to compile") from None
+    return ast.compiled
+
+# Names under which the comparison functions are bound in generated evaluators
+_OPERATOR_NAMES = {
+    '>': '_gt',
+    '<': '_lt',
+    '=': '_eq',
+    '>=': '_ge',
+    '<=': '_le'
+}
+
+def _generate_evaluator(ast):
+    """
+    Generates and compiles the source of a flat evaluator function for an AST (see compile_rule).
+    """
+    namespace = {name: OPERATORS[symbol] for symbol, name in _OPERATOR_NAMES.items()}
+    memo = {id(node): f"_m{index}" for index, node in enumerate(_shared_subtrees(ast))}
+    expression = _generate_expression(ast, namespace, memo)
+
+    # Missing attributes and type mismatches are rare, so they are re-evaluated by the closure evaluator,
+    # which raises the same RuleEngineError messages as the tree walker
+    fallback = []
+    def explain(data):
+        if not fallback:
+            fallback.append(_compile_node(ast))
+        return fallback[0](data)
+    namespace['_explain'] = explain
+
+    # Shared subtrees store their result in a local the first time they are evaluated
+    memo_init = "    " + " = ".join(list(memo.values()) + ["None"]) + "\n" if memo else ""
+    source = (
+        "def evaluate(data):\n"
+        f"{memo_init}"
+        "    try:\n"
+        f"        return {expression}\n"
+        "    except (KeyError, TypeError):\n"
+        "        return _explain(data)\n"
+    )
+    exec(compile(source, '<rule>', 'exec'), namespace)
+    return namespace['evaluate']
+
+def _shared_subtrees(ast):
+    """
+    Returns the operator nodes reachable through more than one parent, in discovery order.
+    """
+    parents = {}
+    nodes = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if node.node_type != "operator":
+            continue
+        parents[id(node)] = parents.get(id(node), 0) + 1
+        if parents[id(node)] == 1:
+            nodes.append(node)
+            stack.extend(child for child in (node.right, node.left) if child is not None)
+    return [node for node in nodes if parents[id(node)] > 1 and node is not ast]
+
+def _generate_expression(node, namespace, memo):
+    """
+    Generates the Python expression for a node, binding non-literal values into the namespace and reusing
+    the memo local of shared subtrees.
+    """
+    if node.node_type == "operand":
+        attribute, operator_symbol, value = node.value
+        if operator_symbol not in _OPERATOR_NAMES:
+            raise RuleEngineError(f"Unknown operator: {operator_symbol}")
+        return f"{_OPERATOR_NAMES[operator_symbol]}(data[{_literal(attribute, namespace)}], {_literal(value, namespace)})"
+
+    if node.node_type == "operator":
+        if node.value not in ("AND", "OR"):
+            raise RuleEngineError(f"Unknown operator: {node.value}")
+        children = [_generate_expression(child, namespace, memo) for child in _flatten(node, stop=memo)]
+        expression = "(" + f" {node.value.lower()} ".join(children) + ")"
+        name = memo.get(id(node))
+        if name is not None:
+            expression = f"({name} if {name} is not None else ({name} := {expression}))"
+        return expression
+
+    if node.node_type == "constant":
+        return repr(bool(node.value))
+
+    raise RuleEngineError(f"Unknown node type: {node.node_type}")
+
+def _literal(value, namespace):
+    """
+    Returns source text for a constant: a literal for ints and strings, otherwise a bound name.
+    """
+    if type(value) in (int, str):
+        return repr(value)
+    name = f"_v{len(namespace)}"
+    namespace[name] = value
+    return name
+
+def _flatten(node, stop=()):
+    """
+    Returns the children of a chain of nodes sharing the same AND/OR operator, in left-to-right order.
+    Nodes whose id is in `stop` are kept as children rather than flattened.
+    """
+    children = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.node_type == "operator" and current.value == node.value and (current is node or id(current) not in stop):
+            stack.append(current.right)
+            stack.append(current.left)
+        else:
+            children.append(current)
+    return children
+
+def _compile_node(node):
+    """
+    Builds a tree of evaluator closures for a node; used for errors and rules too deep to generate code for.
+    """
+    if node.node_type == "operand":
+        return _compile_operand(node.value)
+
+    if node.node_type == "operator":
+        if node.value not in ("AND", "OR"):
+            raise RuleEngineError(f"Unknown operator: {node.value}")
+        children = [_compile_node(child) for child in _flatten(node)]
+        if node.value == "AND":
+            return _compile_and(children)
+        return _compile_or(children)
+
+    if node.node_type == "constant":
+        value = bool(node.value)
+        return lambda data: value
+
     raise RuleEngineError(f"Unknown node type: {node.node_type}")
 
+def _compile_operand(condition):
+    """
+    Builds the evaluator closure for an attribute-operator-value condition.
+    """
+    attribute, operator_symbol, value = condition
+    compare = OPERATORS.get(operator_symbol)
+    if compare is None:
+        raise RuleEngineError(f"Unknown operator: {operator_symbol}")
+
+    def evaluate(data):
+        try:
+            return compare(data[attribute], value)
+        except KeyError:
+            raise RuleEngineError(f"Attribute '{attribute}' not found in data") from None
+        except TypeError:
+            raise RuleEngineError(f"Cannot compare attribute '{attribute}' with {value!r}") from None
+    return evaluate
+
+def _compile_and(children):
+    """
+    Builds a short-circuiting AND over compiled children.
+    """
+    if len(children) == 2:
+        left, right = children
+        return lambda data: left(data) and right(data)
+
+    def evaluate(data):
+        for child in children:
+            if not child(data):
+                return False
+        return True
+    return evaluate
+
+def _compile_or(children):
+    """
+    Builds a short-circuiting OR over compiled children.
+    """
+    if len(children) == 2:
+        left, right = children
+        return lambda data: left(data) or right(data)
+
+    def evaluate(data):
+        for child in children:
+            if child(data):
+                return True
+        return False
+    return evaluate
+
 # Evaluates a full AST against the provided data
-def evaluate_rule(ast, data):
+def evaluate_rule(ast, data, cache=None):
     """
-    Evaluates the entire AST against the data.
+    Evaluates the entire AST against the data using its compiled form (see compile_rule).
     
     Args:
         ast (Node): The root node of the AST.
         data (Dict): The data dictionary with values for the attributes in the rule.
+        cache (ResultCache, optional): A cache of results keyed by the rule and the values of the attributes
+            it reads (see app.cache.ResultCache).
     
     Returns:
         bool: The result of the evaluation.
     
     Raises:
-        RuleEngineError: If the data format is invalid.
+        RuleEngineError: If the data format is invalid, an attribute is missing or a value cannot be compared.
     """
+    if _metrics is not None:
+        return _evaluate_rule_instrumented(ast, data, cache, _metrics)
     if not isinstance(data, dict):
         raise RuleEngineError("Invalid data format")
-    return evaluate_node(ast, data)
+    if ast is None:
+        raise RuleEngineError("Empty rule")
+    if cache is not None:
+        return cache.evaluate(ast, data, compile_rule(ast))
+    return compile_rule(ast)(data)
+
+def _evaluate_rule_instrumented(ast, data, cache, metrics):
+    """
+    evaluate_rule, recording its latency and errors.
+    """
+    start = time.perf_counter()
+    try:
+        if not isinstance(data, dict):
+            raise RuleEngineError("Invalid data format")
+        if ast is None:
+            raise RuleEngineError("Empty rule")
+        if cache is not None:
+            return cache.evaluate(ast, data, compile_rule(ast))
+        return compile_rule(ast)(data)
+    except RuleEngineError as e:
+        metrics.count_error(e)
+        raise
+    finally:
+        metrics.observe_stage('evaluate', time.perf_counter() - start)
+
+# Collects the attributes a rule reads
+def referenced_attributes(ast):
+    """
+    Returns the set of attributes referenced by the operands of an AST.
+
+    The set is computed once and cached on the root node, like its compiled evaluator.
+
+    Args:
+        ast (Node): The root node of the AST.
+
+    Returns:
+        FrozenSet[str]: The attribute names used in the rule.
+    """
+    if ast is None:
+        return frozenset()
+    if ast.attributes is not None:
+        return ast.attributes
+    attributes = set()
+    seen = set()  # Shared subtrees (see combine_rules) are visited once
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if node.node_type == "operand":
+            attributes.add(node.value[0])
+        elif id(node) not in seen:
+            seen.add(id(node))
+            if node.attributes is not None:
+                attributes.update(node.attributes)
+            else:
+                stack.extend(child for child in (node.left, node.right) if child is not None)
+    ast.attributes = frozenset(attributes)
+    return ast.attributes
+
+# Steps of a node path: from a parent to its left or right child
+_PATH_STEPS = {'L': 'left', 'R': 'right'}
+
+# Changes one node of an AST, reusing everything the change does not touch
+def modify_rule(ast, path, action, operator=None, value=None, expression=None, join="AND"):
+    """
+    Returns a copy of an AST with one change made at the node reached by a path.
+
+    Only the changed node and its ancestors are new; every other subtree is shared with the original AST,
+    which is left unchanged (so its compiled evaluator, attribute set and cache entries stay valid for anyone
+    still using it). The new nodes are compiled as closures over the compiled evaluators of the subtrees they
+    keep, and compile_rule caches those evaluators on the subtrees, so modifying a large rule again only
+    compiles the nodes on the modified path.
+
+    Actions:
+        'update': Changes the operator and/or value of the condition at the path.
+        'add': Joins the node at the path with a new sub-expression, parsed from `expression`, using `join`.
+        'remove': Removes the node at the path; its parent is replaced by the node's sibling.
+
+    Example:
+    Input: AST for "age > 30 AND department = 'Sales'", path 'L', action 'update', value 40
+    Output: AST for "age > 40 AND department = 'Sales'"
+
+    Args:
+        ast (Node): The root node of the AST.
+        path (str): The steps from the root to the node, 'L' for a left child and 'R' for a right child
+            (the empty string is the root), following the `left` and `right` fields of serialize_ast.
+        action (str): 'update', 'add' or 'remove'.
+        operator (str, optional): The new comparison operator ('update').
+        value (int, float or str, optional): The new value ('update').
+        expression (str, optional): The sub-expression to add, in rule string format ('add').
+        join (str): 'AND' or 'OR', the operator joining the added sub-expression ('add').
+
+    Returns:
+        Node: The root node of the modified AST, already compiled.
+
+    Raises:
+        RuleEngineError: If the path does not lead to a suitable node or the change is invalid.
+    """
+    if ast is None:
+        raise RuleEngineError("Empty rule")
+    if any(step not in _PATH_STEPS for step in path):
+        raise RuleEngineError(f"Invalid path '{path}': expected a string of L and R steps")
+    ancestors = []  # (node, step) pairs from the root down to the parent of the target
+    node = ast
+    for position, step in enumerate(path):
+        if node.node_type != "operator":
+            raise RuleEngineError(f"Invalid path '{path}': the node at step {position} has no children")
+        ancestors.append((node, step))
+        node = getattr(node, _PATH_STEPS[step])
+
+    if action == "update":
+        if node.node_type != "operand":
+            raise RuleEngineError(f"The node at path '{path}' is not a condition")
+        attribute, current_operator, current_value = node.value
+        operator = current_operator if operator is None else operator
+        value = current_value if value is None else value
+        if operator not in OPERATORS:
+            raise RuleEngineError(f"Unknown operator '{operator}'")
+        if type(value) not in (int, float, str):
+            raise RuleEngineError(f"Invalid value {value!r}: expected a number or a string")
+        replacement = Node("operand", value=(attribute, operator, value))
+    elif action == "add":
+        if join not in ("AND", "OR"):
+            raise RuleEngineError(f"Expected AND or OR to join the sub-expression, found '{join}'")
+        added = create_rule(expression or "", optimize=False)
+        if added is None:
+            raise RuleEngineError("Empty rule")
+        replacement = Node("operator", left=node, right=added, value=join)
+    elif action == "remove":
+        if not ancestors:
+            raise RuleEngineError("Cannot remove the root of a rule")
+        parent, step = ancestors.pop()
+        replacement = parent.right if step == 'L' else parent.left
+    else:
+        raise RuleEngineError(f"Unknown modification '{action}': expected 'update', 'add' or 'remove'")
+
+    # Rebuild the path bottom-up, compiling each new node over its children
+    node = _compile_modified(replacement)
+    for parent, step in reversed(ancestors):
+        left, right = (node, parent.right) if step == 'L' else (parent.left, node)
+        node = _compile_modified(Node("operator", left=left, right=right, value=parent.value))
+    return node
+
+def _compile_modified(node):
+    """
+    Compiles a node created by modify_rule: an operator becomes a closure over its children's evaluators,
+    and its attribute set is the union of theirs.
+    """
+    if node.compiled is None:
+        if node.node_type == "operator" and node.value in ("AND", "OR"):
+            children = [compile_rule(node.left), compile_rule(node.right)]
+            node.compiled = _compile_and(children) if node.value == "AND" else _compile_or(children)
+            node.attributes = referenced_attributes(node.left) | referenced_attributes(node.right)
+        else:
+            compile_rule(node)
+    return node
+
+# Writes an AST back as rule text
+def format_rule(ast):
+    """
+    Returns a rule string that parses back into the same conditions as the AST. Runs of the same AND/OR
+    operator are written without parentheses; nested groups are parenthesized.
+
+    Example:
+    Input: AST for 'age > 30 AND (department = "Sales" OR salary >= 50000)'
+    Output: "age > 30 AND (department = 'Sales' OR salary >= 50000)"
+
+    Args:
+        ast (Node): The root node of the AST.
+
+    Returns:
+        str: The rule in string format (empty for an empty AST).
+
+    Raises:
+        RuleEngineError: If the AST holds something rule strings cannot express, such as the constants left
+            by optimize_rule or a string containing both kinds of quotes.
+    """
+    if ast is None:
+        return ""
+    if ast.node_type == "operand":
+        attribute, operator_symbol, value = ast.value
+        return f"{attribute} {operator_symbol} {_format_value(value)}"
+    if ast.node_type == "operator":
+        parts = []
+        for child in _flatten(ast):
+            text = format_rule(child)
+            parts.append(f"({text})" if child.node_type == "operator" else text)
+        return f" {ast.value} ".join(parts)
+    raise RuleEngineError(f"A {ast.node_type} node cannot be written as a rule string")
+
+def _format_value(value):
+    """
+    Returns the rule string literal of a condition value (see format_rule).
+    """
+    if type(value) is int:
+        return str(value)
+    if type(value) is float and value == value and abs(value) != float('inf'):
+        text = format(Decimal(repr(value)), 'f')
+        return text if '.' in text else text + '.0'  # Keep floats floats when parsed back
+    if type(value) is str:
+        if "'" not in value:
+            return f"'{value}'"
+        if '"' not in value:
+            return f'"{value}"'
+    raise RuleEngineError(f"The value {value!r} cannot be written as a rule string")
+
+# Evaluates an AST against many records at once using NumPy boolean masks
+def evaluate_rule_batch(ast, records):
+    """
+    Evaluates the AST against a list of records in one vectorized pass.
+
+    The records are turned into one column per referenced attribute, each operand is evaluated as a NumPy
+    boolean mask over its column, and AND/OR nodes combine the masks with `&`/`|`. Errors are tracked per
+    record with the same short-circuit semantics as evaluate_rule, so a record only fails if evaluating it on
+    its own would have raised.
+
+    Example:
+    Input: AST for 'age > 30', [{'age': 35}, {'age': 20}, {}]
+    Output: (array([True, False, False]), [None, None, "Attribute 'age' not found in data"])
+
+    Args:
+        ast (Node): The root node of the AST.
+        records (List[Dict]): The data dictionaries to evaluate.
+
+    Returns:
+        Tuple[np.ndarray, List[Optional[str]]]: A boolean result per record (False for failed records) and
+        an error message per record (None for records that evaluated successfully).
+
+    Raises:
+        RuleEngineError: If the records are not a list of dictionaries or the AST is invalid.
+    """
+    if not isinstance(records, list) or not all(issubclass(cls, dict) for cls in set(map(type, records))):
+        raise RuleEngineError("Invalid data format")
+    if ast is None:
+        raise RuleEngineError("Empty rule")
+
+    columns = {attribute: _records_to_column(records, attribute) for attribute in referenced_attributes(ast)}
+    results, error_codes, messages = evaluate_rule_columns(ast, columns, len(records))
+    return results, [messages[code] for code in error_codes.tolist()]
+
+def evaluate_rule_columns(ast, columns, size):
+    """
+    Evaluates the AST against columnar data (see evaluate_rule_batch).
+
+    Args:
+        ast (Node): The root node of the AST.
+        columns (Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]): For each attribute, its values and a
+            boolean mask of the rows where it is present (None if it is present in every row). Attributes
+            absent from the mapping are missing in every row.
+        size (int): The number of rows.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, List[Optional[str]]]: A boolean result per row (False for failed rows),
+        an error code per row (0 if the row evaluated successfully) and the error message for each code.
+
+    Raises:
+        RuleEngineError: If an unknown operator or node type is encountered.
+    """
+    codes = {}
+    results, errors = _evaluate_node_columns(ast, columns, size, codes)
+    results = results & (errors == 0)
+    messages = [None] * (len(codes) + 1)
+    for message, code in codes.items():
+        messages[code] = message
+    return results, errors, messages
+
+def _records_to_column(records, attribute):
+    """
+    Extracts one attribute from every record into a NumPy array and a presence mask (None if always present).
+    """
+    try:
+        values = list(map(operator.itemgetter(attribute), records))
+        present = None
+    except KeyError:
+        # Some records lack the attribute: fill the gaps with None and remember where the values are
+        present = np.fromiter((attribute in record for record in records), dtype=bool, count=len(records))
+        values = [record.get(attribute) for record in records]
+
+    value_types = set(map(type, values if present is None else [v for v, found in zip(values, present) if found]))
+    if value_types and value_types <= {int, float}:
+        if present is not None:
+            values = [value if found else 0 for value, found in zip(values, present)]
+        try:
+            return np.array(values), present
+        except OverflowError:
+            pass  # Integers too large for int64 are compared as Python objects
+
+    return np.fromiter(values, dtype=object, count=len(values)), present
+
+def _error_code(codes, message):
+    """
+    Returns the error code for a message, assigning the next free code to new messages.
+    """
+    return codes.setdefault(message, len(codes) + 1)
+
+def _evaluate_node_columns(node, columns, size, codes):
+    """
+    Evaluates a node over columnar data, returning a boolean mask and an error code per row.
+    """
+    if node.node_type == "operand":
+        return _evaluate_operand_columns(node.value, columns, size, codes)
+
+    if node.node_type == "operator":
+        if node.value not in ("AND", "OR"):
+            raise RuleEngineError(f"Unknown operator: {node.value}")
+        is_and = node.value == "AND"
+        children = _flatten(node)
+        results, errors = _evaluate_node_columns(children[0], columns, size, codes)
+        for child in children[1:]:
+            # Rows already decided (or failed) by the children to the left never look at this child
+            pending = (errors == 0) & (results if is_and else ~results)
+            if not pending.any():
+                break
+            child_results, child_errors = _evaluate_node_columns(child, columns, size, codes)
+            errors = np.where(pending, child_errors, errors)
+            results = (results & child_results) if is_and else (results | child_results)
+        return results, errors
+
+    if node.node_type == "constant":
+        return np.full(size, bool(node.value)), np.zeros(size, dtype=np.int32)
+
+    raise RuleEngineError(f"Unknown node type: {node.node_type}")
+
+def _evaluate_operand_columns(condition, columns, size, codes):
+    """
+    Evaluates an attribute-operator-value condition over a column, returning a boolean mask and error codes.
+    """
+    attribute, operator_symbol, value = condition
+    compare = OPERATORS.get(operator_symbol)
+    if compare is None:
+        raise RuleEngineError(f"Unknown operator: {operator_symbol}")
+
+    errors = np.zeros(size, dtype=np.int32)
+    if attribute not in columns:
+        errors[:] = _error_code(codes, f"Attribute '{attribute}' not found in data")
+        return np.zeros(size, dtype=bool), errors
+    values, present = columns[attribute]
+
+    try:
+        results = np.asarray(compare(values, value), dtype=bool)
+        if results.shape != (size,):
+            raise TypeError("comparison did not produce one result per row")
+    except TypeError:
+        # Mixed or incomparable types: compare row by row and record the rows that fail
+        results = np.zeros(size, dtype=bool)
+        type_code = _error_code(codes, f"Cannot compare attribute '{attribute}' with {value!r}")
+        for index, data_value in enumerate(values.tolist()):
+            if present is not None and not present[index]:
+                continue
+            try:
+                results[index] = compare(data_value, value)
+            except TypeError:
+                errors[index] = type_code
+
+    if present is not None and not present.all():
+        errors[~present] = _error_code(codes, f"Attribute '{attribute}' not found in data")
+        results &= present
+    return results, errors
 
 # Serialize an AST into a dictionary format for storage
 def serialize_ast(node):
@@ -218,9 +1250,199 @@ def deserialize_ast(node_dict):
     """
     if node_dict is None:
         return None
+    value = node_dict.get('value')
+    if node_dict['node_type'] == 'operand' and isinstance(value, list):
+        value = tuple(value)  # JSON turns the (attribute, operator, value) tuple into a list
     return Node(
         node_type=node_dict['node_type'],
-        value=node_dict.get('value'),
+        value=value,
         left=deserialize_ast(node_dict.get('left')),
         right=deserialize_ast(node_dict.get('right'))
     )
+
+# Binary AST format: a header, a table of constants, a table of operands and a postfix program
+AST_MAGIC = b'RAST'
+AST_FORMAT_VERSION = 2
+_HEADER = struct.Struct('<4sBIII')  # magic, format version, constants, operands, program length
+_OP_AND = -1  # Pop two nodes, push AND(left, right)
+_OP_OR = -2  # Pop two nodes, push OR(left, right)
+_OP_SAVE = -3  # Remember the node on top of the stack in the next slot (for shared subtrees)
+_OP_FALSE = -4  # Push a false constant (see optimize_rule)
+_OP_TRUE = -5  # Push a true constant
+_OP_LOAD = -6  # -6 - k: push the node remembered in slot k
+_OP_LOAD_V1 = -4  # Format version 1 had no constants, so its slots started at -4
+_TAG_STR, _TAG_INT, _TAG_FLOAT, _TAG_BOOL, _TAG_NONE, _TAG_BIGINT = range(6)
+
+def _pack_array(items):
+    """
+    Returns the little-endian bytes of an array.
+    """
+    if sys.byteorder == 'big':
+        items = array(items.typecode, items)
+        items.byteswap()
+    return items.tobytes()
+
+def _unpack_array(typecode, data, offset, count):
+    """
+    Reads `count` little-endian items of the given typecode starting at offset; returns them and the new offset.
+    """
+    items = array(typecode)
+    end = offset + count * items.itemsize
+    if end > len(data):
+        raise RuleEngineError("Truncated binary AST")
+    items.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        items.byteswap()
+    return items, end
+
+# Serialize an AST into the compact binary format
+def pack_ast(ast):
+    """
+    Serializes an AST into a compact binary format.
+    
+    Each distinct constant (attribute names, operators and values) is stored once, each distinct condition is
+    stored once as three indexes into the constants, and the tree itself is a flat postfix program of 32-bit
+    integers. Shared subtrees (see combine_rules) are stored once and stay shared when unpacked.
+    
+    Args:
+        ast (Node): The root node of the AST.
+    
+    Returns:
+        bytes: The packed AST.
+    
+    Raises:
+        RuleEngineError: If the AST contains an unknown node type or operator.
+    """
+    constants, constant_ids = [], {}
+    operands, operand_ids = array('I'), {}
+    program = array('i')
+    shared = {id(node) for node in _shared_subtrees(ast)} if ast is not None else set()
+    slots = {}
+
+    def constant_id(value):
+        key = (type(value), value)
+        if key not in constant_ids:
+            constant_ids[key] = len(constants)
+            constants.append(value)
+        return constant_ids[key]
+
+    stack = [(ast, False)] if ast is not None else []
+    while stack:
+        node, children_done = stack.pop()
+        if id(node) in slots:
+            program.append(_OP_LOAD - slots[id(node)])
+        elif node.node_type == 'operand':
+            key = (tuple(map(type, node.value)), tuple(node.value))
+            if key not in operand_ids:
+                operand_ids[key] = len(operand_ids)
+                operands.extend(constant_id(item) for item in node.value)
+            program.append(operand_ids[key])
+        elif node.node_type == 'constant':
+            program.append(_OP_TRUE if node.value else _OP_FALSE)
+        elif node.node_type != 'operator' or node.value not in ('AND', 'OR'):
+            raise RuleEngineError(f"Cannot pack node: {node.node_type} {node.value}")
+        elif not children_done:
+            stack.append((node, True))
+            stack.append((node.right, False))
+            stack.append((node.left, False))
+        else:
+            program.append(_OP_AND if node.value == 'AND' else _OP_OR)
+            if id(node) in shared:
+                program.append(_OP_SAVE)
+                slots[id(node)] = len(slots)
+
+    parts = [_HEADER.pack(AST_MAGIC, AST_FORMAT_VERSION, len(constants), len(operand_ids), len(program))]
+    for value in constants:
+        if type(value) is str:
+            encoded = value.encode()
+            parts.append(struct.pack('<BI', _TAG_STR, len(encoded)) + encoded)
+        elif type(value) is bool:
+            parts.append(struct.pack('<B?', _TAG_BOOL, value))
+        elif type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            parts.append(struct.pack('<Bq', _TAG_INT, value))
+        elif type(value) is int:
+            encoded = str(value).encode()
+            parts.append(struct.pack('<BI', _TAG_BIGINT, len(encoded)) + encoded)
+        elif type(value) is float:
+            parts.append(struct.pack('<Bd', _TAG_FLOAT, value))
+        elif value is None:
+            parts.append(struct.pack('<B', _TAG_NONE))
+        else:
+            raise RuleEngineError(f"Cannot pack value: {value!r}")
+    parts.append(_pack_array(operands))
+    parts.append(_pack_array(program))
+    return b''.join(parts)
+
+# Deserialize the compact binary format back into an AST
+def unpack_ast(data):
+    """
+    Deserializes an AST packed by pack_ast.
+    
+    Args:
+        data (bytes): The packed AST.
+    
+    Returns:
+        Node: The root node of the AST, or None for an empty AST.
+    
+    Raises:
+        RuleEngineError: If the data is not a valid packed AST.
+    """
+    data = memoryview(data)
+    if len(data) < _HEADER.size:
+        raise RuleEngineError("Truncated binary AST")
+    magic, version, constant_count, operand_count, program_length = _HEADER.unpack_from(data)
+    if magic != AST_MAGIC or version not in (1, AST_FORMAT_VERSION):
+        raise RuleEngineError("Unsupported binary AST format")
+    load = _OP_LOAD if version == AST_FORMAT_VERSION else _OP_LOAD_V1
+
+    try:
+        offset = _HEADER.size
+        constants = []
+        for _ in range(constant_count):
+            tag = data[offset]
+            offset += 1
+            if tag == _TAG_STR or tag == _TAG_BIGINT:
+                (length,) = struct.unpack_from('<I', data, offset)
+                text = bytes(data[offset + 4:offset + 4 + length]).decode()
+                constants.append(text if tag == _TAG_STR else int(text))
+                offset += 4 + length
+            elif tag == _TAG_INT:
+                constants.append(struct.unpack_from('<q', data, offset)[0])
+                offset += 8
+            elif tag == _TAG_FLOAT:
+                constants.append(struct.unpack_from('<d', data, offset)[0])
+                offset += 8
+            elif tag == _TAG_BOOL:
+                constants.append(struct.unpack_from('<?', data, offset)[0])
+                offset += 1
+            elif tag == _TAG_NONE:
+                constants.append(None)
+            else:
+                raise RuleEngineError(f"Unknown constant tag {tag} in binary AST")
+        operand_indexes, offset = _unpack_array('I', data, offset, operand_count * 3)
+        program, offset = _unpack_array('i', data, offset, program_length)
+
+        operand_nodes = [
+            Node('operand', value=(constants[operand_indexes[i]], constants[operand_indexes[i + 1]], constants[operand_indexes[i + 2]]))
+            for i in range(0, len(operand_indexes), 3)
+        ]
+        stack, slots = [], []
+        for instruction in program:
+            if instruction >= 0:
+                stack.append(operand_nodes[instruction])
+            elif instruction == _OP_AND or instruction == _OP_OR:
+                right = stack.pop()
+                left = stack.pop()
+                stack.append(Node('operator', left=left, right=right, value='AND' if instruction == _OP_AND else 'OR'))
+            elif instruction == _OP_SAVE:
+                slots.append(stack[-1])
+            elif load == _OP_LOAD and instruction in (_OP_FALSE, _OP_TRUE):
+                stack.append(Node('constant', value=instruction == _OP_TRUE))
+            else:
+                stack.append(slots[load - instruction])
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise RuleEngineError(f"Corrupt binary AST: {e}") from None
+
+    if len(stack) > 1:
+        raise RuleEngineError("Corrupt binary AST: unbalanced program")
+    return stack[0] if stack else None
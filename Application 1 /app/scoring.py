@@ -0,0 +1,244 @@
+from concurrent.futures import ProcessPoolExecutor  # Scoring chunks on several cores
+from collections import deque  # Chunks in flight, in file order
+import json  # The summary written next to the result matrix
+import multiprocessing  # Start method of the worker processes
+import os  # Default number of workers
+import struct  # The header of the result matrix file
+import numpy as np  # Vectorized masks and the packed result matrix
+import pandas as pd  # Reading CSV and Parquet files in chunks
+from app.rules import (create_rule, optimize_rule, evaluate_rule_columns, referenced_attributes, pack_ast,
+                       unpack_ast, RuleEngineError)
+
+DEFAULT_CHUNK_SIZE = 100000
+
+# The result matrix is a NumPy .npy file of packed bits, so it can be memory-mapped with np.load; its header is
+# written before the number of rows is known, so it is padded to a fixed length and rewritten at the end
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+_NPY_HEADER_LENGTH = 128
+
+def load_stored_rules():
+    """
+    Returns every stored rule that can be evaluated, in id order, and the rules that cannot.
+
+    Rules whose stored AST cannot be decoded are parsed again from their rule string, and every rule is
+    simplified with optimize_rule.
+
+    Returns:
+        Tuple[List[Tuple[int, Node]], Dict[int, str]]: (rule id, AST) pairs and an error message per skipped
+            rule id.
+    """
+    from app.database import iter_rules  # Imported here so scoring can be used without a database
+    rules, skipped = [], {}
+    for rule_id, rule_string, ast in iter_rules(with_ids=True):
+        try:
+            ast = optimize_rule(ast) if ast is not None else create_rule(rule_string)
+            if ast is None:
+                raise RuleEngineError("Empty rule")
+        except RuleEngineError as e:
+            skipped[rule_id] = str(e)
+            continue
+        rules.append((rule_id, ast))
+    return rules, skipped
+
+def read_chunks(path, attributes, chunk_size=DEFAULT_CHUNK_SIZE, file_format=None):
+    """
+    Reads a CSV or Parquet file as DataFrames of at most `chunk_size` rows, keeping only the given columns.
+
+    Args:
+        path (str): The file to read.
+        attributes (Set[str]): The columns to read; other columns are skipped.
+        chunk_size (int): The number of rows per chunk.
+        file_format (str, optional): 'csv' or 'parquet' (default: from the file extension).
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks, in file order.
+
+    Raises:
+        ValueError: If the format is unknown.
+        ImportError: If a Parquet file is read without pyarrow installed.
+    """
+    file_format = file_format or ('parquet' if path.endswith(('.parquet', '.pq')) else 'csv')
+    if file_format == 'csv':
+        yield from pd.read_csv(path, usecols=lambda column: column in attributes, chunksize=chunk_size)
+    elif file_format == 'parquet':
+        try:
+            import pyarrow.parquet as parquet  # Optional: only needed for Parquet files
+        except ImportError:
+            raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow)") from None
+        parquet_file = parquet.ParquetFile(path)
+        columns = [column for column in parquet_file.schema_arrow.names if column in attributes]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unknown file format '{file_format}', expected 'csv' or 'parquet'")
+
+def frame_to_columns(frame):
+    """
+    Converts a DataFrame into the columnar form taken by evaluate_rule_columns. Missing values (empty CSV
+    fields, NaN and nulls) count as a missing attribute.
+
+    Args:
+        frame (pd.DataFrame): The chunk.
+
+    Returns:
+        Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]: Per column, its values and a presence mask (None
+            if every row has a value).
+    """
+    columns = {}
+    for name, series in frame.items():
+        present = series.notna().to_numpy()
+        if present.all():
+            present = None
+        if series.dtype.kind in 'iufb':
+            values = series.to_numpy()
+            if present is not None:
+                values = np.where(present, values, 0)  # Keep missing rows out of the comparisons
+        elif pd.api.types.infer_dtype(series, skipna=True) == 'string':
+            values = series.to_numpy(dtype=str, na_value='')  # Fixed-width strings compare in C, not per object
+        else:
+            values = series.to_numpy(dtype=object)
+            if present is not None:
+                values = np.where(present, values, None)
+        columns[str(name)] = (values, present)
+    return columns
+
+def score_columns(asts, columns, size):
+    """
+    Evaluates every rule over one chunk of columnar data.
+
+    Args:
+        asts (List[Node]): The rules, in result column order.
+        columns (Dict): The chunk's columns (see frame_to_columns).
+        size (int): The number of rows in the chunk.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The packed result bits, one row of ceil(rules / 8) bytes per
+            data row (rows that fail a rule score 0 for it), and the number of matching and of failed rows per
+            rule.
+    """
+    results = np.zeros((size, len(asts)), dtype=bool)
+    failures = np.zeros(len(asts), dtype=np.int64)
+    for index, ast in enumerate(asts):
+        results[:, index], errors, _ = evaluate_rule_columns(ast, columns, size)
+        failures[index] = np.count_nonzero(errors)
+    return np.packbits(results, axis=1), np.count_nonzero(results, axis=0), failures
+
+_worker_asts = None  # The rules of a worker process, unpacked once when the worker starts
+
+def _initialize_worker(packed_asts):
+    """
+    Unpacks the rules shipped to a worker process.
+    """
+    global _worker_asts
+    _worker_asts = [unpack_ast(packed) for packed in packed_asts]
+
+def _score_in_worker(columns, size):
+    """
+    Scores one chunk in a worker process (see score_columns).
+    """
+    return score_columns(_worker_asts, columns, size)
+
+def _npy_header(rows, row_bytes):
+    """
+    Returns the fixed-length .npy header of a (rows, row_bytes) uint8 matrix.
+    """
+    header = repr({'descr': '|u1', 'fortran_order': False, 'shape': (rows, row_bytes)}).encode('latin1')
+    padding = _NPY_HEADER_LENGTH - len(_NPY_MAGIC) - 2 - len(header) - 1
+    return _NPY_MAGIC + struct.pack('<H', _NPY_HEADER_LENGTH - len(_NPY_MAGIC) - 2) + header + b' ' * padding + b'\n'
+
+def score_file(path, output, rules=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, file_format=None):
+    """
+    Scores every row of a CSV or Parquet file against many rules and writes the result matrix to disk.
+
+    The file is read in chunks of columns (only the columns some rule reads). Each chunk is turned into NumPy
+    arrays once and every rule is evaluated over it as vectorized masks (see evaluate_rule_columns), on a pool
+    of worker processes that receive the rules once, in packed form, when they start. At most two chunks per
+    worker are in flight, so memory stays bounded whatever the file size.
+
+    The output is a .npy matrix of packed bits with one row per data row and one bit per rule, in the order
+    of `rule_ids` in the summary; `load_scores` unpacks it. A row that fails a rule (e.g., a missing value)
+    scores 0 for it and is counted in the rule's `errors`. The summary is also written as JSON next to the
+    matrix, under the same name with a .json extension.
+
+    Args:
+        path (str): The CSV or Parquet file to score.
+        output (str): The path of the result matrix.
+        rules (List[Tuple[int, Node]], optional): (rule id, AST) pairs (default: every stored rule).
+        chunk_size (int): The number of rows read and scored at a time.
+        workers (int, optional): The number of worker processes (default: the number of CPUs); 0 scores
+            in the calling process.
+        file_format (str, optional): 'csv' or 'parquet' (default: from the file extension).
+
+    Returns:
+        Dict: The summary: rows, rule_ids, per-rule matches and errors, and skipped rules with their errors.
+    """
+    skipped = {}
+    if rules is None:
+        rules, skipped = load_stored_rules()
+    rule_ids = [rule_id for rule_id, _ in rules]
+    asts = [ast for _, ast in rules]
+    attributes = set().union(*map(referenced_attributes, asts))
+    row_bytes = (len(asts) + 7) // 8
+    workers = (os.cpu_count() or 1) if workers is None else workers
+
+    rows = 0
+    matches = np.zeros(len(asts), dtype=np.int64)
+    errors = np.zeros(len(asts), dtype=np.int64)
+    pool = None
+    if workers > 0 and asts:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_initialize_worker, initargs=([pack_ast(ast) for ast in asts],))
+    try:
+        with open(output, 'wb') as matrix:
+            matrix.write(_npy_header(0, row_bytes))
+
+            def write(packed, matched, failures):
+                nonlocal rows
+                matrix.write(packed.tobytes())
+                rows += len(packed)
+                matches[:] += matched
+                errors[:] += failures
+
+            pending = deque()
+            for frame in read_chunks(path, attributes, chunk_size, file_format):
+                columns = frame_to_columns(frame)
+                if pool is None:
+                    write(*score_columns(asts, columns, len(frame)))
+                    continue
+                pending.append(pool.submit(_score_in_worker, columns, len(frame)))
+                if len(pending) >= 2 * workers:
+                    write(*pending.popleft().result())
+            while pending:
+                write(*pending.popleft().result())
+
+            matrix.seek(0)
+            matrix.write(_npy_header(rows, row_bytes))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    summary = {
+        'rows': rows,
+        'rule_ids': rule_ids,
+        'matches': dict(zip(map(str, rule_ids), matches.tolist())),
+        'errors': dict(zip(map(str, rule_ids), errors.tolist())),
+        'skipped': {str(rule_id): message for rule_id, message in skipped.items()},
+    }
+    with open(os.path.splitext(output)[0] + '.json', 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+def load_scores(output):
+    """
+    Loads a result matrix written by score_file.
+
+    Args:
+        output (str): The path of the result matrix.
+
+    Returns:
+        Tuple[np.ndarray, List[int]]: A boolean (rows, rules) matrix and the rule id of each column.
+    """
+    with open(os.path.splitext(output)[0] + '.json') as summary_file:
+        rule_ids = json.load(summary_file)['rule_ids']
+    packed = np.load(output, mmap_mode='r')
+    return np.unpackbits(packed, axis=1, count=len(rule_ids)).astype(bool), rule_ids
@@ -0,0 +1,408 @@
+import threading  # Locks for thread-safe statistics and reordering
+import time  # Timing sampled predicate evaluations
+from operator import itemgetter  # Fetching the guarded attributes of a record in one call
+from app.rules import (OPERATORS, compile_rule, _OPERATOR_NAMES, _balanced, _flatten, _generate_expression,
+                       _shared_subtrees)
+
+# Types a record value may have for an ordering comparison with a constant to be guaranteed not to raise
+_NUMBER_TYPES = frozenset((int, float, bool))
+_STRING_TYPES = frozenset((str,))
+_MISSING = object()  # Never a record value
+
+def _clock_overhead():
+    """
+    Returns the smallest time measured between two back-to-back clock reads, subtracted from sampled costs.
+    """
+    clock = time.perf_counter_ns
+    return min(-clock() + clock() for _ in range(1000))
+
+_CLOCK_OVERHEAD = _clock_overhead()
+
+class SelectivityTracker:
+    """
+    Collects per-predicate runtime statistics and uses them to reorder the AND/OR chains of tracked rules.
+
+    Every `sample_interval`-th evaluation of a tracked rule also evaluates each of its predicates on their own,
+    recording whether it held and how long it took. Predicates are keyed by their (attribute, operator, value)
+    condition, so rules sharing a predicate share its statistics. Every `reorder_interval`-th evaluation the
+    rule is re-planned from the statistics (see AdaptiveRule).
+
+    Attributes:
+        sample_interval (int): One in this many evaluations of a rule records predicate statistics.
+        reorder_interval (int): One in this many evaluations of a rule re-plans its evaluation order.
+    """
+
+    def __init__(self, sample_interval=64, reorder_interval=4096):
+        """
+        Initializes a tracker with no statistics.
+
+        Args:
+            sample_interval (int): One in this many evaluations of a rule records predicate statistics.
+            reorder_interval (int): One in this many evaluations of a rule re-plans its evaluation order.
+        """
+        if sample_interval < 1 or reorder_interval < 1:
+            raise ValueError("sample_interval and reorder_interval must be positive integers")
+        self.sample_interval = sample_interval
+        self.reorder_interval = reorder_interval
+        self._stats = {}  # condition -> [evaluations, times true, total cost in nanoseconds]
+        self._evaluations = 0  # Evaluations recorded over all predicates
+        self._cost = 0  # Total cost recorded over all predicates, in nanoseconds
+        self._lock = threading.Lock()
+
+    def track(self, ast):
+        """
+        Makes a rule adaptive: compile_rule and evaluate_rule use an AdaptiveRule for it from now on. The
+        AdaptiveRule is available as the `rule` attribute of the compiled evaluator.
+
+        Args:
+            ast (Node): The root node of the rule's AST, or None.
+
+        Returns:
+            Node: The same AST, so the method can wrap a parser (e.g., `tracker.track(create_rule(s))`).
+
+        Raises:
+            RuleEngineError: If the rule cannot be compiled.
+        """
+        if ast is not None and getattr(ast.compiled, 'rule', None) is None:
+            ast.compiled = AdaptiveRule(ast, self).evaluate
+        return ast
+
+    def record(self, condition, result, cost_ns):
+        """
+        Records one evaluation of a predicate.
+
+        Args:
+            condition (Tuple): The (attribute, operator, value) condition of the predicate.
+            result (bool): Whether the predicate held.
+            cost_ns (int): How long the evaluation took, in nanoseconds.
+        """
+        self.record_many([(condition, result, cost_ns)])
+
+    def record_many(self, outcomes):
+        """
+        Records several predicate evaluations at once.
+
+        Args:
+            outcomes (Iterable[Tuple[Tuple, bool, int]]): (condition, result, cost in nanoseconds) triples.
+        """
+        with self._lock:
+            stats = self._stats
+            for condition, result, cost_ns in outcomes:
+                entry = stats.get(condition)
+                if entry is None:
+                    entry = stats[condition] = [0, 0, 0]
+                entry[0] += 1
+                entry[1] += bool(result)
+                entry[2] += cost_ns
+                self._evaluations += 1
+                self._cost += cost_ns
+
+    def estimate(self, condition):
+        """
+        Returns the estimated probability that a predicate holds and its estimated cost.
+
+        Predicates without statistics are assumed to hold half of the time and to cost as much as the average
+        predicate seen so far.
+
+        Args:
+            condition (Tuple): The (attribute, operator, value) condition of the predicate.
+
+        Returns:
+            Tuple[float, float]: The probability that the predicate holds and its mean cost in nanoseconds.
+        """
+        with self._lock:
+            entry = self._stats.get(condition)
+            if entry is None:
+                return 0.5, max(self._cost / self._evaluations, 1.0) if self._evaluations else 1.0
+            evaluations, true_count, total_cost = entry
+        return (true_count + 1) / (evaluations + 2), max(total_cost / evaluations, 1.0)  # Laplace-smoothed rate
+
+    def stats(self):
+        """
+        Returns a snapshot of the predicate statistics, most evaluated first.
+
+        Returns:
+            List[Dict]: One entry per predicate with its attribute, operator, value, number of sampled
+                evaluations, true rate and mean cost in nanoseconds.
+        """
+        with self._lock:
+            snapshot = [(condition, list(entry)) for condition, entry in self._stats.items()]
+        snapshot.sort(key=lambda item: -item[1][0])
+        return [
+            {
+                'attribute': condition[0],
+                'operator': condition[1],
+                'value': condition[2],
+                'evaluations': evaluations,
+                'true_rate': true_count / evaluations,
+                'mean_cost_ns': total_cost / evaluations
+            }
+            for condition, (evaluations, true_count, total_cost) in snapshot
+        ]
+
+    def reset(self):
+        """
+        Discards all statistics.
+        """
+        with self._lock:
+            self._stats.clear()
+            self._evaluations = 0
+            self._cost = 0
+
+class AdaptiveRule:
+    """
+    A compiled rule whose AND/OR chains are periodically reordered so the child most likely to decide the
+    chain, per unit of cost, runs first.
+
+    AND and OR are commutative, so any order of a chain's children gives the same result as long as no child
+    raises. Reordering can however skip a child that would have raised a missing-attribute or type error in
+    source order, or reach one that source order would have skipped. The reordered evaluator is therefore
+    only used when the record has every attribute the rule reads, with types for which none of the rule's
+    comparisons can raise; any other record is evaluated in source order, with the usual errors.
+
+    Attributes:
+        ast (Node): The rule as written.
+        plan (Node): The rule in its current evaluation order.
+    """
+
+    def __init__(self, ast, tracker):
+        """
+        Wraps a rule for adaptive evaluation.
+
+        Args:
+            ast (Node): The root node of the rule's AST.
+            tracker (SelectivityTracker): The tracker supplying and receiving predicate statistics.
+
+        Raises:
+            RuleEngineError: If the rule cannot be compiled.
+        """
+        self.ast = ast
+        self.plan = ast
+        self.tracker = tracker
+        self._source = compile_rule(ast)  # The source-order evaluator, which also produces the error messages
+        self._evaluate = self._source
+        self._samples = 0  # Samples taken since the last re-plan
+        self._samples_taken = 0
+        self._reordering = threading.Lock()
+
+        conditions = {}
+        stack = [ast]
+        while stack:
+            node = stack.pop()
+            if node.node_type == "operand":
+                conditions[node.value] = None
+            else:
+                stack.extend(child for child in (node.left, node.right) if child is not None)
+        self._operands = [(condition, condition[0], OPERATORS.get(condition[1]), condition[2]) for condition in conditions]
+        self._guards = _safe_types(conditions)  # None if some comparison can raise whatever the record holds
+        self._guard = _generate_guard(self._guards) if self._guards is not None else None
+        self._guard_cost = 0  # Total time spent in sampled guard checks, in nanoseconds
+        self.evaluate = self._entry_point()
+
+    def __call__(self, data):
+        return self.evaluate(data)
+
+    def _entry_point(self):
+        """
+        Builds the function installed as the rule's compiled evaluator: it runs the current plan and hands
+        every `sample_interval`-th record to _sample_and_evaluate.
+        """
+        countdown = self.tracker.sample_interval
+
+        def evaluate(data):
+            nonlocal countdown
+            countdown -= 1
+            if countdown:
+                return self._evaluate(data)
+            countdown = self.tracker.sample_interval
+            return self._sample_and_evaluate(data)
+        evaluate.rule = self
+        return evaluate
+
+    def _sample_and_evaluate(self, data):
+        """
+        Evaluates every predicate of the rule on its own, records the outcomes, re-plans the rule when due and
+        then evaluates it.
+        """
+        clock = time.perf_counter_ns
+        outcomes = []
+        for condition, attribute, compare, value in self._operands:
+            try:
+                record_value = data[attribute]
+                start = clock()
+                result = compare(record_value, value)
+                outcomes.append((condition, result, max(clock() - start - _CLOCK_OVERHEAD, 0)))
+            except (KeyError, TypeError):
+                continue  # Errors are reported by the evaluation itself
+        self.tracker.record_many(outcomes)
+        if self._guard is not None:
+            start = clock()
+            self._guard(data)
+            self._guard_cost += max(clock() - start - _CLOCK_OVERHEAD, 0)
+
+        self._samples += 1
+        self._samples_taken += 1
+        if self._samples * self.tracker.sample_interval >= self.tracker.reorder_interval:
+            self._samples = 0
+            self.reorder()
+        return self._evaluate(data)
+
+    def reorder(self):
+        """
+        Re-plans the evaluation order from the current statistics.
+
+        A reordered plan pays for the guard check on every record, so it is only used when its expected cost
+        plus the measured cost of the guard beats the current plan. The plan only changes when the new order is
+        expected to be at least 10% cheaper, so noise in the statistics does not make it flip back and forth.
+
+        Returns:
+            bool: Whether the evaluation order changed.
+        """
+        if self._guards is None or not self._reordering.acquire(blocking=False):
+            return False
+        try:
+            try:
+                plan, cost = _plan(self.ast, self.tracker)
+                _, current_cost = _plan(self.plan, self.tracker, reorder=False)
+            except RecursionError:
+                return False  # Too deeply nested to re-plan; keep the current order
+            guard_cost = self._guard_cost / self._samples_taken if self._samples_taken else 0.0
+            cost += guard_cost if plan is not self.ast else 0.0
+            current_cost += guard_cost if self.plan is not self.ast else 0.0
+            if plan is self.plan or cost >= 0.9 * current_cost:
+                return False
+            self._evaluate = self._source if plan is self.ast else _generate_guarded_evaluator(plan, self._guards, self._source)
+            self.plan = plan
+            return True
+        finally:
+            self._reordering.release()
+
+def _safe_types(conditions):
+    """
+    Returns, per attribute, the value types for which none of the conditions can raise (None meaning any
+    type), or None if some condition can raise for every type.
+    """
+    guards = {}
+    for attribute, operator_symbol, value in conditions:
+        if operator_symbol not in OPERATORS:
+            return None
+        if operator_symbol == '=':
+            allowed = None  # Equality never raises
+        elif type(value) in _NUMBER_TYPES:
+            allowed = _NUMBER_TYPES
+        elif type(value) is str:
+            allowed = _STRING_TYPES
+        else:
+            return None
+        current = guards.get(attribute)
+        guards[attribute] = allowed if current is None else (current if allowed is None else current & allowed)
+        if guards[attribute] is not None and not guards[attribute]:
+            return None
+    return guards
+
+def _plan(ast, tracker, reorder=True):
+    """
+    Returns a copy of the AST whose AND/OR chains are ordered by cost over the probability of deciding the
+    chain, sharing unchanged subtrees with the original, together with its expected cost. With `reorder`
+    False, returns the AST itself and its expected cost in its current order.
+    """
+    shared = {id(node) for node in _shared_subtrees(ast)}
+    planned = {}  # id(node) -> (planned node, probability of being true, expected cost)
+
+    def visit(node):
+        result = planned.get(id(node))
+        if result is not None:
+            return result
+        if node.node_type == "operand":
+            probability, cost = tracker.estimate(node.value)
+            result = (node, probability, cost)
+        elif node.node_type == "constant":
+            result = (node, 1.0 if node.value else 0.0, 0.0)
+        else:
+            children = _flatten(node, stop=shared)
+            estimates = [visit(child) for child in children]
+            if node.value == "AND":  # Stop at the first false child
+                rank = lambda item: item[2] / max(1.0 - item[1], 1e-9)
+            else:  # Stop at the first true child
+                rank = lambda item: item[2] / max(item[1], 1e-9)
+            ordered = sorted(estimates, key=rank) if reorder else estimates
+            cost, reach = 0.0, 1.0
+            for _, child_probability, child_cost in ordered:
+                cost += reach * child_cost
+                reach *= child_probability if node.value == "AND" else 1.0 - child_probability
+            probability = reach if node.value == "AND" else 1.0 - reach
+            nodes = [item[0] for item in ordered]
+            if all(new is old for new, old in zip(nodes, children)):
+                result = (node, probability, cost)  # Already in the best order
+            else:
+                result = (_balanced(node.value, nodes), probability, cost)
+        planned[id(node)] = result
+        return result
+
+    plan, _, cost = visit(ast)
+    return plan, cost
+
+def _guard_checks(guards, namespace):
+    """
+    Returns the source of the checks that a record has every guarded attribute with an allowed type, binding
+    the helpers they use into the namespace.
+
+    Attributes with the same allowed types are checked together in C: itemgetter raises KeyError for a missing
+    attribute and issuperset rejects a value of any other type.
+    """
+    namespace['_type'] = type
+    groups = {}
+    for attribute, allowed in sorted(guards.items()):
+        groups.setdefault(allowed, []).append(attribute)
+    checks = []
+    for index, (allowed, attributes) in enumerate(groups.items()):
+        namespace[f"_get{index}"] = itemgetter(*attributes)
+        namespace[f"_types{index}"] = allowed if allowed is not None else _MISSING
+        if allowed is None:  # Only the attribute's presence matters
+            checks.append(f"_get{index}(data) is not _types{index}")
+        elif len(attributes) == 1:
+            checks.append(f"_type(_get{index}(data)) in _types{index}")
+        else:
+            checks.append(f"_types{index}.issuperset(map(_type, _get{index}(data)))")
+    return " and ".join(checks) or "True"
+
+def _generate_guard(guards):
+    """
+    Generates a function returning whether a record passes the guards.
+    """
+    namespace = {}
+    source = (
+        "def guard(data):\n"
+        "    try:\n"
+        f"        return {_guard_checks(guards, namespace)}\n"
+        "    except KeyError:\n"
+        "        return False\n"
+    )
+    exec(compile(source, '<adaptive rule guard>', 'exec'), namespace)
+    return namespace['guard']
+
+def _generate_guarded_evaluator(plan, guards, fallback):
+    """
+    Generates an evaluator for a reordered plan that checks the record against the guards first and hands
+    records that fail them, or that raise anyway, to the fallback evaluator.
+    """
+    namespace = {name: OPERATORS[symbol] for symbol, name in _OPERATOR_NAMES.items()}
+    namespace['_fallback'] = fallback
+    memo = {id(node): f"_m{index}" for index, node in enumerate(_shared_subtrees(plan))}
+    expression = _generate_expression(plan, namespace, memo)
+
+    checks = _guard_checks(guards, namespace)
+
+    memo_init = "    " + " = ".join(list(memo.values()) + ["None"]) + "\n" if memo else ""
+    source = (
+        "def evaluate(data):\n"
+        f"{memo_init}"
+        "    try:\n"
+        f"        if {checks}:\n"
+        f"            return {expression}\n"
+        "    except (KeyError, TypeError):\n"
+        "        pass\n"
+        "    return _fallback(data)\n"
+    )
+    exec(compile(source, '<adaptive rule>', 'exec'), namespace)
+    return namespace['evaluate']
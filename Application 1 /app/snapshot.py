@@ -0,0 +1,122 @@
+import hashlib  # Checksum of the snapshot body
+import mmap  # Reading snapshots without copying them into memory first
+import os  # Locating the snapshot and replacing it atomically
+import struct  # Packing the header and rule records
+import tempfile  # Writing the new snapshot next to the old one before replacing it
+from app.rules import pack_ast, AST_MAGIC, AST_FORMAT_VERSION
+
+# A snapshot is a header followed by one record per rule: its id, its version and its AST in the binary format
+# of app.rules.pack_ast. The header holds the snapshot format version, the binary AST format version, the
+# highest rule version the snapshot covers, the number of rules and the SHA-256 of everything after the header.
+SNAPSHOT_MAGIC = b'RULESNAP'
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_EXTENSION = '.snapshot'
+
+_HEADER = struct.Struct('<8sHHqI32s')  # magic, snapshot version, AST format version, rules version, count, checksum
+_RECORD = struct.Struct('<qqI')  # rule id, rule version, packed AST length
+
+def snapshot_path(database_path):
+    """
+    Returns where the snapshot of a database's rules is stored: next to the database file, with the
+    .snapshot extension (e.g., rule_engine.db -> rule_engine.snapshot).
+
+    Args:
+        database_path (str, optional): The path of the database file.
+
+    Returns:
+        str: The snapshot path, or None if the database is not a file (e.g., an in-memory database).
+    """
+    if not database_path or database_path == ':memory:':
+        return None
+    return os.path.splitext(database_path)[0] + SNAPSHOT_EXTENSION
+
+def write_snapshot(path, rules, version):
+    """
+    Writes a snapshot of a rule set. The file is written under a temporary name and then renamed, so readers
+    never see a partial snapshot.
+
+    Args:
+        path (str): The snapshot path.
+        rules (Iterable[Tuple[int, int, Node or bytes]]): (rule id, rule version, AST) triples. ASTs may be
+            given already packed (see app.rules.pack_ast).
+        version (int): The highest rule version the rule set covers.
+
+    Returns:
+        int: The number of rules written.
+    """
+    body, count = bytearray(), 0
+    for rule_id, rule_version, ast in rules:
+        packed = ast if isinstance(ast, bytes) else pack_ast(ast)
+        body += _RECORD.pack(rule_id, rule_version, len(packed))
+        body += packed
+        count += 1
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, AST_FORMAT_VERSION, version, count,
+                          hashlib.sha256(body).digest())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(prefix='.snapshot-', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as snapshot:
+            snapshot.write(header)
+            snapshot.write(body)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return count
+
+def load_snapshot(path):
+    """
+    Loads a snapshot written by write_snapshot. The file is memory-mapped and its checksum is verified over the
+    mapping. ASTs are returned in packed form, so loading costs one copy per rule and each rule is only
+    unpacked (with app.rules.unpack_ast) when it is first used.
+
+    Args:
+        path (str): The snapshot path.
+
+    Returns:
+        Tuple[int, List[Tuple[int, int, bytes]]]: The highest rule version the snapshot covers and its
+            (rule id, rule version, packed AST) triples, or None if there is no snapshot.
+
+    Raises:
+        ValueError: If the file is not a snapshot, was written with another snapshot or AST format version, or
+            fails its checksum.
+    """
+    try:
+        snapshot = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with snapshot:
+        if os.fstat(snapshot.fileno()).st_size < _HEADER.size:
+            raise ValueError("Truncated rule snapshot")
+        with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            with memoryview(mapping) as data:
+                return _read_snapshot(data)
+
+def _read_snapshot(data):
+    """
+    Validates and decodes the contents of a snapshot (see load_snapshot).
+    """
+    magic, snapshot_version, ast_version, version, count, checksum = _HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a rule snapshot")
+    if snapshot_version != SNAPSHOT_FORMAT_VERSION or ast_version != AST_FORMAT_VERSION:
+        raise ValueError(f"Unsupported rule snapshot version {snapshot_version}.{ast_version}")
+    if hashlib.sha256(data[_HEADER.size:]).digest() != checksum:
+        raise ValueError("Rule snapshot checksum mismatch")
+
+    rules, offset = [], _HEADER.size
+    try:
+        for _ in range(count):
+            rule_id, rule_version, length = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if bytes(data[offset:offset + len(AST_MAGIC)]) != AST_MAGIC:
+                raise ValueError(f"rule {rule_id} is not a packed AST")
+            rules.append((rule_id, rule_version, bytes(data[offset:offset + length])))
+            offset += length
+    except (struct.error, ValueError) as e:
+        raise ValueError(f"Corrupt rule snapshot: {e}") from None
+    if offset != len(data):
+        raise ValueError("Corrupt rule snapshot: trailing data")
+    return version, rules
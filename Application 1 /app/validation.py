@@ -0,0 +1,103 @@
+import json  # Decoding request bodies when orjson is not installed, or cannot decode them
+import re  # Spotting numbers orjson cannot decode exactly
+from marshmallow import fields
+
+try:
+    import orjson  # Optional: a faster JSON decoder
+except ImportError:
+    orjson = None
+
+# Runs of 19 or more digits, which may be integers beyond 64 bits that orjson rejects or turns into floats
+_LONG_DIGITS = re.compile(rb'\d{19}')
+
+def loads(data):
+    """
+    Decodes a JSON document, with orjson when it is installed.
+
+    orjson rejects or changes a few documents the standard library decodes (integers beyond 64 bits, NaN and
+    Infinity), so documents with very long digit runs, and documents orjson rejects, are decoded with the
+    json module instead. The result is always what `json.loads` returns.
+
+    Args:
+        data (bytes): The JSON document.
+
+    Returns:
+        The decoded value.
+
+    Raises:
+        ValueError: If the data is not valid JSON.
+    """
+    if orjson is not None and not _LONG_DIGITS.search(data):
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            pass
+    return json.loads(data)
+
+# Source of the type check of each supported field class, given the expression of the field's value
+_FIELD_CHECKS = {
+    fields.String: "type({value}) is str",
+    fields.Dict: "type({value}) is dict",
+}
+
+def _field_check(field, value):
+    """
+    Returns the source of an exact type check for a field, or None if the field cannot be checked that way.
+    """
+    if field.validators or field.data_key is not None or field.attribute is not None:
+        return None
+    if type(field) is fields.List:
+        inner = _field_check(field.inner, '_item')
+        if inner != "type(_item) is dict":
+            return None
+        return f"type({value}) is list and _types(map(type, {value})) <= _dict_only"
+    if type(field) is fields.Dict and (field.key_field is not None or field.value_field is not None):
+        return None
+    template = _FIELD_CHECKS.get(type(field))
+    return template.format(value=value) if template is not None else None
+
+# Compiles a marshmallow schema into a function that accepts valid payloads without running marshmallow
+def compile_validator(schema):
+    """
+    Returns a function that loads a decoded JSON payload like `schema.load`, but much faster for valid payloads.
+
+    The schema's fields are translated into a single generated expression that checks the payload has exactly
+    the required fields, each with the exact type the field accepts. A payload that passes is returned as is
+    (marshmallow would return an equal copy); any other payload is handed to `schema.load`, so invalid
+    payloads get the same ValidationError and messages as before. Schemas with optional fields, processing
+    hooks, validators or field types other than strings, dictionaries and lists of dictionaries are not
+    compiled, and the function is `schema.load` itself.
+
+    Example:
+    Input: EvaluationSchema()
+    Output: def validate(payload): return payload if (type(payload) is dict and payload.keys() == _names and
+            type(payload['rule_string']) is str and type(payload['data']) is dict) else _load(payload)
+
+    Args:
+        schema (Schema): The marshmallow schema instance, reused for every payload.
+
+    Returns:
+        Callable[[object], Dict]: The validator.
+
+    Raises:
+        ValidationError: (From the validator) if the payload is invalid.
+    """
+    if any(getattr(schema, '_hooks', {}).values()):
+        return schema.load
+    checks = []
+    for name, field in schema.fields.items():
+        check = _field_check(field, f"payload[{name!r}]") if field.required and not field.dump_only else None
+        if check is None:
+            return schema.load
+        checks.append(f"({check})")
+
+    namespace = {'_names': set(schema.fields), '_load': schema.load, '_types': set, '_dict_only': {dict}}
+    source = (
+        "def validate(payload):\n"
+        "    if type(payload) is dict and payload.keys() == _names"
+        + "".join(f" and {check}" for check in checks) + ":\n"
+        "        return payload\n"
+        "    return _load(payload)\n"
+    )
+    exec(compile(source, '<validator>', 'exec'), namespace)
+    return namespace['validate']
@@ -0,0 +1,69 @@
+"""
+Measures requests/sec of the hot JSON endpoints through the Flask test client, with the fast request path
+(RULE_FAST_PATH: reused, compiled validators and orjson decoding) off and on.
+
+Every request carries the same small payload, so the rule is parsed once and the numbers show the per-request
+overhead of decoding and validating the body rather than the rule evaluation itself.
+
+Usage:
+    python -m benchmarks.bench_api [--requests 5000] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault('RULE_ENGINE_DATABASE_URL', 'sqlite://')  # Never touch the project database
+
+from app import create_app, validation
+
+RULE_STRING = "(age > 30 AND department = 'Sales') OR (salary >= 50000 AND experience > 5)"
+RECORD = {"age": 35, "department": "Sales", "salary": 60000, "experience": 7}
+
+def build_requests(client):
+    """
+    Returns the benchmarked endpoints as (name, path, JSON body) triples, storing the rule the
+    stored-rule endpoint evaluates.
+    """
+    rule_id = client.post('/create_rule', json={'rule_string': RULE_STRING}).json['id']
+    return [
+        ('evaluate_rule', '/evaluate_rule', json.dumps({'rule_string': RULE_STRING, 'data': RECORD})),
+        ('evaluate_stored_rule', f'/evaluate_rule/{rule_id}', json.dumps({'data': RECORD})),
+        ('evaluate_batch', '/evaluate_batch', json.dumps({'rule_string': RULE_STRING, 'records': [RECORD] * 10})),
+    ]
+
+def requests_per_second(client, path, body, count):
+    """
+    Returns the requests/sec of `count` identical POST requests.
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.post(path, data=body, content_type='application/json')
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.json
+    return count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per measurement')
+    parser.add_argument('--repeat', type=int, default=3, help='Measurements per endpoint (the best is kept)')
+    args = parser.parse_args()
+
+    print(f"JSON decoder on the fast path: {'orjson' if validation.orjson is not None else 'json'}")
+    print(f"{'endpoint':<22} {'fast path off':>14} {'fast path on':>14} {'speedup':>8}")
+    clients = {fast: create_app({'RULE_FAST_PATH': fast}).test_client() for fast in (False, True)}
+    requests = {fast: build_requests(client) for fast, client in clients.items()}
+    for index, (name, _, _) in enumerate(requests[True]):
+        for fast, client in clients.items():  # Warm up caches and compiled rules
+            _, path, body = requests[fast][index]
+            requests_per_second(client, path, body, 100)
+        rates = {False: 0.0, True: 0.0}
+        for _ in range(args.repeat):  # Alternate the two paths so machine noise affects both alike
+            for fast, client in clients.items():
+                _, path, body = requests[fast][index]
+                rates[fast] = max(rates[fast], requests_per_second(client, path, body, args.requests))
+        print(f"{name:<22} {rates[False]:>10,.0f} r/s {rates[True]:>10,.0f} r/s {rates[True] / rates[False]:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
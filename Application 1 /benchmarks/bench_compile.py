@@ -0,0 +1,64 @@
+"""
+Compares the tree-walking evaluator (evaluate_node) with compiled rules (compile_rule) on deep rules.
+
+Usage:
+    python -m benchmarks.bench_compile [--depth 10] [--number 2000]
+"""
+
+import argparse
+import random
+import timeit
+from app.rules import create_rule, compile_rule, evaluate_node
+
+def build_rule_string(depth, rng):
+    """
+    Builds a random, fully parenthesized rule string that is `depth` operator levels deep.
+
+    Args:
+        depth (int): The number of AND/OR levels.
+        rng (random.Random): The random number generator.
+
+    Returns:
+        str: The rule string.
+    """
+    if depth == 0:
+        attribute = f"attr{rng.randrange(8)}"
+        return f"{attribute} {rng.choice(['>', '<', '>=', '<=', '='])} {rng.randrange(100)}"
+    operator = rng.choice(['AND', 'OR'])
+    return f"({build_rule_string(depth - 1, rng)} {operator} {build_rule_string(depth - 1, rng)})"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, default=10, help='Number of AND/OR levels in each rule')
+    parser.add_argument('--number', type=int, default=2000, help='Evaluations per measurement')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ast = create_rule(build_rule_string(args.depth, rng))
+    records = [{f"attr{i}": rng.randrange(100) for i in range(8)} for _ in range(64)]
+    evaluator = compile_rule(ast)
+
+    # Both evaluators must agree before timing them
+    for record in records:
+        assert evaluate_node(ast, record) == evaluator(record)
+
+    def run_tree_walker():
+        for record in records:
+            evaluate_node(ast, record)
+
+    def run_compiled():
+        for record in records:
+            evaluator(record)
+
+    evaluations = args.number * len(records)
+    tree_walker = min(timeit.repeat(run_tree_walker, number=args.number, repeat=3)) / evaluations
+    compiled = min(timeit.repeat(run_compiled, number=args.number, repeat=3)) / evaluations
+
+    print(f"depth={args.depth}")
+    print(f"evaluate_node: {tree_walker * 1e6:8.2f} us/eval")
+    print(f"compile_rule:  {compiled * 1e6:8.2f} us/eval")
+    print(f"speedup:       {tree_walker / compiled:8.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures how tokenizing and parsing scale with rule length, from 10 to 100k terms.
+
+Per-term times should stay flat as rules grow (linear scaling). The nested variant wraps every term in
+another level of parentheses, which the iterative parser handles without hitting the recursion limit.
+
+Usage:
+    python -m benchmarks.bench_parser [--max-terms 100000] [--nested]
+"""
+
+import argparse
+import random
+import time
+from app.rules import create_rule, tokenize
+
+def build_rule_string(terms, rng, nested=False):
+    """
+    Builds a rule string with the given number of attribute-operator-value terms.
+
+    Args:
+        terms (int): The number of terms.
+        rng (random.Random): The random number generator.
+        nested (bool): Whether every term opens another level of parentheses.
+
+    Returns:
+        str: The rule string.
+    """
+    parts = []
+    for index in range(terms):
+        term = f"attr{rng.randrange(20)} {rng.choice(['>', '<', '>=', '<=', '='])} {rng.randrange(1000)}"
+        if index:
+            parts.append(rng.choice(['AND', 'OR']))
+        if nested:
+            parts.append('(' + term)
+        elif index % 4 == 0 and index + 1 < terms:
+            parts.append('(' + term)  # Group pairs of terms, e.g. (a > 1 OR b < 2)
+        elif index % 4 == 1:
+            parts.append(term + ')')
+        else:
+            parts.append(term)
+    rule_string = ' '.join(parts)
+    if nested:
+        rule_string += ')' * terms
+    return rule_string
+
+def best_of(function, argument, repeat):
+    """
+    Returns the best wall-clock time of several calls.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-terms', type=int, default=100000, help='Largest rule size to measure')
+    parser.add_argument('--nested', action='store_true', help='Nest every term in its own parentheses')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'terms':>8} {'chars':>10} {'tokenize ms':>12} {'create_rule ms':>15} {'us/term':>8}")
+    terms = 10
+    while terms <= args.max_terms:
+        rule_string = build_rule_string(terms, rng, nested=args.nested)
+        repeat = 5 if terms <= 10000 else 2
+        tokenize_time = best_of(tokenize, rule_string, repeat)
+        create_time = best_of(create_rule, rule_string, repeat)
+        print(f"{terms:>8} {len(rule_string):>10} {tokenize_time * 1e3:>12.2f} {create_time * 1e3:>15.2f} {create_time / terms * 1e6:>8.2f}")
+        terms *= 10
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark suite for every stage of the rule engine, with JSON baselines for regression checks.
+
+For each rule size (depth x width) a seeded generator builds rules and matching records, and every stage is
+timed until it has run for at least --min-time seconds (best of --repeat runs). Memory is the peak traced
+allocation of one run of the stage. Rule stages count one op per rule; evaluation stages one op per record.
+
+Stages: tokenize, parse_expression, create_rule, evaluate_node, evaluate_rule (compiled), evaluate_rule_batch,
+serialize_ast, deserialize_ast, pack_ast, unpack_ast and the /evaluate_rule endpoint (Flask test client).
+
+Usage:
+    python -m benchmarks.bench_suite [--depths 2 4 6] [--width 2] [--attributes 10] [--seed 42]
+    python -m benchmarks.bench_suite --save benchmarks/baseline.json
+    python -m benchmarks.bench_suite --compare benchmarks/baseline.json [--tolerance 0.2]
+
+With --compare, the exit status is 1 if any stage is slower than the baseline by more than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('RULE_ENGINE_DATABASE_URL', 'sqlite://')  # Never touch the project database
+
+from app.rules import (create_rule, evaluate_node, evaluate_rule, evaluate_rule_batch, parse_expression,
+                       tokenize, serialize_ast, deserialize_ast, pack_ast, unpack_ast)
+from benchmarks.generator import RuleGenerator
+
+RULES_PER_SIZE = 20
+RECORDS_PER_SIZE = 200
+
+def build_stages(rule_strings, records):
+    """
+    Returns the benchmarked stages as (name, function, ops per call) triples.
+    """
+    asts = [create_rule(rule_string) for rule_string in rule_strings]
+    token_lists = [tokenize(rule_string) for rule_string in rule_strings]
+    serialized = [serialize_ast(ast) for ast in asts]
+    packed = [pack_ast(ast) for ast in asts]
+    ast = asts[0]
+
+    from app import create_app  # Imported here so the other stages can run without Flask
+    client = create_app({'RULE_CACHE_SIZE': 1024}).test_client()
+    payloads = [json.dumps({'rule_string': rule_strings[0], 'data': record}) for record in records[:20]]
+
+    def endpoint():
+        for payload in payloads:
+            client.post('/evaluate_rule', data=payload, content_type='application/json')
+
+    return [
+        ('tokenize', lambda: [tokenize(rule_string) for rule_string in rule_strings], len(rule_strings)),
+        ('parse_expression', lambda: [parse_expression(tokens) for tokens in token_lists], len(rule_strings)),
+        ('create_rule', lambda: [create_rule(rule_string) for rule_string in rule_strings], len(rule_strings)),
+        ('evaluate_node', lambda: [evaluate_node(ast, record) for record in records], len(records)),
+        ('evaluate_rule', lambda: [evaluate_rule(ast, record) for record in records], len(records)),
+        ('evaluate_rule_batch', lambda: evaluate_rule_batch(ast, records), len(records)),
+        ('serialize_ast', lambda: [serialize_ast(ast) for ast in asts], len(asts)),
+        ('deserialize_ast', lambda: [deserialize_ast(data) for data in serialized], len(asts)),
+        ('pack_ast', lambda: [pack_ast(ast) for ast in asts], len(asts)),
+        ('unpack_ast', lambda: [unpack_ast(data) for data in packed], len(asts)),
+        ('evaluate_rule_api', endpoint, len(payloads)),
+    ]
+
+def measure(function, ops, min_time, repeat):
+    """
+    Returns the best ops/sec over several runs and the peak memory of one call, in bytes.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        calls, start = 0, time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, calls * ops / elapsed)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def run(depths, width, attributes, seed, min_time, repeat):
+    """
+    Runs every stage for every rule depth and returns the results keyed by "depth<d>xwidth<w>/<stage>".
+    """
+    results = {}
+    for depth in depths:
+        generator = RuleGenerator(seed=seed, depth=depth, width=width, attributes=attributes)
+        rule_strings = generator.rule_strings(RULES_PER_SIZE)
+        records = generator.records(RECORDS_PER_SIZE)
+        for stage, function, ops in build_stages(rule_strings, records):
+            ops_per_sec, peak = measure(function, ops, min_time, repeat)
+            key = f"depth{depth}xwidth{width}/{stage}"
+            results[key] = {'ops_per_sec': round(ops_per_sec, 1), 'peak_memory_bytes': peak}
+            print(f"{key:<45} {ops_per_sec:>14,.0f} ops/s {peak / 1024:>10,.1f} KiB")
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the change of every stage against a baseline and returns the keys of the regressed stages.
+    """
+    regressions = []
+    print(f"\n{'stage':<45} {'baseline':>14} {'current':>14} {'change':>8}")
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        change = current['ops_per_sec'] / previous['ops_per_sec'] - 1
+        flag = ''
+        if change < -tolerance:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f"{key:<45} {previous['ops_per_sec']:>14,.0f} {current['ops_per_sec']:>14,.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depths', type=int, nargs='+', default=[2, 4, 6], help='Rule depths to measure')
+    parser.add_argument('--width', type=int, default=2, help='Children per AND/OR group')
+    parser.add_argument('--attributes', type=int, default=10, help='Number of distinct attributes')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per measurement')
+    parser.add_argument('--repeat', type=int, default=3, help='Measurements per stage (the best is kept)')
+    parser.add_argument('--save', metavar='PATH', help='Save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare the results with a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a stage regresses')
+    args = parser.parse_args()
+
+    results = run(args.depths, args.width, args.attributes, args.seed, args.min_time, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({
+                'settings': {'depths': args.depths, 'width': args.width, 'attributes': args.attributes, 'seed': args.seed},
+                'environment': {'python': platform.python_version(), 'machine': platform.machine()},
+                'results': results
+            }, baseline_file, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+if __name__ == '__main__':
+    main()
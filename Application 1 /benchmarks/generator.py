@@ -0,0 +1,86 @@
+"""
+Seeded generator of random rules and matching records for benchmarks and tests.
+
+Every attribute has a fixed type and value domain shared by rules and records, so generated records carry
+every attribute a generated rule reads, with values its conditions can compare against.
+"""
+
+import random
+
+OPERATORS = ['>', '<', '>=', '<=', '=']
+DEPARTMENTS = ['Sales', 'Marketing', 'Engineering', 'Finance', 'Support', 'HR', 'Legal', 'Operations']
+
+class RuleGenerator:
+    """
+    Generates random rule strings and records from a seed.
+
+    Attributes:
+        attributes (List[str]): The attribute names rules are built from.
+        depth (int): The number of nested AND/OR levels in a rule (0 for a single condition).
+        width (int): The number of children of each AND/OR group.
+    """
+
+    def __init__(self, seed=0, depth=3, width=2, attributes=10):
+        """
+        Initializes a generator.
+
+        Args:
+            seed (int): The random seed; the same seed and settings generate the same rules and records.
+            depth (int): The number of nested AND/OR levels in a rule.
+            width (int): The number of children of each AND/OR group.
+            attributes (int): The number of distinct attributes; every fourth one holds strings, the rest numbers.
+        """
+        if depth < 0 or width < 1 or attributes < 1:
+            raise ValueError("depth must be non-negative, width and attributes positive")
+        self.rng = random.Random(seed)
+        self.depth = depth
+        self.width = width
+        self.attributes = [f"attr{index}" for index in range(attributes)]
+        self._strings = {attribute for index, attribute in enumerate(self.attributes) if index % 4 == 3}
+
+    def condition(self):
+        """
+        Returns one random "attribute operator value" condition.
+        """
+        attribute = self.rng.choice(self.attributes)
+        if attribute in self._strings:
+            return f"{attribute} = '{self.rng.choice(DEPARTMENTS)}'"
+        return f"{attribute} {self.rng.choice(OPERATORS)} {self.rng.randrange(100)}"
+
+    def rule_string(self, depth=None):
+        """
+        Returns a random rule string with `width ** depth` conditions.
+
+        Args:
+            depth (int, optional): Overrides the generator's depth.
+
+        Returns:
+            str: The rule string, e.g. "(attr1 > 40 AND attr3 = 'Sales')".
+        """
+        depth = self.depth if depth is None else depth
+        if depth == 0:
+            return self.condition()
+        operator_word = self.rng.choice(['AND', 'OR'])
+        children = [self.rule_string(depth - 1) for _ in range(self.width)]
+        return "(" + f" {operator_word} ".join(children) + ")" if len(children) > 1 else children[0]
+
+    def rule_strings(self, count):
+        """
+        Returns a list of random rule strings.
+        """
+        return [self.rule_string() for _ in range(count)]
+
+    def record(self):
+        """
+        Returns a random record with a value for every attribute.
+        """
+        return {
+            attribute: self.rng.choice(DEPARTMENTS) if attribute in self._strings else self.rng.randrange(100)
+            for attribute in self.attributes
+        }
+
+    def records(self, count):
+        """
+        Returns a list of random records.
+        """
+        return [self.record() for _ in range(count)]
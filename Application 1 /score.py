@@ -0,0 +1,43 @@
+"""
+Scores every stored rule against a CSV or Parquet file without going through HTTP.
+
+The file is read in chunks of columns, every rule is evaluated over each chunk as vectorized masks on a pool of
+worker processes, and the results are written as a packed bit matrix (one row per data row, one bit per rule)
+in .npy format, with a JSON summary of rule ids, match and error counts next to it.
+
+Usage:
+    python score.py data.csv --output scores.npy [--chunk-size 100000] [--workers 4] [--database URL]
+
+Load the results with:
+    from app.scoring import load_scores
+    matrix, rule_ids = load_scores('scores.npy')
+"""
+
+import argparse
+import time
+from app import database
+from app.scoring import score_file, DEFAULT_CHUNK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='CSV or Parquet file to score')
+    parser.add_argument('--output', default='scores.npy', help='Path of the result matrix')
+    parser.add_argument('--format', choices=['csv', 'parquet'], help='File format (default: from the extension)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows read and scored at a time')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPUs; 0 scores in this process)')
+    parser.add_argument('--database', help='Database URL of the stored rules (default: RULE_ENGINE_DATABASE_URL)')
+    args = parser.parse_args()
+
+    if args.database:
+        database.configure_database(args.database)
+    start = time.perf_counter()
+    summary = score_file(args.path, args.output, chunk_size=args.chunk_size, workers=args.workers,
+                         file_format=args.format)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {summary['rows']:,} rows against {len(summary['rule_ids'])} rules in {elapsed:.1f}s "
+          f"({summary['rows'] / max(elapsed, 1e-9):,.0f} rows/s), written to {args.output}")
+    for rule_id, message in summary['skipped'].items():
+        print(f"Skipped rule {rule_id}: {message}")
+
+if __name__ == '__main__':
+    main()
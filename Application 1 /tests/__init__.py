@@ -1,2 +1,4 @@
-# Initialize 
-# (intentionally left blank)
\ No newline at end of file
+import os
+
+# Run the tests against an in-memory database instead of the rule_engine.db file
+os.environ.setdefault('RULE_ENGINE_DATABASE_URL', 'sqlite://')
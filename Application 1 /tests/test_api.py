@@ -1,6 +1,8 @@
 import unittest
 import json
-from app import create_app
+import os
+import tempfile
+from app import create_app, database
 from app.rules import RuleEngineError
 
 class TestAPI(unittest.TestCase):
@@ -16,6 +18,12 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.json['status'], 'success')
         self.assertIn('message', response.json)
 
+    def test_create_rule_api_returns_id(self):
+        first = self.client.post('/create_rule', data=json.dumps({'rule_string': "age > 30"}), content_type='application/json')
+        second = self.client.post('/create_rule', data=json.dumps({'rule_string': "age < 20"}), content_type='application/json')
+        self.assertIsInstance(first.json['id'], int)
+        self.assertNotEqual(first.json['id'], second.json['id'])
+
     def test_create_rule_api_failure(self):
         rule_string = "invalid rule"
         response = self.client.post('/create_rule', data=json.dumps({'rule_string': rule_string}), content_type='application/json')
@@ -47,6 +55,141 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.json['status'], 'error')
         self.assertIn('message', response.json)
 
+    def test_evaluate_rule_api_uses_rule_cache(self):
+        rule_string = "age > 30 AND department = 'Sales'"
+        data = {"age": 35, "department": "Sales"}
+        for _ in range(3):
+            response = self.client.post('/evaluate_rule', data=json.dumps({'rule_string': rule_string, 'data': data}), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        stats = self.app.extensions['rule_cache'].stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 2)
+
+    def test_evaluate_stored_rule_api(self):
+        rule_string = "age > 30 AND department = 'Sales'"
+        response = self.client.post('/create_rule', data=json.dumps({'rule_string': rule_string}), content_type='application/json')
+        rule_id = response.json['id']
+        response = self.client.post(f'/evaluate_rule/{rule_id}', data=json.dumps({'data': {"age": 35, "department": "Sales"}}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['result'])
+        response = self.client.post(f'/evaluate_rule/{rule_id}', data=json.dumps({'data': {"age": 35}}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_evaluate_stored_rule_api_not_found(self):
+        response = self.client.post('/evaluate_rule/999999', data=json.dumps({'data': {"age": 35}}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['status'], 'error')
+
+    def test_evaluate_batch_api(self):
+        rule_string = "age > 30 AND department = 'Sales'"
+        records = [{"age": 35, "department": "Sales"}, {"age": 25, "department": "Sales"}, {"age": 35}]
+        response = self.client.post('/evaluate_batch', data=json.dumps({'rule_string': rule_string, 'records': records}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'success')
+        self.assertEqual(response.json['results'], [True, False, None])
+        self.assertEqual(response.json['errors'], [{'index': 2, 'message': "Attribute 'department' not found in data"}])
+
+    def test_evaluate_batch_api_thread_executor(self):
+        app = create_app({'RULE_EXECUTOR': 'thread', 'RULE_EXECUTOR_CHUNK_SIZE': 2})
+        records = [{"age": 35}, {"age": 25}, {}, {"age": 40}, {"age": 31}]
+        response = app.test_client().post('/evaluate_batch', data=json.dumps({'rule_string': "age > 30", 'records': records}), content_type='application/json')
+        self.assertEqual(response.json['results'], [True, False, None, True, True])
+        self.assertEqual(response.json['errors'], [{'index': 2, 'message': "Attribute 'age' not found in data"}])
+        app.extensions['rule_executor'].shutdown()
+
+    def test_evaluate_batch_api_invalid_payload(self):
+        response = self.client.post('/evaluate_batch', data=json.dumps({'rule_string': "age > 30", 'records': {"age": 35}}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['status'], 'error')
+
+    def test_evaluate_stream(self):
+        body = b'{"age": 35}\n{"age": 20}\n\n{"salary": 1}\nnot json\n[1]\n{"age": 31}'
+        response = self.client.post('/evaluate_stream?rule_string=age > 30', data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(lines, [
+            True, False, {"error": "Attribute 'age' not found in data"}, {"error": "Invalid JSON"},
+            {"error": "Invalid data format"}, True
+        ])
+
+    def test_evaluate_stream_by_rule_id_and_limits(self):
+        app = create_app({'RULE_STREAM_CHUNK_SIZE': 2, 'RULE_STREAM_MAX_RECORD_BYTES': 32})
+        client = app.test_client()
+        rule_id = client.post('/create_rule', data=json.dumps({'rule_string': "age > 30"}), content_type='application/json').json['id']
+        body = b'{"age": 35}\n{"age": "' + b'9' * 100 + b'"}\n{"age": 20}\n'
+        response = client.post(f'/evaluate_stream?rule_id={rule_id}', data=body)
+        self.assertEqual(response.data.decode().splitlines(), ['true', '{"error": "Record longer than 32 bytes"}', 'false'])
+        response = client.post('/evaluate_stream', data=body)
+        self.assertEqual(response.status_code, 400)
+
+    def test_rule_stats(self):
+        response = self.client.get('/rule_stats')
+        self.assertEqual(response.json, {'status': 'success', 'enabled': False, 'predicates': []})
+
+        app = create_app({'RULE_ADAPTIVE_ORDERING': True, 'RULE_STATS_SAMPLE_INTERVAL': 1})
+        client = app.test_client()
+        payload = {'rule_string': "age > 30 AND department = 'Sales'", 'data': {'age': 35, 'department': 'HR'}}
+        response = client.post('/evaluate_rule', data=json.dumps(payload), content_type='application/json')
+        self.assertFalse(response.json['result'])
+        response = client.get('/rule_stats')
+        self.assertTrue(response.json['enabled'])
+        rates = {entry['attribute']: entry['true_rate'] for entry in response.json['predicates']}
+        self.assertEqual(rates, {'age': 1.0, 'department': 0.0})
+
+    def test_result_cache(self):
+        response = self.client.get('/cache_stats')
+        self.assertIsNone(response.json['result_cache'])
+
+        app = create_app({'RULE_RESULT_CACHE_SIZE': 16})
+        client = app.test_client()
+        rule_string = "age > 30 AND department = 'Sales'"
+        rule_id = client.post('/create_rule', data=json.dumps({'rule_string': rule_string}), content_type='application/json').json['id']
+        for name in ('Alice', 'Bob'):
+            data = {'age': 35, 'department': 'Sales', 'name': name}
+            response = client.post('/evaluate_rule', data=json.dumps({'rule_string': rule_string, 'data': data}), content_type='application/json')
+            self.assertTrue(response.json['result'])
+            response = client.post(f'/evaluate_rule/{rule_id}', data=json.dumps({'data': data}), content_type='application/json')
+            self.assertTrue(response.json['result'])
+        stats = client.get('/cache_stats').json['result_cache']
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (2, 2, 0.5))
+
+    def test_modify_rule_api(self):
+        app = create_app({'RULE_RESULT_CACHE_SIZE': 16})
+        client = app.test_client()
+        created = client.post('/create_rule', data=json.dumps({'rule_string': "age > 30 AND department = 'Sales' AND age > 20"}), content_type='application/json').json
+        rule_id = created['id']
+        # Paths refer to the stored (optimized) tree, which is returned on creation and by GET /rule/<id>
+        self.assertEqual(created['ast']['left']['value'], ['age', '>', 30])
+        stored = client.get(f'/rule/{rule_id}').json
+        self.assertEqual((stored['rule_string'], stored['ast']), ("age > 30 AND department = 'Sales'", created['ast']))
+        self.assertEqual(client.get(f'/rule/{rule_id + 1000}').status_code, 404)
+        record = json.dumps({'data': {'age': 35, 'department': 'Sales'}})
+        self.assertTrue(client.post(f'/evaluate_rule/{rule_id}', data=record, content_type='application/json').json['result'])
+
+        response = client.post(f'/modify_rule/{rule_id}', data=json.dumps({'action': 'update', 'path': 'L', 'value': 40}), content_type='application/json')
+        self.assertEqual(response.json['rule_string'], "age > 40 AND department = 'Sales'")
+        self.assertEqual(response.json['ast']['left']['value'], ['age', '>', 40])
+        self.assertEqual(client.get(f'/rule/{rule_id}').json['ast'], response.json['ast'])
+        self.assertEqual(len(app.extensions['result_cache']), 0)  # The rule's cached results are invalidated
+        self.assertFalse(client.post(f'/evaluate_rule/{rule_id}', data=record, content_type='application/json').json['result'])
+        self.assertEqual(database.load_rules()[-1][0], "age > 40 AND department = 'Sales'")
+
+        response = client.post(f'/modify_rule/{rule_id}', data=json.dumps({'action': 'remove', 'path': ''}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(f'/modify_rule/{rule_id}', data=json.dumps({'action': 'move'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(f'/modify_rule/{rule_id + 1000}', data=json.dumps({'action': 'remove', 'path': 'L'}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_rule_snapshot_is_opt_in(self):
+        self.assertIsNone(self.app.extensions['rule_registry'].snapshot_path)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rules.snapshot')
+            app = create_app({'RULE_SNAPSHOT_PATH': path})
+            self.assertEqual(app.extensions['rule_registry'].snapshot_path, path)
+            self.assertTrue(os.path.exists(path))
+
     def test_not_found(self):
         response = self.client.get('/non_existent_route')
         self.assertEqual(response.status_code, 404)
@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+from app.cache import LRUCache, RuleCache, ResultCache, normalize_rule_string
+from app.rules import create_rule, evaluate_rule, referenced_attributes, RuleEngineError
+
+class TestCache(unittest.TestCase):
+    def test_normalize_rule_string(self):
+        self.assertEqual(normalize_rule_string("  age >  30\tAND  x = 1 "), "age > 30 AND x = 1")
+        self.assertEqual(normalize_rule_string('city = "New  York"'), 'city = "New  York"')
+
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')  # 'a' becomes the most recently used entry
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_rule_cache_hits_and_misses(self):
+        cache = RuleCache(maxsize=8)
+        first = cache.get_or_create("age > 30 AND department = 'Sales'", create_rule)
+        second = cache.get_or_create("age >   30 AND department = 'Sales'", create_rule)
+        self.assertIs(first, second)
+        self.assertEqual(cache.stats(), {'size': 1, 'maxsize': 8, 'hits': 1, 'misses': 1})
+
+    def test_rule_cache_does_not_store_errors(self):
+        cache = RuleCache(maxsize=8)
+        with self.assertRaises(RuleEngineError):
+            cache.get_or_create("invalid rule", create_rule)
+        self.assertEqual(len(cache), 0)
+        # Error positions refer to the rule string as given, not to its normalized text
+        with self.assertRaisesRegex(RuleEngineError, "position 27"):
+            cache.get_or_create("age   >   30 AND   (dept = ", create_rule)
+
+    def test_referenced_attributes_computed_once(self):
+        ast = create_rule("(age > 30 AND department = 'Sales') OR salary > 50000")
+        attributes = referenced_attributes(ast)
+        self.assertEqual(attributes, frozenset({'age', 'department', 'salary'}))
+        self.assertIs(referenced_attributes(ast), attributes)
+
+    def test_result_cache_keys_on_read_attributes(self):
+        cache = ResultCache(maxsize=8)
+        ast = create_rule("age > 30 AND department = 'Sales'")
+        self.assertTrue(evaluate_rule(ast, {'age': 35, 'department': 'Sales', 'id': 1}, cache=cache))
+        self.assertTrue(evaluate_rule(ast, {'age': 35, 'department': 'Sales', 'id': 2}, cache=cache))
+        self.assertFalse(evaluate_rule(ast, {'age': 35.0, 'department': 'HR'}, cache=cache))
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses'], stats['hit_rate']), (2, 1, 2, 1 / 3))
+
+        # Missing attributes and unhashable values skip the cache, and errors are not cached
+        with self.assertRaises(RuleEngineError):
+            evaluate_rule(ast, {'age': 35}, cache=cache)
+        self.assertFalse(evaluate_rule(ast, {'age': 35, 'department': ['Sales']}, cache=cache))
+        self.assertEqual((cache.stats()['bypassed'], len(cache)), (2, 2))
+
+    def test_result_cache_ttl(self):
+        cache = ResultCache(maxsize=8, ttl=10)
+        with mock.patch('app.cache.time.monotonic', return_value=100.0):
+            cache.put('key', True)
+            self.assertTrue(cache.get('key'))
+        with mock.patch('app.cache.time.monotonic', return_value=110.0):
+            self.assertIsNone(cache.get('key'))
+        self.assertEqual((cache.stats()['expirations'], len(cache)), (1, 0))
+        with self.assertRaises(ValueError):
+            ResultCache(ttl=0)
+
+if __name__ == '__main__':
+    unittest.main()
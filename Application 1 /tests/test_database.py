@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from app import database
+from app.rules import create_rule, evaluate_rule
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        database.configure_database('sqlite://')
+
+    def test_duplicate_rules_are_not_stored_twice(self):
+        first = database.save_rule("age > 30 AND department = 'Sales'", create_rule("age > 30 AND department = 'Sales'"))
+        second = database.save_rule("age  >  30 AND department = 'Sales'", create_rule("age > 30 AND department = 'Sales'"))
+        self.assertEqual(first, second)
+        self.assertEqual(len(database.load_rules()), 1)
+        self.assertNotEqual(database.save_rule("department = 'Sales  '", create_rule("department = 'Sales  '")),
+                            database.save_rule("department = 'Sales'", create_rule("department = 'Sales'")))
+
+    def test_save_rules_in_bulk(self):
+        existing = database.save_rule("age > 3", create_rule("age > 3"))
+        rule_strings = [f"age > {i}" for i in range(1200)] + ["age > 7"]
+        ids = database.save_rules((rule_string, create_rule(rule_string)) for rule_string in rule_strings)
+        self.assertEqual(len(ids), 1201)
+        self.assertEqual(ids[3], existing)
+        self.assertEqual(ids[7], ids[-1])
+        self.assertEqual(len(set(ids)), 1200)
+        versions = [version for _, version, _, _ in database.load_rules_since(-1)]
+        self.assertEqual(len(set(versions)), 1200)
+
+    def test_iter_rules_streams_in_chunks(self):
+        ids = database.save_rules((f"age > {i}", create_rule(f"age > {i}")) for i in range(25))
+        rules = list(database.iter_rules(with_ids=True, chunk_size=10))
+        self.assertEqual([rule_id for rule_id, _, _ in rules], ids)
+        self.assertTrue(evaluate_rule(rules[5][2], {"age": 6}))
+        self.assertEqual([rule_string for rule_string, _ in database.load_rules()], [f"age > {i}" for i in range(25)])
+
+    def test_iter_rules_since_streams_in_version_order(self):
+        ids = database.save_rules((f"age > {i}", create_rule(f"age > {i}")) for i in range(25))
+        database.update_rule(ids[3], "age > 100", create_rule("age > 100"))
+        rules = list(database.iter_rules_since(-1, chunk_size=10))
+        self.assertEqual([rule_id for rule_id, _, _, _ in rules], ids[:3] + ids[4:] + [ids[3]])
+        self.assertEqual([rule[:3] for rule in rules], [rule[:3] for rule in database.load_rules_since(-1)])
+        self.assertEqual([rule[0] for rule in database.iter_rules_since(rules[20][1], chunk_size=2)],
+                         [rule[0] for rule in rules[21:]])
+
+    def test_old_sqlite_is_rejected(self):
+        with mock.patch('app.database.sqlite3.sqlite_version_info', (3, 31, 1)):
+            with self.assertRaisesRegex(RuntimeError, "SQLite 3.35.0 or newer"):
+                database._create_engine('sqlite://')
+
+    def test_database_is_initialized_on_first_use(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'rules.db')
+        script = ("import os, app.database as database; assert not os.path.exists(%r); "
+                  "database.load_rules(); assert os.path.exists(%r)" % (path, path))
+        try:
+            subprocess.run([sys.executable, '-c', script], check=True, cwd=os.path.dirname(os.path.dirname(__file__)),
+                           env={**os.environ, 'RULE_ENGINE_DATABASE_URL': f'sqlite:///{path}'})
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def test_concurrent_writers_get_distinct_versions(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'rules.db')
+        script = ("import sys, app.database as database; from app.rules import create_rule\n"
+                  "for i in range(40):\n"
+                  "    rule = f'age > {sys.argv[1]}{i:03}'\n"
+                  "    database.save_rule(rule, create_rule(rule))\n"
+                  "    if i % 10 == 0: database.update_rule(1, 'age > 1', create_rule('age > 1'))\n")
+        try:
+            database.configure_database(f'sqlite:///{path}')
+            database.save_rule("age > 1", create_rule("age > 1"))
+            workers = [subprocess.Popen([sys.executable, '-c', script, str(worker)],
+                                        cwd=os.path.dirname(os.path.dirname(__file__)),
+                                        env={**os.environ, 'RULE_ENGINE_DATABASE_URL': f'sqlite:///{path}'})
+                       for worker in range(1, 5)]
+            self.assertEqual([worker.wait() for worker in workers], [0] * 4)
+            versions = [version for _, version, _, _ in database.load_rules_since(-1)]
+            self.assertEqual(len(versions), 161)
+            self.assertEqual(len(set(versions)), 161)
+            self.assertEqual(database.current_version(), max(versions))
+        finally:
+            database.configure_database('sqlite://')
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def test_existing_database_is_migrated(self):
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        try:
+            connection = sqlite3.connect(path)
+            connection.execute("CREATE TABLE rules (id INTEGER PRIMARY KEY, rule_string VARCHAR NOT NULL, ast BLOB NOT NULL)")
+            connection.executemany("INSERT INTO rules (rule_string, ast) VALUES (?, ?)",
+                                   [("age > 30", b"{}"), ("age  > 30", b"{}"), ("age > 40", b"{}")])
+            connection.commit()
+            connection.close()
+
+            database.configure_database(f'sqlite:///{path}')
+            self.assertEqual(database.save_rule("age > 30", create_rule("age > 30")), 1)
+            self.assertEqual(database.save_rule("age > 40", create_rule("age > 40")), 3)
+            versions = [version for _, version, _, _ in database.load_rules_since(-1)]
+            self.assertEqual(len(set(versions)), 3)  # The rows added before versions existed are renumbered
+            new_version = database.update_rule(2, "age > 50", create_rule("age > 50"))
+            self.assertGreater(new_version, max(versions))
+            connection = sqlite3.connect(path)
+            self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            connection.close()
+        finally:
+            database.configure_database('sqlite://')
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import random
+import unittest
+from app.executor import create_executor, ProcessExecutor, _PooledExecutor, _evaluate_in_worker, _worker_rules
+from app.rules import create_rule, evaluate_rule_batch, pack_ast, RuleEngineError
+
+def make_records(count, seed=3):
+    rng = random.Random(seed)
+    records = [{"age": rng.randint(18, 70), "department": rng.choice(["Sales", "HR"])} for _ in range(count)]
+    records[7] = {"department": "Sales"}  # Missing attribute
+    return records
+
+class TestExecutor(unittest.TestCase):
+    def test_modes_match_inline_evaluation(self):
+        rules = [create_rule("age > 30 AND department = 'Sales'"), create_rule("age < 25 OR department = 'HR'")]
+        records = make_records(250)
+        expected = [evaluate_rule_batch(rule, records) for rule in rules]
+        for mode in ('inline', 'thread', 'process'):
+            executor = create_executor(mode, max_workers=2, chunk_size=60)
+            try:
+                for (results, errors), (expected_results, expected_errors) in zip(executor.evaluate_rules(rules, records), expected):
+                    self.assertEqual(results.tolist(), expected_results.tolist())
+                    self.assertEqual(errors, expected_errors)
+                results, errors = executor.evaluate_batch(rules[0], records)
+                self.assertEqual(errors, expected[0][1])
+                with self.assertRaises(RuleEngineError):
+                    executor.evaluate_batch(rules[0], [1, 2])
+            finally:
+                executor.shutdown()
+
+    def test_rules_are_packed_and_compiled_once(self):
+        executor = ProcessExecutor()
+        ast = create_rule("age > 30")
+        key, packed = executor._shipping(ast)
+        self.assertEqual(packed, pack_ast(ast))
+        self.assertIs(executor._shipping(ast)[0], key)  # Packed only once
+        results, errors = _evaluate_in_worker(key, packed, [{"age": 35}])
+        self.assertEqual(results.tolist(), [True])
+        compiled = _worker_rules.get(key)
+        results, errors = _evaluate_in_worker(key, packed, [{"age": 20}])
+        self.assertEqual(results.tolist(), [False])
+        self.assertIs(_worker_rules.get(key), compiled)  # Not unpacked again
+
+    def test_pooled_executor_is_abstract(self):
+        with self.assertRaises(TypeError):
+            _PooledExecutor()
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            create_executor('gpu')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import random
+from app import database
+from app.matcher import RuleMatcher
+from app.rules import create_rule, evaluate_rule, RuleEngineError
+
+class TestMatcher(unittest.TestCase):
+    def setUp(self):
+        self.rules = {
+            'senior_sales': "age > 30 AND department = 'Sales'",
+            'junior': "age <= 25",
+            'high_earner': "salary >= 50000 AND experience > 5",
+            'mixed': "((age > 30 AND department = 'Sales') OR (age < 25 AND department = 'Marketing')) AND (salary > 50000 OR experience > 5)",
+            'names': "name >= 'M' AND name < 'T'",
+        }
+        self.matcher = RuleMatcher()
+        for rule_id, rule_string in self.rules.items():
+            self.matcher.add_rule(rule_id, create_rule(rule_string))
+
+    def test_match(self):
+        record = {"age": 35, "department": "Sales", "salary": 60000, "experience": 10, "name": "Priya"}
+        self.assertEqual(self.matcher.match(record), ['senior_sales', 'high_earner', 'mixed', 'names'])
+        self.assertEqual(self.matcher.match({"age": 25}), ['junior'])
+        self.assertEqual(self.matcher.match({}), [])
+
+    def test_match_agrees_with_evaluate_rule(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            record = {
+                "age": rng.randrange(18, 60),
+                "department": rng.choice(['Sales', 'Marketing', 'IT']),
+                "salary": rng.choice([40000, 50000, 50000.0, 70000]),
+                "experience": rng.randrange(0, 10),
+                "name": rng.choice(['Asha', 'Mira', 'Tara', 'Zoe']),
+            }
+            expected = [rule_id for rule_id, rule_string in self.rules.items() if evaluate_rule(create_rule(rule_string), record)]
+            self.assertEqual(self.matcher.match(record), expected)
+
+    def test_missing_and_incomparable_values_do_not_match(self):
+        self.assertEqual(self.matcher.match({"age": "thirty", "department": "Sales"}), [])
+
+    def test_duplicate_rule_id(self):
+        with self.assertRaises(RuleEngineError):
+            self.matcher.add_rule('junior', create_rule("age < 20"))
+
+    def test_folded_rules(self):
+        self.matcher.add_rule('always', create_rule("age > 30 OR age <= 30"))
+        self.matcher.add_rule('never', create_rule("age > 30 AND age < 20"))
+        self.assertIn('always', self.matcher.match({}))
+        self.assertNotIn('never', self.matcher.match({"age": 25, "department": "Sales"}))
+
+    def test_from_database_skips_rules_that_cannot_be_loaded(self):
+        database.configure_database('sqlite://')
+        rule_id = database.save_rule("age > 30", create_rule("age > 30"))
+        session = database.Session()
+        session.add(database.Rule(rule_string="combined_rule", ast=b"Node(...)", version=100))
+        session.commit()
+        session.close()
+        with self.assertLogs('app.matcher', 'WARNING'):
+            matcher = RuleMatcher.from_database()
+        self.assertEqual(len(matcher), 1)
+        self.assertEqual(matcher.match({"age": 35}), [rule_id])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import unittest
+from app import create_app, metrics
+from app.rules import create_rule, evaluate_rule, RuleEngineError
+
+class TestMetrics(unittest.TestCase):
+    def tearDown(self):
+        metrics.disable()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(metrics.current())
+        create_rule("age > 30")
+        self.assertIsNone(metrics.current())
+
+    def test_records_stages_errors_and_ast_shapes(self):
+        recorded = metrics.enable()
+        ast = create_rule("(age > 30 AND department = 'Sales') OR salary > 50000")
+        evaluate_rule(ast, {"age": 35, "department": "Sales"})
+        with self.assertRaises(RuleEngineError):
+            evaluate_rule(ast, {"age": 20})
+        with self.assertRaises(RuleEngineError):
+            create_rule("age >")
+        self.assertEqual(recorded.stages['tokenize'].count, 2)
+        self.assertEqual(recorded.stages['parse'].count, 1)
+        self.assertEqual(recorded.stages['evaluate'].count, 2)
+        self.assertEqual(recorded.errors, {'missing_attribute': 1, 'syntax': 1})
+        self.assertEqual(recorded.ast_nodes.count, 1)
+        self.assertEqual(recorded.ast_nodes.sum, 5)
+        self.assertEqual(recorded.ast_depth.sum, 3)
+
+        text = recorded.render()
+        self.assertIn('# TYPE rule_engine_stage_seconds histogram', text)
+        self.assertIn('rule_engine_stage_seconds_count{stage="evaluate"} 2', text)
+        self.assertIn('rule_engine_errors_total{kind="syntax"} 1', text)
+        self.assertIn('rule_engine_ast_nodes_bucket{le="7"} 1', text)
+        self.assertIn('rule_engine_ast_depth_bucket{le="+Inf"} 1', text)
+
+    def test_metrics_endpoint(self):
+        response = create_app().test_client().get('/metrics')
+        self.assertEqual(response.status_code, 404)
+
+        client = create_app({'RULE_METRICS_ENABLED': True}).test_client()
+        payload = {'rule_string': "age > 30", 'data': {"age": 35}}
+        client.post('/evaluate_rule', data=json.dumps(payload), content_type='application/json')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.data.decode()
+        self.assertIn('rule_engine_stage_seconds_count{stage="validate"} 1', text)
+        self.assertIn('rule_engine_stage_seconds_count{stage="evaluate"} 1', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import unittest
+from app import database
+from app.registry import RuleRegistry
+from app.rules import create_rule, evaluate_rule, serialize_ast, RuleEngineError
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        database.configure_database('sqlite://')
+
+    def save(self, rule_string):
+        return database.save_rule(rule_string, serialize_ast(create_rule(rule_string)))
+
+    def test_warm_loads_stored_rules(self):
+        rule_id = self.save("age > 30")
+        registry = RuleRegistry()
+        registry.warm()
+        self.assertIn(rule_id, registry)
+        self.assertTrue(evaluate_rule(registry.get(rule_id), {"age": 35}))
+
+    def test_unknown_rule_triggers_refresh(self):
+        registry = RuleRegistry(refresh_interval=3600)
+        registry.warm()
+        rule_id = self.save("age > 30")  # Saved by "another worker" after warming
+        self.assertTrue(evaluate_rule(registry.get(rule_id), {"age": 35}))
+        with self.assertRaises(RuleEngineError):
+            registry.get(rule_id + 1)
+
+    def test_updated_rule_is_reloaded(self):
+        rule_id = self.save("age > 30")
+        registry = RuleRegistry(refresh_interval=0)
+        registry.warm()
+        self.assertTrue(evaluate_rule(registry.get(rule_id), {"age": 35}))
+        database.update_rule(rule_id, "age > 40", serialize_ast(create_rule("age > 40")))
+        self.assertFalse(evaluate_rule(registry.get(rule_id), {"age": 35}))
+
+    def test_json_rules_are_still_read(self):
+        session = database.Session()
+        rule = database.Rule(rule_string="age > 30", ast=json.dumps(serialize_ast(create_rule("age > 30"))).encode(), version=0)
+        session.add(rule)
+        session.commit()
+        rule_id = rule.id
+        session.close()
+        registry = RuleRegistry()
+        registry.warm()
+        self.assertTrue(evaluate_rule(registry.get(rule_id), {"age": 35}))
+
+    def test_undecodable_rules_are_reparsed_or_skipped(self):
+        session = database.Session()
+        session.add(database.Rule(rule_string="age > 30", ast=b"Node(operand, ('age', '>', 30))", version=1))
+        session.add(database.Rule(rule_string="combined_rule", ast=b"Node(...)", version=2))
+        session.commit()
+        ids = [rule.id for rule in session.query(database.Rule).order_by(database.Rule.id)]
+        session.close()
+        registry = RuleRegistry()
+        registry.warm()
+        self.assertTrue(evaluate_rule(registry.get(ids[0]), {"age": 35}))
+        self.assertNotIn(ids[1], registry)
+
+if __name__ == '__main__':
+    unittest.main()
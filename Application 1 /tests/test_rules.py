@@ -1,5 +1,17 @@
+import random
 import unittest
-from app.rules import create_rule, evaluate_rule, RuleEngineError
+from app.ast import Node
+from app.rules import (create_rule, combine_rules, evaluate_rule, evaluate_node, compile_rule, evaluate_rule_batch,
+                       optimize_rule, modify_rule, format_rule, referenced_attributes, tokenize, serialize_ast,
+                       deserialize_ast, pack_ast, unpack_ast, RuleEngineError)
+
+def depth(node):
+    """
+    Returns the depth of an AST.
+    """
+    if node is None:
+        return 0
+    return 1 + max(depth(node.left), depth(node.right))
 
 class TestRules(unittest.TestCase):
     def test_create_rule_simple(self):
@@ -21,6 +33,36 @@ class TestRules(unittest.TestCase):
         with self.assertRaises(RuleEngineError):
             create_rule(rule_string)
 
+    def test_create_rule_values(self):
+        ast = create_rule("salary >= 50000.5 AND city = 'New York' AND balance > -20")
+        self.assertEqual(ast.left.left.value, ('salary', '>=', 50000.5))
+        self.assertEqual(ast.left.right.value, ('city', '=', 'New York'))
+        self.assertEqual(ast.right.value, ('balance', '>', -20))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("age > 18 AND (income < 5000 OR city = \"AND\")"),
+                         ['age', '>', '18', 'AND', '(', 'income', '<', '5000', 'OR', 'city', '=', 'AND', ')'])
+
+    def test_create_rule_error_positions(self):
+        cases = {
+            "age > 30 AND": "position 12",
+            "(age > 30 OR x = 1": "position 0",
+            "age > 30)": "position 8",
+            "age ! 30": "position 4",
+            "age => 30": "position 4",
+            "age > 30 department = 'Sales'": "position 9",
+        }
+        for rule_string, position in cases.items():
+            with self.assertRaises(RuleEngineError) as context:
+                create_rule(rule_string)
+            self.assertIn(position, str(context.exception))
+
+    def test_create_rule_deeply_nested(self):
+        depth = 5000
+        rule_string = "(" * depth + "age > 30" + ")" * depth
+        ast = create_rule(rule_string)
+        self.assertEqual(ast.value, ('age', '>', 30))
+
     def test_evaluate_rule_true(self):
         rule_string = "age > 30 AND department = 'Sales'"
         ast = create_rule(rule_string)
@@ -59,5 +101,244 @@ class TestRules(unittest.TestCase):
         self.assertTrue(evaluate_rule(ast, data2))
         self.assertFalse(evaluate_rule(ast, data3))
 
+    def test_compile_rule_matches_evaluate_node(self):
+        rule_string = "((age > 30 AND department = 'Sales') OR (age < 25 AND department = 'Marketing')) AND (salary >= 50000 OR experience <= 5)"
+        ast = create_rule(rule_string)
+        evaluator = compile_rule(ast)
+        for age in (20, 30, 40):
+            for department in ('Sales', 'Marketing'):
+                for salary in (40000, 50000):
+                    data = {"age": age, "department": department, "salary": salary, "experience": 6}
+                    self.assertEqual(evaluator(data), evaluate_node(ast, data))
+        self.assertIs(compile_rule(ast), evaluator)  # The compiled rule is cached on the AST
+
+    def test_compile_rule_short_circuits(self):
+        ast = create_rule("age > 30 OR department = 'Sales'")
+        self.assertTrue(evaluate_rule(ast, {"age": 35}))  # 'department' is never read
+        with self.assertRaises(RuleEngineError):
+            evaluate_rule(ast, {"age": 25})
+
+    def test_compile_rule_unknown_operator(self):
+        ast = Node('operand', value=('age', '!=', 30))
+        with self.assertRaises(RuleEngineError):
+            compile_rule(ast)
+
+    def test_compile_rule_deeply_nested(self):
+        ast = Node('operand', value=('age', '>', 30))
+        for i in range(300):
+            ast = Node('operator', left=ast, right=Node('operand', value=('level', '=', i)), value='OR' if i % 2 else 'AND')
+        self.assertTrue(evaluate_rule(ast, {"age": 35, "level": 299}))
+        self.assertFalse(evaluate_rule(ast, {"age": 35, "level": 298}))
+
+    def test_evaluate_rule_batch_matches_evaluate_rule(self):
+        rule_string = "(age > 30 OR experience > 5) AND (department = 'Sales' OR salary >= 50000)"
+        ast = create_rule(rule_string)
+        records = [
+            {"age": 35, "experience": 3, "department": "Sales", "salary": 1},
+            {"age": 28, "experience": 7, "department": "IT", "salary": 60000},
+            {"age": 25, "experience": 2, "department": "IT", "salary": 60000},
+            {"age": 40, "department": "Sales"},
+            {"age": 20, "experience": 7, "salary": 1},
+            {"age": "forty", "experience": 7, "department": "Sales"},
+            {"experience": 9, "department": "HR", "salary": 70000},
+        ]
+        results, errors = evaluate_rule_batch(ast, records)
+        self.assertEqual(len(results), len(records))
+        for record, result, error in zip(records, results.tolist(), errors):
+            try:
+                expected = evaluate_rule(ast, record)
+            except RuleEngineError as e:
+                self.assertEqual(error, str(e))
+                self.assertFalse(result)
+            else:
+                self.assertIsNone(error)
+                self.assertEqual(result, expected)
+
+    def test_evaluate_rule_batch_invalid_records(self):
+        ast = create_rule("age > 30")
+        with self.assertRaises(RuleEngineError):
+            evaluate_rule_batch(ast, [{"age": 35}, "not a record"])
+
+    def test_combine_rules_is_balanced(self):
+        rules = [create_rule(f"attr{i % 50} > {i}") for i in range(5000)]
+        combined = combine_rules(rules)
+        self.assertLessEqual(depth(combined), 14)
+        data = {f"attr{i}": 10 ** 6 for i in range(50)}
+        self.assertTrue(evaluate_rule(combined, data))
+        self.assertTrue(evaluate_node(combined, data))
+        restored = deserialize_ast(serialize_ast(combined))
+        self.assertTrue(evaluate_rule(restored, data))
+
+    def test_combine_rules_shares_identical_subtrees(self):
+        first = create_rule("(age > 30 OR experience > 5) AND department = 'Sales'")
+        second = create_rule("salary > 50000 AND (age > 30 OR experience > 5)")
+        third = create_rule("department = 'Sales' OR (age > 30 OR experience > 5)")
+        combined = combine_rules([first, second, third])
+        # The duplicated "department = 'Sales'" and "(age > 30 OR experience > 5)" conditions are dropped
+        self.assertEqual(serialize_ast(combined), serialize_ast(combine_rules([
+            create_rule("(age > 30 OR experience > 5) AND department = 'Sales' AND salary > 50000"),
+            third
+        ])))
+        shared = combined.left.left
+        self.assertEqual(shared.value, 'OR')
+        self.assertIs(combined.right.right.right, shared)  # The nested copy in the third rule is the same node
+        self.assertTrue(evaluate_rule(combined, {"age": 35, "experience": 1, "department": "Sales", "salary": 60000}))
+        self.assertFalse(evaluate_rule(combined, {"age": 25, "experience": 1, "department": "Sales", "salary": 60000}))
+
+    def test_create_rule_balances_operator_runs(self):
+        rule_string = " AND ".join(f"attr{i} > {i}" for i in range(10000)) + " OR flag = 1"
+        ast = create_rule(rule_string)
+        self.assertEqual(ast.value, 'OR')
+        self.assertLessEqual(depth(ast), 16)
+        data = {f"attr{i}": i + 1 for i in range(10000)}
+        data['flag'] = 0
+        self.assertTrue(evaluate_rule(ast, data))
+        data['attr5000'] = 0
+        self.assertFalse(evaluate_rule(ast, data))
+
+    def test_pack_ast_round_trip(self):
+        rule_string = ("((age > 30 AND department = 'Sales') OR (age < 25 AND department = 'Marketing')) AND "
+                       "(salary > 50000.5 OR experience > -5 OR id = 99999999999999999999999)")
+        ast = create_rule(rule_string)
+        packed = pack_ast(ast)
+        self.assertIsInstance(packed, bytes)
+        self.assertEqual(serialize_ast(unpack_ast(packed)), serialize_ast(ast))
+        self.assertIsNone(unpack_ast(pack_ast(None)))
+        with self.assertRaises(RuleEngineError):
+            unpack_ast(packed[:-3])
+        with self.assertRaises(RuleEngineError):
+            unpack_ast(b'{"type": "operand"}')
+
+    def test_pack_ast_keeps_shared_subtrees(self):
+        first = create_rule("(age > 30 OR experience > 5) AND department = 'Sales'")
+        second = create_rule("department = 'Sales' OR (age > 30 OR experience > 5)")
+        combined = combine_rules([first, second])
+        restored = unpack_ast(pack_ast(combined))
+        self.assertEqual(serialize_ast(restored), serialize_ast(combined))
+        self.assertIs(restored.right.right, restored.left.left)
+        self.assertLess(len(pack_ast(combined)), len(str(serialize_ast(combined))))
+
+    def test_nodes_are_slotted_and_interned(self):
+        first = create_rule("department = 'Sales'")
+        second = create_rule("department = 'Sales' AND age > 30")
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertIs(first.value, second.left.value)
+
+    def test_optimize_rule_merges_ranges_and_duplicates(self):
+        cases = {
+            "age > 30 AND age > 40 AND (salary < 5 OR salary < 10)": "age > 40 AND salary < 10",
+            "age >= 30 AND age <= 30 AND department = 'Sales' AND department = 'Sales'": "age = 30 AND department = 'Sales'",
+            "age > 5 OR age = 5 OR (age > 30 AND age > 20)": "age >= 5",
+            "(age > 30 AND age > 40) OR (age > 40 AND age > 30)": "age > 40",
+        }
+        for rule_string, expected in cases.items():
+            self.assertEqual(serialize_ast(create_rule(rule_string)), serialize_ast(create_rule(expected, optimize=False)))
+
+    def test_optimize_rule_folds_contradictions_and_tautologies(self):
+        cases = {
+            "age > 40 AND age < 30": False,
+            "department = 'Sales' AND department = 'HR'": False,
+            "age > 30 OR age <= 30": True,
+            "age < 5 OR age > 5 OR age = 5": True,
+            "(age > 40 AND age < 30) OR (salary >= 10 OR salary < 20)": True,
+        }
+        for rule_string, expected in cases.items():
+            ast = create_rule(rule_string)
+            self.assertEqual((ast.node_type, ast.value), ('constant', expected))
+            self.assertIs(evaluate_rule(ast, {}), expected)
+            self.assertEqual(evaluate_rule_batch(ast, [{}, {"age": 1}])[0].tolist(), [expected, expected])
+            self.assertEqual(serialize_ast(unpack_ast(pack_ast(ast))), serialize_ast(ast))
+
+        ast = create_rule("(age > 40 AND age < 30) OR department = 'Sales'")
+        self.assertEqual(ast.value, ('department', '=', 'Sales'))
+        self.assertEqual(create_rule("age > 40 AND age < 30", optimize=False).value, 'AND')
+
+    def test_optimize_rule_keeps_results(self):
+        rule_string = ("((age > 30 AND age >= 25) OR (age < 25 AND department = 'Marketing' AND age < 20)) AND "
+                       "(salary >= 50000 OR salary > 60000 OR salary = 50000) AND experience <= 5 AND experience < 5.5")
+        original = create_rule(rule_string, optimize=False)
+        optimized = optimize_rule(original)
+        self.assertLess(len(pack_ast(optimized)), len(pack_ast(original)))
+        self.assertEqual(serialize_ast(optimize_rule(optimized)), serialize_ast(optimized))
+        for age in (18, 20, 25, 30, 31):
+            for salary in (40000, 50000, 60000.5):
+                for experience in (5, 5.25, 6):
+                    data = {"age": age, "department": "Marketing", "salary": salary, "experience": experience}
+                    self.assertEqual(evaluate_rule(optimized, data), evaluate_node(original, data))
+
+    def test_optimize_rule_never_turns_results_into_errors(self):
+        # Merging `age` conditions across `department` would move `age > 40` ahead of the sibling that
+        # short-circuits it
+        rule_string = "age = 30 OR department = 'Sales' OR age > 40"
+        data = {'age': None, 'department': 'Sales'}
+        self.assertTrue(evaluate_rule(create_rule(rule_string, optimize=False), data))
+        self.assertTrue(evaluate_rule(create_rule(rule_string), data))
+
+        rng = random.Random(7)
+        def condition():
+            attribute = rng.choice(['age', 'salary', 'department'])
+            if attribute == 'department':
+                return f"department = '{rng.choice(['Sales', 'HR'])}'"
+            return f"{attribute} {rng.choice(['>', '<', '>=', '<=', '='])} {rng.choice([10, 20, 30])}"
+        def chain(depth):
+            if depth == 0 or rng.random() < 0.3:
+                return condition()
+            operator = rng.choice([' AND ', ' OR '])
+            return '(' + operator.join(chain(depth - 1) for _ in range(rng.randint(2, 4))) + ')'
+
+        values = [None, 'Sales', 'HR', '30', True, 10, 20, 25, 30, 30.0]
+        for _ in range(500):
+            original = create_rule(chain(3), optimize=False)
+            optimized = optimize_rule(original)
+            for _ in range(5):
+                data = {attribute: rng.choice(values) for attribute in ('age', 'salary', 'department')
+                        if rng.random() < 0.9}
+                try:
+                    expected = evaluate_rule(original, data)
+                except RuleEngineError:
+                    continue  # The optimized rule may give a result instead (see optimize_rule)
+                self.assertEqual(evaluate_rule(optimized, data), expected, (format_rule(original), data))
+
+    def test_combine_rules_merges_ranges_across_rules(self):
+        combined = combine_rules([create_rule("age > 30 AND salary < 100"), create_rule("age > 40")])
+        self.assertEqual(serialize_ast(combined), serialize_ast(create_rule("age > 40 AND salary < 100", optimize=False)))
+        self.assertEqual(combine_rules([create_rule("age > 30"), create_rule("age < 20")]).value, False)
+        self.assertEqual(combine_rules([create_rule("age > 30"), create_rule("age > 40")], optimize=False).value, 'AND')
+
+    def test_format_rule_round_trips(self):
+        for rule_string in ["age > 30 AND (department = 'Sales' OR salary >= 50000.5)",
+                            "(a > 1 AND b > 2 AND c > 3) OR d = 'x'", 'name = "O\'Brien" AND level <= -2']:
+            self.assertEqual(format_rule(create_rule(rule_string, optimize=False)), rule_string)
+        with self.assertRaises(RuleEngineError):
+            format_rule(create_rule("age > 30 AND age < 20"))  # Folded to a constant
+
+    def test_modify_rule(self):
+        ast = create_rule("(age > 30 AND department = 'Sales') OR salary > 50000", optimize=False)
+        compile_rule(ast.right)
+        data = {'age': 35, 'department': 'Sales', 'salary': 0, 'level': 3}
+
+        updated = modify_rule(ast, 'LL', 'update', operator='>=', value=40)
+        self.assertEqual(format_rule(updated), "(age >= 40 AND department = 'Sales') OR salary > 50000")
+        self.assertFalse(evaluate_rule(updated, data))
+        self.assertTrue(evaluate_rule(ast, data))  # The original rule is unchanged
+        self.assertIs(updated.right, ast.right)  # Untouched subtrees are shared, with their evaluators
+        self.assertIsNotNone(updated.right.compiled)
+
+        added = modify_rule(updated, 'R', 'add', expression="level > 2", join='OR')
+        self.assertEqual(format_rule(added), "(age >= 40 AND department = 'Sales') OR salary > 50000 OR level > 2")
+        self.assertTrue(evaluate_rule(added, data))
+        self.assertEqual(referenced_attributes(added), {'age', 'department', 'salary', 'level'})
+
+        removed = modify_rule(added, 'LL', 'remove')
+        self.assertEqual(format_rule(removed), "department = 'Sales' OR salary > 50000 OR level > 2")
+        self.assertIs(removed.left, added.left.right)
+        self.assertEqual(referenced_attributes(removed), {'department', 'salary', 'level'})
+
+        for path, action, options in [('LLL', 'update', {}), ('L', 'update', {}), ('X', 'remove', {}),
+                                      ('', 'remove', {}), ('R', 'update', {'operator': '!='}),
+                                      ('R', 'add', {'expression': 'level >'}), ('R', 'rename', {})]:
+            with self.assertRaises(RuleEngineError):
+                modify_rule(ast, path, action, **options)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from app import database
+from app.rules import create_rule, evaluate_rule_batch
+from app.scoring import score_file, load_scores
+
+def make_records(count):
+    records = [{"age": 18 + i % 50, "department": ["Sales", "HR", "Legal"][i % 3], "salary": 1000 * (i % 90)}
+               for i in range(count)]
+    for record in records[::9]:
+        del record["salary"]  # Missing values
+    return records
+
+class TestScoring(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.records = make_records(500)
+        self.path = os.path.join(self.directory, 'data.csv')
+        pd.DataFrame(self.records).to_csv(self.path, index=False)
+        self.output = os.path.join(self.directory, 'scores.npy')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_scores(self, rules, summary):
+        matrix, rule_ids = load_scores(self.output)
+        self.assertEqual(rule_ids, [rule_id for rule_id, _ in rules])
+        self.assertEqual(matrix.shape, (len(self.records), len(rules)))
+        for column, (rule_id, ast) in enumerate(rules):
+            results, errors = evaluate_rule_batch(ast, self.records)
+            self.assertEqual(matrix[:, column].tolist(), results.tolist())
+            self.assertEqual(summary['matches'][str(rule_id)], int(results.sum()))
+            self.assertEqual(summary['errors'][str(rule_id)], sum(error is not None for error in errors))
+
+    def test_score_file_matches_batch_evaluation(self):
+        rules = [(rule_id, create_rule(rule_string)) for rule_id, rule_string in enumerate([
+            "age > 30 AND department = 'Sales'",
+            "salary >= 40000 OR department = 'HR'",
+            "(age < 25 AND salary < 10000) OR department > 'K'",
+            "experience > 5",
+        ] * 3, start=1)]
+        for workers in (0, 2):
+            summary = score_file(self.path, self.output, rules=rules, chunk_size=64, workers=workers)
+            self.assertEqual(summary['rows'], len(self.records))
+            self.check_scores(rules, summary)
+        self.assertEqual(np.load(self.output, mmap_mode='r').shape, (len(self.records), 2))  # 12 rules in 2 bytes
+
+    def test_score_file_uses_stored_rules(self):
+        database.configure_database('sqlite://')
+        rule_ids = database.save_rules([(rule_string, create_rule(rule_string))
+                                        for rule_string in ("age > 40", "department = 'Legal' AND salary < 5000")])
+        summary = score_file(self.path, self.output, chunk_size=100, workers=0)
+        self.check_scores(list(zip(rule_ids, [create_rule("age > 40"), create_rule("department = 'Legal' AND salary < 5000")])), summary)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import random
+import unittest
+from app.rules import create_rule, evaluate_rule, RuleEngineError
+from app.selectivity import SelectivityTracker
+
+def outcome(ast, data):
+    """
+    Returns the result of evaluating a rule, or the error message it raises.
+    """
+    try:
+        return evaluate_rule(ast, data)
+    except RuleEngineError as e:
+        return str(e)
+
+class TestSelectivity(unittest.TestCase):
+    def test_reorder_uses_statistics(self):
+        tracker = SelectivityTracker()
+        ast = tracker.track(create_rule("a = 1 AND b = 2"))
+        rule = ast.compiled.rule
+        tracker.record_many([(('a', '=', 1), True, 100)] * 99 + [(('a', '=', 1), False, 100)])
+        tracker.record_many([(('b', '=', 2), False, 100)] * 99 + [(('b', '=', 2), True, 100)])
+        self.assertTrue(rule.reorder())
+        self.assertEqual(rule.plan.left.value, ('b', '=', 2))
+        self.assertFalse(rule.reorder())  # Already in the best order
+        self.assertTrue(evaluate_rule(ast, {'a': 1, 'b': 2}))
+        self.assertFalse(evaluate_rule(ast, {'a': 1, 'b': 3}))
+        # Records that could raise are evaluated in source order, with the usual errors
+        self.assertEqual(outcome(ast, {'b': 3}), "Attribute 'a' not found in data")
+
+    def test_reordering_never_changes_results(self):
+        rule_string = "(age > 30 AND department = 'Sales') OR (salary < 1000 AND age < 25) OR flag = 1"
+        tracker = SelectivityTracker(sample_interval=1, reorder_interval=50)
+        adaptive = tracker.track(create_rule(rule_string))
+        reference = create_rule(rule_string)
+        rng = random.Random(7)
+        for _ in range(3000):
+            record = {
+                'age': rng.choice([rng.randint(18, 60), 'old']),
+                'department': rng.choice(['Sales', 'HR']),
+                'salary': rng.randint(0, 100000),
+                'flag': int(rng.random() < 0.01)
+            }
+            if rng.random() < 0.05:
+                del record[rng.choice(list(record))]
+            self.assertEqual(outcome(adaptive, record), outcome(reference, record))
+        self.assertEqual({entry['attribute'] for entry in tracker.stats()}, {'age', 'department', 'salary', 'flag'})
+
+    def test_stats(self):
+        tracker = SelectivityTracker(sample_interval=1)
+        ast = tracker.track(create_rule("age > 30"))
+        for age in (20, 40, 50, 60):
+            evaluate_rule(ast, {'age': age})
+        [entry] = tracker.stats()
+        self.assertEqual((entry['attribute'], entry['operator'], entry['value']), ('age', '>', 30))
+        self.assertEqual(entry['evaluations'], 4)
+        self.assertEqual(entry['true_rate'], 0.75)
+        tracker.reset()
+        self.assertEqual(tracker.stats(), [])
+
+if __name__ == '__main__':
+    unittest.main()
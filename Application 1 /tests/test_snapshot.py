@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+from app import database, snapshot
+from app.registry import RuleRegistry
+from app.rules import create_rule, evaluate_rule, pack_ast
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rules.snapshot')
+        database.configure_database(f"sqlite:///{os.path.join(self.directory, 'rules.db')}")
+
+    def tearDown(self):
+        database.configure_database('sqlite://')
+        shutil.rmtree(self.directory)
+
+    def test_snapshot_path(self):
+        self.assertEqual(snapshot.snapshot_path(os.path.join('data', 'rule_engine.db')), os.path.join('data', 'rule_engine.snapshot'))
+        self.assertEqual(snapshot.snapshot_path(database.database_path()), self.path)
+        self.assertIsNone(snapshot.snapshot_path(None))
+
+    def test_round_trip_and_validation(self):
+        self.assertIsNone(snapshot.load_snapshot(self.path))
+        ast = create_rule("age > 30 AND department = 'Sales'")
+        self.assertEqual(snapshot.write_snapshot(self.path, [(1, 4, ast), (2, 7, pack_ast(ast))], 7), 2)
+        version, rules = snapshot.load_snapshot(self.path)
+        self.assertEqual(version, 7)
+        self.assertEqual(rules, [(1, 4, pack_ast(ast)), (2, 7, pack_ast(ast))])
+
+        with open(self.path, 'r+b') as snapshot_file:
+            snapshot_file.seek(-1, os.SEEK_END)
+            last = snapshot_file.read(1)
+            snapshot_file.seek(-1, os.SEEK_END)
+            snapshot_file.write(bytes([last[0] ^ 1]))
+        with self.assertRaisesRegex(ValueError, "checksum"):
+            snapshot.load_snapshot(self.path)
+
+    def test_registry_warms_from_snapshot(self):
+        first = database.save_rule("age > 30", create_rule("age > 30"))
+        RuleRegistry(snapshot_path=self.path).warm()
+        self.assertEqual(snapshot.load_snapshot(self.path)[0], database.current_version())
+
+        # Rules saved after the snapshot are read from the database, and the snapshot is brought up to date
+        second = database.save_rule("age < 20", create_rule("age < 20"))
+        registry = RuleRegistry(snapshot_path=self.path)
+        registry.warm()
+        self.assertTrue(evaluate_rule(registry.get(first), {'age': 35}))
+        self.assertTrue(evaluate_rule(registry.get(second), {'age': 10}))
+        self.assertEqual(len(snapshot.load_snapshot(self.path)[1]), 2)
+
+        # A snapshot ahead of the database (e.g., from another database) is ignored
+        database.configure_database('sqlite://')
+        registry = RuleRegistry(snapshot_path=self.path)
+        with self.assertLogs('app.registry', level='WARNING'):
+            registry.warm()
+        self.assertEqual(len(registry), 0)
+
+if __name__ == '__main__':
+    unittest.main()
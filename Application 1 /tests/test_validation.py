@@ -0,0 +1,59 @@
+import json
+import unittest
+from marshmallow import ValidationError
+from app import create_app, validation
+from app.api import RuleSchema, EvaluationSchema, StoredRuleEvaluationSchema, BatchEvaluationSchema
+
+class TestValidation(unittest.TestCase):
+    def test_loads(self):
+        self.assertEqual(validation.loads(b'{"age": 35, "tags": ["a"]}'), {"age": 35, "tags": ["a"]})
+        self.assertEqual(validation.loads(b'{"id": 99999999999999999999999}'), {"id": 99999999999999999999999})
+        with self.assertRaises(ValueError):
+            validation.loads(b'{"age": ')
+
+    def test_compiled_validators_match_schemas(self):
+        payloads = [
+            None, [], "text", {},
+            {"rule_string": "age > 30"},
+            {"rule_string": 30},
+            {"rule_string": None},
+            {"rule_string": "age > 30", "extra": 1},
+            {"rule_string": "age > 30", "data": {"age": 35}},
+            {"rule_string": "age > 30", "data": [1]},
+            {"data": {"age": 35}},
+            {"data": "age"},
+            {"rule_string": "age > 30", "records": [{"age": 35}, {}]},
+            {"rule_string": "age > 30", "records": [{"age": 35}, 1]},
+            {"rule_string": "age > 30", "records": {"age": 35}},
+        ]
+        for schema_class in (RuleSchema, EvaluationSchema, StoredRuleEvaluationSchema, BatchEvaluationSchema):
+            schema = schema_class()
+            validator = validation.compile_validator(schema)
+            self.assertIsNot(validator, schema.load)  # Every request schema is simple enough to compile
+            for payload in payloads:
+                try:
+                    expected = schema.load(payload)
+                except ValidationError as e:
+                    with self.assertRaises(ValidationError) as context:
+                        validator(payload)
+                    self.assertEqual(context.exception.messages, e.messages)
+                else:
+                    self.assertEqual(validator(payload), expected)
+
+    def test_fast_path_responses(self):
+        bodies = [
+            json.dumps({'rule_string': "age > 30", 'data': {"age": 35}}),
+            json.dumps({'rule_string': "age > 30"}),
+            json.dumps({'rule_string': "age > 30", 'data': {"age": 35}, 'extra': True}),
+            '{"rule_string": ',
+        ]
+        clients = [create_app({'RULE_FAST_PATH': fast}).test_client() for fast in (False, True)]
+        for body in bodies:
+            slow, fast = [client.post('/evaluate_rule', data=body, content_type='application/json') for client in clients]
+            self.assertEqual(fast.status_code, slow.status_code)
+            self.assertEqual(fast.get_json(silent=True), slow.get_json(silent=True))
+        slow, fast = [client.post('/evaluate_rule', data='age', content_type='text/plain') for client in clients]
+        self.assertEqual(fast.status_code, slow.status_code)
+
+if __name__ == '__main__':
+    unittest.main()
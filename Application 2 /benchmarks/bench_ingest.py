@@ -0,0 +1,120 @@
+"""
+Measures how fast synthetic weather readings are ingested into the database, in rows/sec, with the bulk
+path of store_weather_data (executemany on a long-lived connection, WAL, one commit per batch) and, for
+comparison, with one execute per row on a new default connection per fetch cycle into the former
+trigger-free schema. The bulk figure includes maintaining the daily aggregates, the per-row one does not.
+
+Usage:
+    python -m benchmarks.bench_ingest [--rows 2000000] [--cities 100] [--batch-size 10000] [--legacy-rows 50000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from src import data_storage
+from src.config import DB_BATCH_SIZE
+from src.data_processing import calculate_daily_summary
+
+CONDITIONS = ['Clear', 'Clouds', 'Rain', 'Haze', 'Mist', 'Thunderstorm']
+
+# The weather_data table as init_db used to create it, without the daily aggregate triggers
+LEGACY_SCHEMA = '''
+CREATE TABLE weather_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT,
+    main TEXT,
+    temp REAL,
+    feels_like REAL,
+    humidity REAL,
+    wind_speed REAL,
+    dt INTEGER
+)
+'''
+
+def synthetic_readings(rows, cities, seed=42, start=1625097600):
+    """
+    Generates readings for `cities` cities, one per city every 5 minutes.
+
+    Args:
+        rows (int): The number of readings.
+        cities (int): The number of cities.
+        seed (int): The random seed.
+        start (int): Timestamp of the first reading.
+
+    Returns:
+        Iterator[dict]: The readings, in the format taken by store_weather_data.
+    """
+    rng = random.Random(seed)
+    names = [f'City{i}' for i in range(cities)]
+    for i in range(rows):
+        temp = round(rng.uniform(10, 45), 2)
+        yield {'city': names[i % cities], 'main': rng.choice(CONDITIONS), 'temp': temp, 'feels_like': temp + 1.5,
+               'humidity': rng.randrange(20, 100), 'wind_speed': round(rng.uniform(0, 15), 2),
+               'dt': start + (i // cities) * 300}
+
+def ingest_bulk(path, rows, cities, batch_size):
+    """
+    Ingests readings with store_weather_data and returns the elapsed seconds.
+    """
+    data_storage.DB_PATH = path
+    data_storage.init_db()
+    start = time.perf_counter()
+    stored = data_storage.store_weather_data(synthetic_readings(rows, cities), batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    assert stored == rows
+    return elapsed
+
+def ingest_per_row(path, rows, cities):
+    """
+    Ingests readings the way store_weather_data used to (a new connection and one execute per row for every
+    fetch cycle of `cities` readings) into the schema it used to write to, and returns the elapsed seconds.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)  # Without triggers, and in the default journal mode, as before
+    conn.close()
+    readings = list(synthetic_readings(rows, cities))
+    start = time.perf_counter()
+    for cycle in range(0, rows, cities):
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        for item in readings[cycle:cycle + cities]:
+            cursor.execute('''
+            INSERT INTO weather_data (city, main, temp, feels_like, humidity, wind_speed, dt)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (item['city'], item['main'], item['temp'], item['feels_like'],
+                  item['humidity'], item['wind_speed'], item['dt']))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000000, help='Readings ingested with the bulk path')
+    parser.add_argument('--cities', type=int, default=100, help='Number of cities (readings per fetch cycle)')
+    parser.add_argument('--batch-size', type=int, default=DB_BATCH_SIZE, help='Readings per transaction')
+    parser.add_argument('--legacy-rows', type=int, default=50000,
+                        help='Readings ingested one execute per row for comparison (0 skips it)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        bulk = ingest_bulk(os.path.join(directory, 'bulk.db'), args.rows, args.cities, args.batch_size)
+        start = time.perf_counter()
+        summary = calculate_daily_summary()
+        summarize = time.perf_counter() - start
+        data_storage.close_shared_connections()
+        size = os.path.getsize(os.path.join(directory, 'bulk.db'))
+
+        print(f"rows={args.rows} cities={args.cities} batch_size={args.batch_size}")
+        print(f"store_weather_data: {args.rows / bulk:12,.0f} rows/sec ({bulk:.2f}s, {size / 2 ** 20:.0f} MiB)")
+        print(f"daily summary:      {len(summary):12,} rows in {summarize:.3f}s")
+        if args.legacy_rows:
+            legacy = ingest_per_row(os.path.join(directory, 'legacy.db'), args.legacy_rows, args.cities)
+            print(f"per-row execute:    {args.legacy_rows / legacy:12,.0f} rows/sec ({legacy:.2f}s)")
+            print(f"speedup:            {(args.rows / bulk) / (args.legacy_rows / legacy):12.1f}x")
+        data_storage.close_shared_connections()
+
+if __name__ == '__main__':
+    main()
@@ -11,7 +11,16 @@ load_dotenv()
 
 # API Configuration
 API_KEY = os.getenv('OPENWEATHERMAP_API_KEY')
-BASE_URL = 'http://api.openweathermap.org/data/2.5/weather'
+BASE_URL = os.getenv('OPENWEATHERMAP_BASE_URL', 'http://api.openweathermap.org/data/2.5/weather')
+GROUP_URL = os.getenv('OPENWEATHERMAP_GROUP_URL', 'http://api.openweathermap.org/data/2.5/group')
+GROUP_SIZE = 20  # Most city IDs the group endpoint accepts per request
+
+# HTTP client configuration
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', 10))  # Seconds to wait for a connection or a response
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', 1))  # Cities fetched concurrently (1 fetches them one after another)
+MAX_REQUESTS_PER_HOST = int(os.getenv('MAX_REQUESTS_PER_HOST', 8))  # Concurrent requests allowed to one API host
+FETCH_BATCHED = os.getenv('FETCH_BATCHED', 'false').lower() == 'true'  # Fetch cities in groups through GROUP_URL
+CITY_ID_CACHE = os.path.join('data', 'city_ids.json')  # City name to OpenWeatherMap city ID mapping, filled on first use
 
 # Cities to monitor
 CITIES = ['Delhi', 'Mumbai', 'Chennai', 'Bangalore', 'Kolkata', 'Hyderabad']
@@ -31,6 +40,11 @@ SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
 
 # Database configuration
 DB_PATH = 'weather_data.db'
+DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', 10000))  # Readings inserted per transaction by store_weather_data
+DB_WAL = os.getenv('DB_WAL', 'true').lower() == 'true'  # Write-ahead logging: readers do not block the writer
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')  # NORMAL is crash-safe with WAL and syncs only at checkpoints
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', 65536))  # Page cache per connection
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', 30))  # Seconds to wait for another connection's write lock
 
 # Logging configuration
 LOG_FILE = 'weather_monitoring.log'
@@ -2,35 +2,30 @@
 Module for processing weather data and generating summaries.
 """
 
-import pandas as pd
-from src.data_storage import get_weather_data, store_daily_summary
+from src.data_storage import (get_daily_aggregates, mark_daily_aggregates_summarized, store_daily_summary,
+                              SUMMARY_COLUMNS)
 from src.alerting import check_alerts
 
 def calculate_daily_summary():
     """
     Calculate daily summary statistics from weather data.
     
+    Summaries come from the per-day, per-city aggregates the database keeps up to date on every insert, so
+    only the days that received readings since the last call are recomputed (in steady state, the current
+    day of each city) and the raw readings are never scanned.
+    
     Returns:
-        pd.DataFrame: Daily summary of weather data.
+        pd.DataFrame: Daily summary of the days that changed since the last call.
     """
-    df = get_weather_data()
-    df['date'] = pd.to_datetime(df['dt'], unit='s').dt.date
-    
-    summary = df.groupby(['date', 'city']).agg(
-        avg_temp=('temp', 'mean'),
-        max_temp=('temp', 'max'),
-        min_temp=('temp', 'min'),
-        avg_humidity=('humidity', 'mean'),
-        max_humidity=('humidity', 'max'),
-        min_humidity=('humidity', 'min'),
-        avg_wind_speed=('wind_speed', 'mean'),
-        max_wind_speed=('wind_speed', 'max'),
-        min_wind_speed=('wind_speed', 'min'),
-        dominant_condition=('main', lambda x: x.mode()[0])
-    ).reset_index()
+    changes = get_daily_aggregates(changed_only=True)
+    if changes.empty:
+        return changes[SUMMARY_COLUMNS]
     
-    store_daily_summary(summary)
-    return summary
+    current = changes[changes['count'] > 0][SUMMARY_COLUMNS]
+    emptied = changes[changes['count'] <= 0]
+    store_daily_summary(current, removed=zip(emptied['date'], emptied['city']))
+    mark_daily_aggregates_summarized(changes)
+    return current.reset_index(drop=True)
 
 def process_weather_data():
     """
@@ -3,21 +3,94 @@ Module for retrieving weather data from the OpenWeatherMap API.
 """
 
 import requests
+import json
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from threading import Timer
-from src.config import API_KEY, BASE_URL, CITIES, INTERVAL
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from src.config import (API_KEY, BASE_URL, GROUP_URL, GROUP_SIZE, CITIES, INTERVAL, REQUEST_TIMEOUT, FETCH_WORKERS,
+                        MAX_REQUESTS_PER_HOST, FETCH_BATCHED, CITY_ID_CACHE)
 from src.data_storage import store_weather_data
 
 logger = logging.getLogger(__name__)
 
-def fetch_weather_data(city):
+_session = None
+_session_lock = threading.Lock()
+
+def create_session(pool_size=MAX_REQUESTS_PER_HOST):
+    """
+    Create an HTTP session that keeps connections to each host alive between requests.
+
+    Args:
+        pool_size (int): Number of connections kept open per host.
+
+    Returns:
+        requests.Session: The session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_session():
+    """
+    Return the keep-alive session shared by all concurrent fetches, creating it on first use.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session(max(FETCH_WORKERS, MAX_REQUESTS_PER_HOST))
+        return _session
+
+class HostLimiter:
+    """
+    Limits the number of requests in flight to each host.
+    """
+
+    def __init__(self, limit):
+        """
+        Args:
+            limit (int): Maximum number of concurrent requests per host.
+        """
+        self.limit = limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Hold one of the host's request slots for the duration of a `with` block.
+
+        Args:
+            url (str): URL of the request.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.limit)
+        with semaphore:
+            yield
+
+def fetch_weather_data(city, session=None, timeout=REQUEST_TIMEOUT):
     """
     Fetch weather data for a given city from the OpenWeatherMap API.
-    
+
     Args:
         city (str): Name of the city to fetch weather data for.
-    
+        session (requests.Session, optional): Session to send the request with (default: a new connection).
+        timeout (float): Seconds to wait for a connection or a response.
+
     Returns:
         dict: Weather information for the city.
     """
@@ -27,43 +100,237 @@ def fetch_weather_data(city):
         'units': 'metric'  # Use metric units to get temperature in Celsius
     }
     try:
-        response = requests.get(BASE_URL, params=params)
+        response = (session or requests).get(BASE_URL, params=params, timeout=timeout)
         response.raise_for_status()
-        data = response.json()
-        
-        weather_info = {
-            'city': city,
-            'main': data['weather'][0]['main'],
-            'temp': data['main']['temp'],
-            'feels_like': data['main']['feels_like'],
-            'humidity': data['main']['humidity'],
-            'wind_speed': data['wind']['speed'],
-            'dt': data['dt']
-        }
-        return weather_info
+        return parse_weather_info(city, response.json())
     except requests.RequestException as e:
         logger.error(f"Error fetching weather data for {city}: {str(e)}")
         return None
 
+def parse_weather_info(city, data):
+    """
+    Convert one city's reading from the API into the weather information stored by `store_weather_data`.
+
+    Args:
+        city (str): Name of the city.
+        data (dict): The city's reading, as returned by the weather or group endpoint.
+
+    Returns:
+        dict: Weather information for the city.
+    """
+    weather_info = {
+        'city': city,
+        'main': data['weather'][0]['main'],
+        'temp': data['main']['temp'],
+        'feels_like': data['main']['feels_like'],
+        'humidity': data['main']['humidity'],
+        'wind_speed': data['wind']['speed'],
+        'dt': data['dt']
+    }
+    return weather_info
+
+def fetch_all_weather_data(cities, max_workers=FETCH_WORKERS, max_per_host=MAX_REQUESTS_PER_HOST,
+                           timeout=REQUEST_TIMEOUT, session=None):
+    """
+    Fetch weather data for many cities concurrently on a bounded thread pool.
+
+    All requests share one keep-alive session, and at most `max_per_host` of them are in flight to the
+    API host at any time.
+
+    Args:
+        cities (list): Names of the cities to fetch.
+        max_workers (int): Number of worker threads.
+        max_per_host (int): Maximum number of concurrent requests to one host.
+        timeout (float): Seconds to wait for a connection or a response, per request.
+        session (requests.Session, optional): Session to send the requests with (default: the shared session).
+
+    Returns:
+        list: Weather information for the cities that could be fetched, in the order of `cities`.
+    """
+    session = session or get_session()
+    limiter = HostLimiter(max_per_host)
+
+    def fetch(city):
+        with limiter.slot(BASE_URL):
+            return fetch_weather_data(city, session=session, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return [data for data in pool.map(fetch, cities) if data]
+
+class CityIdCache:
+    """
+    Maps city names to OpenWeatherMap city IDs, looking each city up once and keeping the mapping in a
+    JSON file so later runs do not look it up again.
+    """
+
+    def __init__(self, path=CITY_ID_CACHE):
+        """
+        Args:
+            path (str): JSON file holding the mapping.
+        """
+        self.path = path
+        self._ids = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self._ids, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
+
+    def resolve(self, cities, session=None, timeout=REQUEST_TIMEOUT, max_workers=FETCH_WORKERS, limiter=None):
+        """
+        Return the city ID of each city, looking up cities that are not in the mapping yet with the weather
+        endpoint (whose response carries the ID).
+
+        Args:
+            cities (list): Names of the cities.
+            session (requests.Session, optional): Session to send lookups with.
+            timeout (float): Seconds to wait for a connection or a response, per lookup.
+            max_workers (int): Number of lookups run concurrently.
+            limiter (HostLimiter, optional): Per-host limit the lookups share with other requests
+                (default: MAX_REQUESTS_PER_HOST lookups at a time).
+
+        Returns:
+            dict: City ID per city name; cities that cannot be looked up are left out.
+        """
+        limiter = limiter or HostLimiter(MAX_REQUESTS_PER_HOST)
+
+        def lookup(city):
+            try:
+                with limiter.slot(BASE_URL):
+                    response = (session or requests).get(BASE_URL, params={'q': city, 'appid': API_KEY},
+                                                         timeout=timeout)
+                response.raise_for_status()
+                return response.json()['id']
+            except (requests.RequestException, ValueError, KeyError) as e:
+                logger.error(f"Error looking up the city ID of {city}: {str(e)}")
+                return None
+
+        with self._lock:
+            if self._ids is None:
+                self._ids = self._load()
+            missing = [city for city in dict.fromkeys(cities) if city not in self._ids]
+            if missing:
+                with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as pool:
+                    for city, city_id in zip(missing, pool.map(lookup, missing)):
+                        if city_id is not None:
+                            self._ids[city] = city_id
+            if any(city in self._ids for city in missing):
+                try:
+                    self._save()
+                except OSError as e:
+                    logger.error(f"Error saving city IDs to {self.path}: {str(e)}")
+            return {city: self._ids[city] for city in cities if city in self._ids}
+
+city_ids = CityIdCache()
+
+def fetch_weather_data_batched(cities, id_cache=None, group_size=GROUP_SIZE, max_workers=FETCH_WORKERS,
+                               max_per_host=MAX_REQUESTS_PER_HOST, timeout=REQUEST_TIMEOUT, session=None):
+    """
+    Fetch weather data for many cities with the group endpoint, which returns up to `group_size` cities
+    per request.
+
+    City names are mapped to city IDs once (see CityIdCache), with lookups held to the same per-host limit
+    as the group requests; the readings of each group are then matched
+    back to the cities by ID.
+
+    Args:
+        cities (list): Names of the cities to fetch.
+        id_cache (CityIdCache, optional): City ID mapping to use (default: the one stored in CITY_ID_CACHE).
+        group_size (int): Cities per request, at most the API's limit of 20.
+        max_workers (int): Number of groups fetched concurrently.
+        max_per_host (int): Maximum number of concurrent requests to one host.
+        timeout (float): Seconds to wait for a connection or a response, per request.
+        session (requests.Session, optional): Session to send the requests with (default: the shared session).
+
+    Returns:
+        list: Weather information for the cities that could be fetched, in the order of `cities`.
+    """
+    session = session or get_session()
+    limiter = HostLimiter(max_per_host)
+    ids = (id_cache or city_ids).resolve(cities, session=session, timeout=timeout, max_workers=max_workers,
+                                         limiter=limiter)
+    cities_by_id = {}
+    for city, city_id in ids.items():
+        cities_by_id.setdefault(city_id, []).append(city)
+    unique_ids = list(cities_by_id)
+    groups = [unique_ids[start:start + group_size] for start in range(0, len(unique_ids), group_size)]
+
+    def fetch(group):
+        params = {'id': ','.join(map(str, group)), 'appid': API_KEY, 'units': 'metric'}
+        try:
+            with limiter.slot(GROUP_URL):
+                response = session.get(GROUP_URL, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response.json()['list']
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.error(f"Error fetching weather data for city IDs {params['id']}: {str(e)}")
+            return []
+
+    readings = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as pool:
+        for entries in pool.map(fetch, groups):
+            for entry in entries:
+                for city in cities_by_id.get(entry.get('id'), ()):
+                    try:
+                        readings[city] = parse_weather_info(city, entry)
+                    except (KeyError, IndexError, TypeError) as e:
+                        logger.error(f"Malformed weather data for {city}: {str(e)}")
+
+    for city in cities:
+        if city not in readings:
+            logger.warning(f"No weather data returned for {city}")
+    return [readings[city] for city in cities if city in readings]
+
 def fetch_and_store_data():
     """
     Fetch weather data for all cities and store it in the database.
+
+    With `FETCH_BATCHED`, cities are fetched in groups through the group endpoint; otherwise they are
+    fetched concurrently when `FETCH_WORKERS` is greater than 1.
+
+    Returns:
+        dict: The number of cities, how many were fetched and the total cycle time in seconds.
     """
-    all_weather_data = []
-    for city in CITIES:
-        data = fetch_weather_data(city)
-        if data:
-            all_weather_data.append(data)
-    
+    start = time.perf_counter()
+    if FETCH_BATCHED:
+        all_weather_data = fetch_weather_data_batched(CITIES)
+    elif FETCH_WORKERS > 1:
+        all_weather_data = fetch_all_weather_data(CITIES)
+    else:
+        all_weather_data = []
+        for city in CITIES:
+            data = fetch_weather_data(city)
+            if data:
+                all_weather_data.append(data)
+
     if all_weather_data:
         store_weather_data(all_weather_data)
-        logger.info(f"Data fetched and stored for {len(all_weather_data)} cities at {datetime.now()}")
+    cycle_time = time.perf_counter() - start
+
+    if all_weather_data:
+        logger.info(f"Data fetched and stored for {len(all_weather_data)} of {len(CITIES)} cities "
+                    f"in {cycle_time:.2f}s at {datetime.now()}")
     else:
         logger.warning("No weather data fetched.")
+    if cycle_time > INTERVAL:
+        logger.warning(f"Fetch cycle took {cycle_time:.2f}s, longer than the {INTERVAL}s interval")
+    return {'cities': len(CITIES), 'fetched': len(all_weather_data), 'cycle_time': cycle_time}
 
 def schedule_data_retrieval():
     """
     Schedule periodic data retrieval.
     """
     fetch_and_store_data()
-    Timer(INTERVAL, schedule_data_retrieval).start()
\ No newline at end of file
+    Timer(INTERVAL, schedule_data_retrieval).start()
@@ -2,18 +2,189 @@
 Module for handling data storage operations using SQLite.
 """
 
+import atexit
 import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from operator import itemgetter
 import pandas as pd
-from src.config import DB_PATH
+from src.config import DB_PATH, DB_BATCH_SIZE, DB_WAL, DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_BUSY_TIMEOUT
+
+_shared = {}
+_shared_lock = threading.RLock()
 
 def get_db_connection():
     """
     Create a database connection.
     
+    The connection uses write-ahead logging (unless DB_WAL is off), the DB_SYNCHRONOUS sync level, a page
+    cache of DB_CACHE_SIZE_KB and waits up to DB_BUSY_TIMEOUT seconds for other connections' writes.
+    
     Returns:
         sqlite3.Connection: Database connection object.
     """
-    return sqlite3.connect(DB_PATH)
+    return _connect()
+
+def _connect(check_same_thread=True):
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, check_same_thread=check_same_thread)
+    conn.execute(f"PRAGMA journal_mode = {'WAL' if DB_WAL else 'DELETE'}")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+@contextmanager
+def shared_connection():
+    """
+    Lend the calling thread the process-wide long-lived connection to the database, opening it on first use.
+    
+    The connection is reused across calls and threads (the schedulers run each cycle on a new timer thread)
+    instead of connecting, and reading the schema again, every time. A lock gives one thread at a time access
+    to it, so it is held until the `with` block ends; writes must be made in an inner `with conn:` block, which
+    commits them or rolls them back. The connection is closed at exit (see close_shared_connections).
+    
+    Yields:
+        sqlite3.Connection: Database connection object.
+    """
+    with _shared_lock:
+        conn = _shared.get(DB_PATH)
+        if conn is None:
+            conn = _shared[DB_PATH] = _connect(check_same_thread=False)
+        yield conn
+
+def close_shared_connections():
+    """
+    Close the long-lived connections opened by shared_connection.
+    """
+    with _shared_lock:
+        while _shared:
+            _shared.popitem()[1].close()
+
+atexit.register(close_shared_connections)
+
+SUMMARY_COLUMNS = ['date', 'city', 'avg_temp', 'max_temp', 'min_temp', 'avg_humidity', 'max_humidity',
+                   'min_humidity', 'avg_wind_speed', 'max_wind_speed', 'min_wind_speed', 'dominant_condition']
+
+DAILY_SUMMARY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS daily_summary (
+        date TEXT,
+        city TEXT,
+        avg_temp REAL,
+        max_temp REAL,
+        min_temp REAL,
+        avg_humidity REAL,
+        max_humidity REAL,
+        min_humidity REAL,
+        avg_wind_speed REAL,
+        max_wind_speed REAL,
+        min_wind_speed REAL,
+        dominant_condition TEXT,
+        PRIMARY KEY (date, city)
+    )
+    '''
+
+# Running per-(date, city) aggregates of weather_data, kept up to date on every insert and delete: by triggers
+# for single rows, and by store_weather_data once per batch (while a row in aggregates_deferred holds the insert
+# trigger back, inside its own write transaction). `revision` counts the changes to a row and
+# `summarized_revision` the last one written to daily_summary, so only the days that changed since the last
+# summary are recomputed. `stale` marks rows whose minimum or maximum may have been removed by a delete; they
+# are recomputed from weather_data when next read.
+AGGREGATE_COLUMNS = ('temp', 'humidity', 'wind_speed')
+
+_AGGREGATE_NAMES = ', '.join(f'{c}_sum, {c}_min, {c}_max' for c in AGGREGATE_COLUMNS)
+_AGGREGATE_MERGE = ', '.join(f'{c}_sum = {c}_sum + excluded.{c}_sum, {c}_min = min({c}_min, excluded.{c}_min), '
+                             f'{c}_max = max({c}_max, excluded.{c}_max)' for c in AGGREGATE_COLUMNS)
+
+def _aggregate_sql():
+    """
+    Return the statements creating the aggregate tables and the triggers that maintain them.
+    """
+    columns = ', '.join(f'{c}_sum REAL, {c}_min REAL, {c}_max REAL' for c in AGGREGATE_COLUMNS)
+    values = ', '.join(f'NEW.{c}, NEW.{c}, NEW.{c}' for c in AGGREGATE_COLUMNS)
+    removed = ', '.join(f'{c}_sum = {c}_sum - OLD.{c}' for c in AGGREGATE_COLUMNS)
+    at_bound = ' OR '.join(f'OLD.{c} IN ({c}_min, {c}_max)' for c in AGGREGATE_COLUMNS)
+    return [f'''
+    CREATE TABLE IF NOT EXISTS daily_aggregates (
+        date TEXT,
+        city TEXT,
+        count INTEGER NOT NULL,
+        {columns},
+        stale INTEGER NOT NULL DEFAULT 0,
+        revision INTEGER NOT NULL DEFAULT 1,
+        summarized_revision INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, city)
+    )
+    ''', '''
+    CREATE INDEX IF NOT EXISTS idx_daily_aggregates_changed ON daily_aggregates (date, city)
+    WHERE revision > summarized_revision
+    ''', '''
+    CREATE TABLE IF NOT EXISTS daily_conditions (
+        date TEXT,
+        city TEXT,
+        main TEXT,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (date, city, main)
+    )
+    ''', '''
+    CREATE TABLE IF NOT EXISTS aggregates_deferred (after_id INTEGER)
+    ''', '''
+    DROP TRIGGER IF EXISTS weather_data_aggregate_insert
+    ''', f'''
+    CREATE TRIGGER weather_data_aggregate_insert AFTER INSERT ON weather_data
+    WHEN NOT EXISTS (SELECT 1 FROM aggregates_deferred)
+    BEGIN
+        INSERT INTO daily_aggregates (date, city, count, {_AGGREGATE_NAMES})
+        VALUES (date(NEW.dt, 'unixepoch'), NEW.city, 1, {values})
+        ON CONFLICT (date, city) DO UPDATE SET count = count + 1, {_AGGREGATE_MERGE}, revision = revision + 1;
+        INSERT INTO daily_conditions (date, city, main, count)
+        VALUES (date(NEW.dt, 'unixepoch'), NEW.city, NEW.main, 1)
+        ON CONFLICT (date, city, main) DO UPDATE SET count = count + 1;
+    END
+    ''', f'''
+    CREATE TRIGGER IF NOT EXISTS weather_data_aggregate_delete AFTER DELETE ON weather_data
+    BEGIN
+        UPDATE daily_aggregates SET count = count - 1, {removed}, stale = stale OR {at_bound},
+            revision = revision + 1
+        WHERE date = date(OLD.dt, 'unixepoch') AND city = OLD.city;
+        UPDATE daily_conditions SET count = count - 1
+        WHERE date = date(OLD.dt, 'unixepoch') AND city = OLD.city AND main = OLD.main;
+        DELETE FROM daily_conditions
+        WHERE date = date(OLD.dt, 'unixepoch') AND city = OLD.city AND main = OLD.main AND count <= 0;
+    END
+    ''']
+
+def _aggregate_readings(cursor, after_id=0):
+    """
+    Add the readings with an id above `after_id` to the aggregates, one upsert per (date, city) and
+    condition instead of one per reading.
+    """
+    aggregates = ', '.join(f'sum({c}), min({c}), max({c})' for c in AGGREGATE_COLUMNS)
+    cursor.execute(f'''
+    INSERT INTO daily_aggregates (date, city, count, {_AGGREGATE_NAMES})
+    SELECT date(dt, 'unixepoch'), city, count(*), {aggregates} FROM weather_data WHERE id > ? GROUP BY 1, 2
+    ON CONFLICT (date, city) DO UPDATE SET count = count + excluded.count, {_AGGREGATE_MERGE},
+        revision = revision + 1
+    ''', (after_id,))
+    cursor.execute('''
+    INSERT INTO daily_conditions (date, city, main, count)
+    SELECT date(dt, 'unixepoch'), city, main, count(*) FROM weather_data WHERE id > ? GROUP BY 1, 2, 3
+    ON CONFLICT (date, city, main) DO UPDATE SET count = count + excluded.count
+    ''', (after_id,))
+
+def _migrate_daily_summary(cursor):
+    """
+    Restore the (date, city) primary key of a daily_summary table that was replaced with pandas' to_sql by
+    earlier versions, keeping its rows.
+    """
+    cursor.execute("PRAGMA table_info(daily_summary)")
+    if any(column[5] for column in cursor.fetchall()):
+        return
+    columns = ', '.join(SUMMARY_COLUMNS)
+    cursor.execute("ALTER TABLE daily_summary RENAME TO daily_summary_replaced")
+    cursor.execute(DAILY_SUMMARY_TABLE)
+    cursor.execute(f"INSERT OR REPLACE INTO daily_summary ({columns}) SELECT {columns} FROM daily_summary_replaced")
+    cursor.execute("DROP TABLE daily_summary_replaced")
 
 def init_db():
     """
@@ -35,46 +206,56 @@ def init_db():
     )
     ''')
     
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS daily_summary (
-        date TEXT,
-        city TEXT,
-        avg_temp REAL,
-        max_temp REAL,
-        min_temp REAL,
-        avg_humidity REAL,
-        max_humidity REAL,
-        min_humidity REAL,
-        avg_wind_speed REAL,
-        max_wind_speed REAL,
-        min_wind_speed REAL,
-        dominant_condition TEXT,
-        PRIMARY KEY (date, city)
-    )
-    ''')
+    cursor.execute(DAILY_SUMMARY_TABLE)
+    
+    _migrate_daily_summary(cursor)
+    
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_aggregates'")
+    backfill = cursor.fetchone() is None
+    for statement in _aggregate_sql():
+        cursor.execute(statement)
+    if backfill:
+        # Aggregate the weather data stored before the aggregate tables existed
+        _aggregate_readings(cursor)
     
     conn.commit()
     conn.close()
 
-def store_weather_data(data):
+_reading_values = itemgetter('city', 'main', 'temp', 'feels_like', 'humidity', 'wind_speed', 'dt')
+
+def store_weather_data(data, batch_size=DB_BATCH_SIZE):
     """
     Store weather data in the database.
     
-    Args:
-        data (list): List of dictionaries containing weather data.
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    Readings are inserted with executemany on the thread's shared connection, committing every `batch_size`
+    readings, so `data` may be a generator of any length.
     
-    for item in data:
-        cursor.execute('''
-        INSERT INTO weather_data (city, main, temp, feels_like, humidity, wind_speed, dt)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (item['city'], item['main'], item['temp'], item['feels_like'],
-              item['humidity'], item['wind_speed'], item['dt']))
+    Args:
+        data (iterable): Dictionaries containing weather data.
+        batch_size (int): Readings inserted per transaction (0 inserts them all in one transaction).
     
-    conn.commit()
-    conn.close()
+    Returns:
+        int: Number of readings stored.
+    """
+    rows = map(_reading_values, data)
+    stored = 0
+    while True:
+        batch = list(islice(rows, batch_size or None))
+        if not batch:
+            return stored
+        with shared_connection() as conn, conn:
+            # Take the write lock first, so no other writer inserts between reading the last id and the batch;
+            # hold the per-row aggregate trigger back and aggregate the whole batch at once instead
+            conn.execute("BEGIN IMMEDIATE")
+            after_id = conn.execute("SELECT coalesce(max(id), 0) FROM weather_data").fetchone()[0]
+            conn.execute("INSERT INTO aggregates_deferred (after_id) VALUES (?)", (after_id,))
+            conn.executemany('''
+            INSERT INTO weather_data (city, main, temp, feels_like, humidity, wind_speed, dt)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+            _aggregate_readings(conn, after_id)
+            conn.execute("DELETE FROM aggregates_deferred")
+        stored += len(batch)
 
 def get_weather_data():
     """
@@ -83,21 +264,93 @@ def get_weather_data():
     Returns:
         pd.DataFrame: DataFrame containing all weather data.
     """
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT * FROM weather_data", conn)
-    conn.close()
-    return df
+    with shared_connection() as conn:
+        return pd.read_sql_query("SELECT * FROM weather_data", conn)
+
+def get_daily_aggregates(changed_only=False):
+    """
+    Retrieve daily summaries computed from the running aggregates, without reading weather_data.
+    
+    Args:
+        changed_only (bool): Only return the (date, city) rows that changed since they were last marked
+            as summarized (see mark_daily_aggregates_summarized).
+    
+    Returns:
+        pd.DataFrame: The summary columns of daily_summary, plus the number of readings of each row
+            (`count`, 0 once all of them were deleted) and its `revision`.
+    """
+    # Recompute the bounds a delete may have removed, for the affected days only
+    bounds = ', '.join(f'min({c}), max({c})' for c in AGGREGATE_COLUMNS)
+    targets = ', '.join(f'{c}_min, {c}_max' for c in AGGREGATE_COLUMNS)
+    averages = ', '.join(f'CASE WHEN count > 0 THEN {c}_sum / count END AS avg_{c}, {c}_max AS max_{c}, '
+                         f'{c}_min AS min_{c}' for c in AGGREGATE_COLUMNS)
+    with shared_connection() as conn:
+        with conn:
+            conn.execute(f'''
+            UPDATE daily_aggregates SET ({targets}) = (
+                SELECT {bounds} FROM weather_data
+                WHERE city = daily_aggregates.city
+                  AND dt >= CAST(strftime('%s', daily_aggregates.date) AS INTEGER)
+                  AND dt < CAST(strftime('%s', daily_aggregates.date) AS INTEGER) + 86400
+            ), stale = 0
+            WHERE stale
+            ''')
+
+        return pd.read_sql_query(f'''
+        SELECT date, city, {averages},
+            (SELECT main FROM daily_conditions AS c WHERE c.date = a.date AND c.city = a.city
+             ORDER BY c.count DESC, c.main LIMIT 1) AS dominant_condition,
+            count, revision
+        FROM daily_aggregates AS a
+        {'WHERE revision > summarized_revision' if changed_only else ''}
+        ORDER BY date, city
+        ''', conn)
 
-def store_daily_summary(summary):
+def mark_daily_aggregates_summarized(aggregates):
+    """
+    Record that daily aggregates were written to daily_summary. Rows changed again since they were read
+    stay pending, and rows left without readings are removed.
+    
+    Args:
+        aggregates (pd.DataFrame): Rows returned by get_daily_aggregates.
+    """
+    rows = list(zip(aggregates['revision'].tolist(), aggregates['date'].tolist(), aggregates['city'].tolist()))
+    with shared_connection() as conn, conn:
+        conn.executemany('''
+        UPDATE daily_aggregates SET summarized_revision = ? WHERE date = ? AND city = ?
+        ''', rows)
+        conn.execute("DELETE FROM daily_aggregates WHERE count <= 0 AND revision = summarized_revision")
+
+def store_daily_summary(summary, removed=()):
     """
     Store daily summary data in the database.
     
+    Rows are upserted on their (date, city) key in a single transaction, and a row is only written if it is
+    new or one of its values changed, so the cost of a write depends on the size of `summary`, not on the
+    history already stored.
+    
     Args:
         summary (pd.DataFrame): DataFrame containing daily summary data.
+        removed (iterable): (date, city) pairs whose summary rows should be deleted.
+    
+    Returns:
+        int: Number of rows inserted, changed or deleted.
     """
-    conn = get_db_connection()
-    summary.to_sql('daily_summary', conn, if_exists='replace', index=False)
-    conn.close()
+    values = [column for column in SUMMARY_COLUMNS if column not in ('date', 'city')]
+    rows = [
+        (str(row[0]), row[1], *(None if pd.isna(value) else value for value in row[2:]))
+        for row in summary[SUMMARY_COLUMNS].itertuples(index=False, name=None)
+    ]
+    with shared_connection() as conn, conn:
+        before = conn.total_changes
+        conn.executemany(f'''
+        INSERT INTO daily_summary ({', '.join(SUMMARY_COLUMNS)}) VALUES ({', '.join('?' * len(SUMMARY_COLUMNS))})
+        ON CONFLICT (date, city) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in values)}
+        WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in values)}
+        ''', rows)
+        conn.executemany("DELETE FROM daily_summary WHERE date = ? AND city = ?",
+                         [(str(day), city) for day, city in removed])
+        return conn.total_changes - before
 
 def get_daily_summary():
     """
@@ -106,10 +359,8 @@ def get_daily_summary():
     Returns:
         pd.DataFrame: DataFrame containing daily summary data.
     """
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT * FROM daily_summary", conn)
-    conn.close()
-    return df
+    with shared_connection() as conn:
+        return pd.read_sql_query("SELECT * FROM daily_summary", conn)
 
 # Initialize the database when the module is imported
 init_db()
\ No newline at end of file
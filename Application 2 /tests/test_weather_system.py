@@ -2,18 +2,94 @@
 Unit tests for individual components of the Weather Monitoring System.
 """
 
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
+from urllib.parse import urlsplit, parse_qs
 import pandas as pd
 from datetime import datetime, date
-from src.data_retrieval import fetch_weather_data
+from src.data_retrieval import (fetch_weather_data, fetch_all_weather_data, fetch_weather_data_batched, fetch_and_store_data,
+                                create_session, CityIdCache)
 from src.data_processing import calculate_daily_summary
-from src.data_storage import store_weather_data, get_weather_data, store_daily_summary, get_daily_summary
+from src.data_storage import (store_weather_data, get_weather_data, store_daily_summary, get_daily_summary,
+                              get_db_connection, init_db, shared_connection,
+                              close_shared_connections)
 from src.alerting import check_alerts, send_email_alert
 from src.config import TEMP_THRESHOLD
 
+def stub_city_id(city):
+    return zlib.crc32(city.encode()) % 1000000
+
+def stub_reading(city_id):
+    return {
+        'id': city_id,
+        'weather': [{'main': 'Clear'}],
+        'main': {'temp': city_id % 50, 'feels_like': city_id % 50, 'humidity': 50},
+        'wind': {'speed': 3.0},
+        'dt': 1625097600
+    }
+
+class StubWeatherAPI(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the OpenWeatherMap weather and group endpoints. Every city has a reading derived from
+    its ID (see stub_city_id), except 'Nowhere', which is not found.
+    """
+    delay = 0.02
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    paths = []
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(cls.delay)
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            with cls.lock:
+                cls.paths.append(url.path)
+            if url.path.endswith('/group'):
+                ids = [int(city_id) for city_id in query['id'][0].split(',')]
+                self.send_response(200 if len(ids) <= 20 else 400)
+                body = json.dumps({'cnt': len(ids), 'list': [stub_reading(city_id) for city_id in ids]}).encode()
+            elif query['q'][0] == 'Nowhere':
+                self.send_response(404)
+                body = b'{"cod": "404", "message": "city not found"}'
+            else:
+                self.send_response(200)
+                body = json.dumps(stub_reading(stub_city_id(query['q'][0]))).encode()
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
 class WeatherSystemUnitTest(unittest.TestCase):
 
+    def setUp(self):
+        # Every test gets its own database, so none of them touches DB_PATH
+        handle, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, self.db_path)
+        patcher = patch('src.data_storage.DB_PATH', self.db_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(close_shared_connections)
+
     @patch('src.data_retrieval.requests.get')
     def test_fetch_weather_data(self, mock_get):
         # Mock the API response
@@ -38,44 +114,185 @@ class WeatherSystemUnitTest(unittest.TestCase):
         self.assertEqual(data['wind_speed'], 5.2)
         self.assertEqual(data['dt'], 1625097600)
 
-    @patch('src.data_storage.get_weather_data')
-    @patch('src.data_storage.store_daily_summary')
-    def test_calculate_daily_summary(self, mock_store_summary, mock_get_data):
-        # Mock weather data
-        mock_data = pd.DataFrame({
+    def start_stub(self):
+        StubWeatherAPI.max_in_flight = 0
+        StubWeatherAPI.paths = []
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubWeatherAPI)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f'http://127.0.0.1:{server.server_port}/data/2.5'
+
+    def test_fetch_all_weather_data_concurrently(self):
+        cities = [f'City{i}' for i in range(20)] + ['Nowhere']
+        with patch('src.data_retrieval.BASE_URL', self.start_stub() + '/weather'):
+            data = fetch_all_weather_data(cities, max_workers=8, max_per_host=3, timeout=5, session=create_session(8))
+
+        self.assertEqual([item['city'] for item in data], cities[:-1])  # Input order; the missing city is skipped
+        self.assertEqual(data[12]['temp'], stub_city_id('City12') % 50)
+        self.assertLessEqual(StubWeatherAPI.max_in_flight, 3)
+        self.assertGreater(StubWeatherAPI.max_in_flight, 1)
+
+    @patch('src.data_retrieval.store_weather_data')
+    def test_fetch_and_store_data_reports_cycle_time(self, mock_store):
+        with patch('src.data_retrieval.BASE_URL', self.start_stub() + '/weather'), \
+                patch('src.data_retrieval.FETCH_WORKERS', 4), \
+                patch('src.data_retrieval.CITIES', ['Delhi', 'Mumbai', 'Nowhere']):
+            report = fetch_and_store_data()
+
+        self.assertEqual(report['cities'], 3)
+        self.assertEqual(report['fetched'], 2)
+        self.assertGreater(report['cycle_time'], 0)
+        self.assertEqual([item['city'] for item in mock_store.call_args[0][0]], ['Delhi', 'Mumbai'])
+
+    def test_fetch_weather_data_batched(self):
+        cities = [f'City{i}' for i in range(45)] + ['Nowhere']
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        os.remove(path)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        stub = self.start_stub()
+        with patch('src.data_retrieval.BASE_URL', stub + '/weather'), patch('src.data_retrieval.GROUP_URL', stub + '/group'):
+            data = fetch_weather_data_batched(cities, id_cache=CityIdCache(path), max_workers=4, max_per_host=2,
+                                              session=create_session(4))
+            self.assertEqual(StubWeatherAPI.paths.count('/data/2.5/group'), 3)  # 45 cities in groups of 20
+            self.assertEqual(StubWeatherAPI.paths.count('/data/2.5/weather'), 46)  # One ID lookup per city
+            self.assertLessEqual(StubWeatherAPI.max_in_flight, 2)  # Lookups included
+
+            # The mapping is saved, so later cycles (and processes) only make group requests
+            StubWeatherAPI.paths = []
+            again = fetch_weather_data_batched(cities, id_cache=CityIdCache(path), max_workers=4, session=create_session(4))
+            self.assertEqual(StubWeatherAPI.paths.count('/data/2.5/weather'), 1)  # Only the unknown city again
+            self.assertEqual(StubWeatherAPI.paths.count('/data/2.5/group'), 3)
+
+        self.assertEqual(data, again)
+        self.assertEqual([item['city'] for item in data], cities[:-1])
+        self.assertEqual(data[7], {'city': 'City7', 'main': 'Clear', 'temp': stub_city_id('City7') % 50,
+                                   'feels_like': stub_city_id('City7') % 50, 'humidity': 50, 'wind_speed': 3.0,
+                                   'dt': 1625097600})
+
+    def test_calculate_daily_summary(self):
+        readings = pd.DataFrame({
             'city': ['Delhi', 'Delhi', 'Mumbai', 'Mumbai'],
             'main': ['Clear', 'Rain', 'Clear', 'Clear'],
             'temp': [30, 28, 32, 33],
+            'feels_like': [31, 29, 33, 34],
             'humidity': [60, 70, 65, 63],
             'wind_speed': [5, 6, 4, 4.5],
             'dt': [1625097600, 1625184000, 1625097600, 1625184000]
         })
-        mock_get_data.return_value = mock_data
-
+        init_db()
+        store_weather_data(readings.to_dict('records'))
         summary = calculate_daily_summary()
 
         self.assertIsInstance(summary, pd.DataFrame)
         self.assertEqual(len(summary), 4)  # 2 days * 2 cities
-        self.assertTrue(mock_store_summary.called)
+        self.assertEqual(list(summary['date']), ['2021-07-01', '2021-07-01', '2021-07-02', '2021-07-02'])
+        self.assertEqual(list(summary['avg_temp']), [30, 32, 28, 33])
+        pd.testing.assert_frame_equal(get_daily_summary().sort_values(['date', 'city']).reset_index(drop=True),
+                                      summary)
 
-    @patch('src.data_storage.get_db_connection')
-    def test_data_storage(self, mock_conn):
-        # Test storing and retrieving weather data
+    def test_daily_summary_from_aggregates(self):
+        reading = lambda city, main, temp, dt: {'city': city, 'main': main, 'temp': temp, 'feels_like': temp,
+                                                'humidity': 60, 'wind_speed': temp / 10, 'dt': dt}
+        init_db()
+        store_weather_data([reading('Delhi', 'Clear', 30, 1625097600), reading('Delhi', 'Rain', 28, 1625101200),
+                            reading('Delhi', 'Rain', 26, 1625104800), reading('Mumbai', 'Clear', 32, 1625097600)])
+        summary = calculate_daily_summary()
+        self.assertEqual(len(summary), 2)
+        delhi = summary[summary['city'] == 'Delhi'].iloc[0]
+        self.assertEqual(delhi['date'], '2021-07-01')
+        self.assertAlmostEqual(delhi['avg_temp'], 28)
+        self.assertEqual((delhi['min_temp'], delhi['max_temp']), (26, 30))
+        self.assertEqual(delhi['dominant_condition'], 'Rain')
+        self.assertTrue(calculate_daily_summary().empty)  # Nothing changed since
+
+        # Only the day that received readings is recomputed; the others are kept as stored
+        store_weather_data([reading('Mumbai', 'Haze', 40, 1625184000)])
+        self.assertEqual(list(calculate_daily_summary()['date']), ['2021-07-02'])
+        self.assertEqual(len(get_daily_summary()), 3)
+
+        # Deleting readings updates the aggregates, including a removed maximum
+        conn = get_db_connection()
+        conn.execute("DELETE FROM weather_data WHERE city = 'Delhi' AND temp = 30")
+        conn.execute("DELETE FROM weather_data WHERE city = 'Mumbai' AND dt = 1625184000")
+        conn.commit()
+        conn.close()
+        summary = calculate_daily_summary()
+        self.assertEqual(list(summary['city']), ['Delhi'])
+        self.assertEqual((summary.iloc[0]['max_temp'], summary.iloc[0]['avg_temp']), (28, 27))
+        stored = get_daily_summary()
+        self.assertEqual(sorted(zip(stored['date'], stored['city'])), [('2021-07-01', 'Delhi'), ('2021-07-01', 'Mumbai')])
+
+    def test_store_weather_data_in_batches_from_threads(self):
+        readings = lambda thread: ({'city': f'City{thread}', 'main': 'Clear', 'temp': i % 40, 'feels_like': 0,
+                                    'humidity': 50, 'wind_speed': 1.0, 'dt': 1625097600 + i} for i in range(2500))
+        init_db()
+        self.assertEqual(store_weather_data(readings(0), batch_size=1000), 2500)
+
+        # Every thread, like the schedulers' timer threads, writes on the same long-lived connection
+        connections = set()
+        def store(thread):
+            store_weather_data(readings(thread), batch_size=1000)
+            with shared_connection() as conn:
+                connections.add(id(conn))
+        threads = [threading.Thread(target=store, args=(thread,)) for thread in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with shared_connection() as conn:
+            self.assertEqual(connections, {id(conn)})
+
+        conn = get_db_connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        counts = dict(conn.execute("SELECT city, count(*) FROM weather_data GROUP BY city"))
+        aggregated = dict(conn.execute("SELECT city, count FROM daily_aggregates"))
+        conn.close()
+        self.assertEqual(counts, {f'City{thread}': 2500 for thread in range(5)})
+        self.assertEqual(aggregated, counts)
+
+    def test_store_daily_summary_upserts_changed_rows(self):
+        summary = pd.DataFrame({
+            'date': [date(2021, 7, 1), date(2021, 7, 1), date(2021, 7, 2)], 'city': ['Delhi', 'Mumbai', 'Delhi'],
+            'avg_temp': [30.0, 32.0, 29.0], 'max_temp': [31.0, 33.0, 30.0], 'min_temp': [29.0, 31.0, 28.0],
+            'avg_humidity': [60.0] * 3, 'max_humidity': [60.0] * 3, 'min_humidity': [60.0] * 3,
+            'avg_wind_speed': [5.0] * 3, 'max_wind_speed': [5.0] * 3, 'min_wind_speed': [5.0] * 3,
+            'dominant_condition': ['Clear', 'Clear', 'Rain']
+        })
+        # A table replaced by earlier versions (without its primary key) is migrated
+        conn = get_db_connection()
+        summary.iloc[:1].to_sql('daily_summary', conn, index=False)
+        conn.close()
+        init_db()
+
+        self.assertEqual(store_daily_summary(summary), 2)  # The migrated row is unchanged
+        self.assertEqual(store_daily_summary(summary), 0)
+        changed = summary.iloc[2:].assign(max_temp=35.0)
+        self.assertEqual(store_daily_summary(changed, removed=[(date(2021, 7, 1), 'Mumbai')]), 2)
+
+        stored = get_daily_summary()
+        self.assertEqual(list(zip(stored['date'], stored['city'], stored['max_temp'])),
+                         [('2021-07-01', 'Delhi', 31.0), ('2021-07-02', 'Delhi', 35.0)])
+        conn = get_db_connection()
+        primary_key = [row[1] for row in conn.execute("PRAGMA table_info(daily_summary)") if row[5]]
+        conn.close()
+        self.assertEqual(primary_key, ['date', 'city'])
+
+    def test_data_storage(self):
+        # Test storing and retrieving weather data (in the temporary database set up for each test)
         test_data = [
             {'city': 'TestCity', 'main': 'Clear', 'temp': 25.5, 'feels_like': 26.0,
              'humidity': 60, 'wind_speed': 5.2, 'dt': int(datetime.now().timestamp())}
         ]
+        init_db()
         store_weather_data(test_data)
         
-        # Mock the database query result
-        mock_conn.return_value.cursor().fetchall.return_value = [
-            (1, 'TestCity', 'Clear', 25.5, 26.0, 60, 5.2, test_data[0]['dt'])
-        ]
-        
         retrieved_data = get_weather_data()
         self.assertIsInstance(retrieved_data, pd.DataFrame)
         self.assertEqual(len(retrieved_data), 1)
         self.assertEqual(retrieved_data.iloc[0]['city'], 'TestCity')
+        self.assertEqual(retrieved_data.iloc[0]['dt'], test_data[0]['dt'])
 
     @patch('src.alerting.send_email_alert')
     def test_check_alerts(self, mock_send_email):